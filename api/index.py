@@ -0,0 +1,21 @@
+import os
+import sys
+
+# Shared modules live alongside the FastAPI backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+# Every /api/* route is rewritten to this function (see vercel.json), and
+# Vercel's Python runtime serves the module-level ASGI `app` directly, so a
+# warm instance handles concurrent requests on one event loop and keeps its
+# connection pools, caches and gateway state between requests.
+#
+# The Vercel deployment has always defaulted to a free model; EMAIL_MODELS
+# set in the project settings still takes precedence.
+os.environ.setdefault("EMAIL_MODELS", "nvidia/nemotron-3-nano-30b-a3b:free")
+
+# Requests reach the app through Vercel's proxy, so the ASGI peer address is
+# the same for every user. Vercel overwrites X-Forwarded-For with the real
+# client address, which makes it safe to key rate limits and tenants on.
+os.environ.setdefault("TRUST_FORWARDED_FOR", "true")
+
+from main import app  # noqa: E402,F401
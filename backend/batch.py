@@ -0,0 +1,101 @@
+"""
+EmailCraft AI - Batch generation
+Bounded-concurrency runner and mail-merge helpers for batch requests
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Template fields that may contain {variable} placeholders
+TEMPLATE_FIELDS = ("context", "recipient_name", "additional_details")
+
+
+class TemplateError(ValueError):
+    """Raised when a recipient is missing a variable used by the template"""
+
+
+def render_template(template: dict[str, Any], variables: dict[str, Any]) -> dict[str, Any]:
+    """Fill {variable} placeholders in the template's text fields"""
+    rendered = dict(template)
+    for field in TEMPLATE_FIELDS:
+        value = template.get(field)
+        if isinstance(value, str):
+            try:
+                rendered[field] = value.format_map(variables)
+            except KeyError as e:
+                raise TemplateError(f"Missing template variable: {e.args[0]}")
+            except (IndexError, ValueError) as e:
+                raise TemplateError(f"Invalid template in '{field}': {str(e)}")
+
+    # Explicit recipient variables win over the template defaults
+    for field in ("recipient_name", "tone"):
+        if variables.get(field):
+            rendered[field] = variables[field]
+    return rendered
+
+
+def to_ndjson(record: dict[str, Any]) -> str:
+    """Serialize one NDJSON line"""
+    return json.dumps(record) + "\n"
+
+
+async def run_batch(
+    items: Iterable[tuple[str, Any]],
+    worker: Callable[[Any], Awaitable[dict[str, Any]]],
+    concurrency: int,
+    skip_ids: Optional[set[str]] = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Run `worker` over every (item_id, item) pair with bounded concurrency.
+
+    Yields one record per item in completion order, followed by a summary
+    record. A failing item is reported as an error record and does not stop
+    the rest of the batch. Items whose id is in `skip_ids` are not run, which
+    lets a client resume an interrupted batch.
+    """
+    skip_ids = skip_ids or set()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(item_id: str, item: Any) -> dict[str, Any]:
+        async with semaphore:
+            try:
+                return {"id": item_id, "status": "ok", "email": await worker(item)}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Batch item {item_id} failed: {str(e)}")
+                return {"id": item_id, "status": "error", "error": str(e)}
+
+    skipped = 0
+    tasks = []
+    for item_id, item in items:
+        if item_id in skip_ids:
+            skipped += 1
+            continue
+        tasks.append(asyncio.ensure_future(run_one(item_id, item)))
+
+    succeeded = failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            record = await next_done
+            if record["status"] == "ok":
+                succeeded += 1
+            else:
+                failed += 1
+            yield record
+    finally:
+        # Stop outstanding work if the client goes away mid-batch
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "status": "complete",
+        "total": len(tasks) + skipped,
+        "succeeded": succeeded,
+        "failed": failed,
+        "skipped": skipped,
+    }
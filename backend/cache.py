@@ -0,0 +1,294 @@
+"""
+EmailCraft AI - Response cache
+Content-addressed cache for generated emails with pluggable backends
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Mapping, Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Per-request cache modes, read from the X-Cache-Mode request header
+CACHE_MODE_DEFAULT = "default"
+CACHE_MODE_BYPASS = "bypass"    # neither read nor write the cache
+CACHE_MODE_REFRESH = "refresh"  # skip the read, store the fresh result
+
+
+def _normalize(value: Any) -> Any:
+    """Collapse whitespace so trivially different requests share a key"""
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", value).strip()
+    if isinstance(value, Mapping):
+        return {k: _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(fields: Mapping[str, Any], model: str, system_prompt: str) -> str:
+    """Hash the normalized request fields together with the model and system prompt"""
+    material = json.dumps(
+        {
+            "fields": _normalize(fields),
+            "model": model,
+            "system_prompt": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def cache_mode_from_headers(headers: Mapping[str, str]) -> str:
+    """Map request headers to a cache mode"""
+    mode = (headers.get("X-Cache-Mode") or headers.get("x-cache-mode") or "").strip().lower()
+    if mode in (CACHE_MODE_BYPASS, CACHE_MODE_REFRESH):
+        return mode
+
+    cache_control = (headers.get("Cache-Control") or headers.get("cache-control") or "").lower()
+    if "no-store" in cache_control:
+        return CACHE_MODE_BYPASS
+    if "no-cache" in cache_control:
+        return CACHE_MODE_REFRESH
+    return CACHE_MODE_DEFAULT
+
+
+class CacheBackend(Protocol):
+    """Storage interface implemented by every cache tier"""
+
+    def get(self, key: str) -> Optional[dict]: ...
+
+    def set(self, key: str, value: dict) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class MemoryCache:
+    """In-process LRU with TTL, entry-count and byte-size eviction"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, int, dict]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """On-disk tier so warm entries survive process restarts"""
+
+    def __init__(self, path: str, ttl: float = 86400.0, max_entries: int = 100_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS email_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM email_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM email_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                return None
+            self._conn.execute("UPDATE email_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO email_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now),
+            )
+            self._prune(now)
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM email_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM email_cache")
+            self._conn.commit()
+
+    def _prune(self, now: float) -> None:
+        """Drop expired rows, then the least recently used rows over the limit"""
+        expired = self._conn.execute("DELETE FROM email_cache WHERE expires_at < ?", (now,)).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM email_cache WHERE key IN ("
+            "SELECT key FROM email_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        self.evictions += max(expired, 0) + max(overflow, 0)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """Tiered cache: memory first, then the optional disk tier"""
+
+    def __init__(self, memory: MemoryCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self._promote(key, self.disk.get(key))
+        return self._count(value)
+
+    async def aget(self, key: str) -> Optional[dict]:
+        """Like get, with the disk tier read off the event loop"""
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self._promote(key, await asyncio.to_thread(self.disk.get, key))
+        return self._count(value)
+
+    def set(self, key: str, value: dict) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    async def aset(self, key: str, value: dict) -> None:
+        """Like set, with the disk tier written off the event loop"""
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    def _promote(self, key: str, value: Optional[dict]) -> Optional[dict]:
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    def _count(self, value: Optional[dict]) -> Optional[dict]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """Hit, miss and eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.memory.evictions + (self.disk.evictions if self.disk else 0),
+            "memory_entries": len(self.memory),
+            "disk_enabled": self.disk is not None,
+        }
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """Build the response cache from environment settings"""
+    if os.getenv("EMAIL_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+
+    ttl = float(os.getenv("EMAIL_CACHE_TTL", "3600"))
+    memory = MemoryCache(
+        max_entries=int(os.getenv("EMAIL_CACHE_MAX_ENTRIES", "1024")),
+        max_bytes=int(os.getenv("EMAIL_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        ttl=ttl,
+    )
+
+    disk = None
+    sqlite_path = os.getenv("EMAIL_CACHE_SQLITE_PATH")
+    if sqlite_path:
+        try:
+            disk = SQLiteCache(sqlite_path, ttl=float(os.getenv("EMAIL_CACHE_DISK_TTL", str(ttl * 24))))
+        except sqlite3.Error as e:
+            logger.error(f"Could not open cache database {sqlite_path}: {str(e)}")
+
+    return ResponseCache(memory, disk)
@@ -0,0 +1,137 @@
+"""
+EmailCraft AI - Deadlines
+Per-request time budgets, and cancelling work once the client has gone or the budget is spent
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Mapping, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Seconds the client is willing to wait, e.g. `X-Request-Timeout: 20`
+DEADLINE_HEADER = "x-request-timeout"
+
+# Upper bound on any generation, whatever the client asks for
+MAX_GENERATION_SECONDS = float(os.getenv("EMAIL_MAX_GENERATION_SECONDS", "60"))
+
+# Not worth sending an upstream call with less time than this left
+MIN_UPSTREAM_SECONDS = 0.05
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out"""
+
+    def __init__(self, message: str = "The request's time budget ran out"):
+        super().__init__(message)
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before the response was ready"""
+
+
+def deadline_from_headers(headers: Mapping[str, str], now: Optional[float] = None) -> float:
+    """
+    time.monotonic() deadline for a request: the client's X-Request-Timeout
+    budget, capped at MAX_GENERATION_SECONDS. Unparseable values are ignored.
+    """
+    now = time.monotonic() if now is None else now
+    budget = MAX_GENERATION_SECONDS
+    value = headers.get(DEADLINE_HEADER)
+    if value:
+        try:
+            budget = min(budget, max(0.0, float(value)))
+        except ValueError:
+            logger.debug(f"Ignoring invalid {DEADLINE_HEADER} header: {value!r}")
+    return now + budget
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """
+    Seconds left before `deadline` (None without one), for the next stage's
+    timeout. Raises DeadlineExceeded when too little is left to be useful.
+    """
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left < MIN_UPSTREAM_SECONDS:
+        raise DeadlineExceeded()
+    return left
+
+
+async def wait_for_disconnect(receive: Callable[[], Awaitable[dict]]) -> None:
+    """Return once the ASGI server reports the client gone (call after the body has been read)"""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _cancel(*tasks: Optional[asyncio.Future]) -> None:
+    pending = [task for task in tasks if task is not None and not task.done()]
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def run_until(work: Awaitable[T], deadline: float,
+                    receive: Optional[Callable[[], Awaitable[dict]]] = None) -> T:
+    """
+    Await `work`, cancelling it (and so its upstream call) at `deadline`
+    or when the client disconnects. Raises DeadlineExceeded or
+    ClientDisconnected accordingly.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive)) if receive is not None else None
+    try:
+        done, _ = await asyncio.wait(
+            {task} if watcher is None else {task, watcher},
+            timeout=max(0.0, deadline - time.monotonic()),
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        if task in done:
+            return task.result()
+        if watcher is not None and watcher in done:
+            raise ClientDisconnected()
+        raise DeadlineExceeded()
+    finally:
+        await _cancel(task, watcher)
+
+
+async def relay(queue: "asyncio.Queue[T]", producer: asyncio.Future, deadline: float,
+                disconnected: Optional[asyncio.Future] = None) -> AsyncIterator[T]:
+    """
+    Yield what `producer` puts on `queue` until it finishes (re-raising its
+    error). At `deadline` or once `disconnected` completes, the producer is
+    cancelled and DeadlineExceeded or ClientDisconnected raised. Keeping
+    the upstream stream in its own task lets a stream stop between chunks
+    without cancelling the response task.
+    """
+    getter: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            waiting = {getter, producer} if disconnected is None else {getter, producer, disconnected}
+            done, _ = await asyncio.wait(
+                waiting, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter in done:
+                item, getter = getter.result(), None
+                yield item
+            elif producer in done:
+                while not queue.empty():
+                    yield queue.get_nowait()
+                producer.result()
+                return
+            elif disconnected is not None and disconnected in done:
+                raise ClientDisconnected()
+            else:
+                raise DeadlineExceeded()
+    finally:
+        await _cancel(getter, producer)
@@ -0,0 +1,431 @@
+"""
+EmailCraft AI - Provider gateway
+Concurrency limiting, fair scheduling, token budgeting and adaptive backoff in front of the model provider
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Container, Mapping, Optional, TypeVar
+
+from scheduler import PRIORITIES, PRIORITY_BATCH, FairQueue, Waiter, current_request_class, parse_weights
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Upstream statuses that mean "slow down" rather than "this request is broken"
+THROTTLE_STATUSES = (429, 503)
+
+TOKEN_WINDOW = 60.0
+
+
+class GatewayOverloaded(Exception):
+    """Raised when a request cannot be admitted in time; maps to HTTP 429"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+def _parse_reset(value: str) -> Optional[float]:
+    """Seconds until a rate-limit reset given as a delta, epoch seconds or epoch milliseconds"""
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    if reset > 1e12:
+        return max(0.0, reset / 1000 - time.time())
+    if reset > 1e9:
+        return max(0.0, reset - time.time())
+    return max(0.0, reset)
+
+
+def _response_headers(error: BaseException) -> Optional[Mapping[str, str]]:
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None)
+
+
+def throttle_info(error: BaseException) -> Optional[tuple[int, Optional[float]]]:
+    """
+    Return (status, retry_after) if the error is an upstream throttle.
+
+    Walks the exception chain so both httpx.HTTPStatusError and pydantic-ai's
+    ModelHTTPError (raised from the OpenAI SDK error) are recognised.
+    """
+    chain = []
+    current: Optional[BaseException] = error
+    while current is not None and len(chain) < 10:
+        chain.append(current)
+        current = current.__cause__
+
+    statuses = (
+        getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+        for e in chain
+    )
+    status = next((s for s in statuses if s is not None), None)
+    if status not in THROTTLE_STATUSES:
+        return None
+
+    headers = next((h for h in map(_response_headers, chain) if h is not None), None)
+    retry_after = None
+    if headers is not None:
+        retry_after = _parse_reset(headers.get("retry-after")) or _parse_reset(headers.get("x-ratelimit-reset"))
+    return status, retry_after
+
+
+class ProviderGateway:
+    """
+    Admission control for upstream model calls.
+
+    In-flight calls are capped by an AIMD limit: it grows by 1/limit after
+    each success and halves on every throttle, between `min_concurrency`
+    and `max_concurrency`. A tokens-per-minute budget is tracked over a
+    sliding window.
+
+    Waiting callers are admitted by a FairQueue: interactive calls before
+    batch calls, tenants in weighted fair order within a class. Batch calls
+    may hold at most `batch_share` of the limit, so an interactive call
+    never waits behind a campaign for a slot, and no tenant holds more than
+    `tenant_max_concurrency` slots. The tenant and class come from the
+    current RequestClass (see scheduler.scheduling).
+
+    Callers that cannot be admitted within their class's maximum wait (or
+    their own deadline), whose projected wait already exceeds it, or that
+    arrive when `max_queue` callers are waiting get GatewayOverloaded with
+    a Retry-After hint instead of piling up.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        tokens_per_minute: int = 0,
+        max_queue: int = 100,
+        max_wait: float = 10.0,
+        max_retries: int = 2,
+        base_backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        batch_max_wait: float = 120.0,
+        batch_share: float = 0.5,
+        tenant_max_concurrency: int = 0,
+        tenant_weights: Optional[dict[str, float]] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.batch_max_wait = batch_max_wait
+        self.batch_share = batch_share
+        self.tenant_max_concurrency = tenant_max_concurrency
+
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._cooldown_until = 0.0
+        self._usage: deque[list[float]] = deque()
+        self._queue = FairQueue(tenant_weights)
+        self._class_in_flight = {priority: 0 for priority in PRIORITIES}
+        self._tenant_in_flight: dict[str, int] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._service_time: Optional[float] = None  # moving average of slot hold time
+
+        # Counters
+        self.admitted = 0
+        self.rejected = 0
+        self.rejected_deadline = 0
+        self.throttled = 0
+        self.retries = 0
+        self._wait_times: dict[str, deque[float]] = {priority: deque(maxlen=1000) for priority in PRIORITIES}
+
+    @property
+    def waiting(self) -> int:
+        return self._queue.depth()
+
+    @property
+    def tenants(self) -> Container[str]:
+        """Tenants with a configured weight; the only API keys that are tenants of their own"""
+        return self._queue.weights
+
+    # Token budget
+
+    def _tokens_used(self, now: float) -> float:
+        while self._usage and self._usage[0][0] <= now - TOKEN_WINDOW:
+            self._usage.popleft()
+        return sum(tokens for _, tokens in self._usage)
+
+    def _tokens_fit(self, tokens: int, now: float) -> bool:
+        if not self.tokens_per_minute:
+            return True
+        used = self._tokens_used(now)
+        return used == 0 or used + tokens <= self.tokens_per_minute
+
+    def _next_change(self, now: float) -> float:
+        """How long until admission could change without a release"""
+        candidates = [self.max_wait]
+        if now < self._cooldown_until:
+            candidates.append(self._cooldown_until - now)
+        if self.tokens_per_minute and self._usage:
+            candidates.append(self._usage[0][0] + TOKEN_WINDOW - now)
+        return max(0.01, min(candidates))
+
+    # AIMD
+
+    def _on_success(self) -> None:
+        self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+    def _on_throttle(self, retry_after: Optional[float]) -> None:
+        self.throttled += 1
+        self.limit = max(float(self.min_concurrency), self.limit / 2)
+        if retry_after:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + retry_after)
+        logger.warning(f"Provider throttled - concurrency limit now {int(self.limit)}, retry_after: {retry_after}")
+
+    def observe_headers(self, headers: Mapping[str, str]) -> None:
+        """Back off early when the provider reports an exhausted rate limit"""
+        remaining = headers.get("x-ratelimit-remaining-requests") or headers.get("x-ratelimit-remaining")
+        if remaining is not None and remaining.strip() == "0":
+            reset = _parse_reset(headers.get("x-ratelimit-reset-requests") or headers.get("x-ratelimit-reset"))
+            self._on_throttle(reset)
+
+    def _suggest_retry_after(self) -> float:
+        now = time.monotonic()
+        if now < self._cooldown_until:
+            return self._cooldown_until - now
+        if self.tokens_per_minute and self._usage and self._tokens_used(now) >= self.tokens_per_minute / 2:
+            return self._usage[0][0] + TOKEN_WINDOW - now
+        return 1.0
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    # Scheduling
+
+    def _batch_limit(self) -> int:
+        return max(1, int(int(self.limit) * self.batch_share))
+
+    def _eligible(self, waiter: Waiter) -> bool:
+        """Whether a queued caller may take a free slot right now"""
+        if waiter.future.done():
+            return True  # abandoned; popped and dropped
+        if waiter.priority == PRIORITY_BATCH and self._class_in_flight[PRIORITY_BATCH] >= self._batch_limit():
+            return False
+        if self.tenant_max_concurrency and self._tenant_in_flight.get(waiter.tenant, 0) >= self.tenant_max_concurrency:
+            return False
+        return self._tokens_fit(waiter.tokens, time.monotonic())
+
+    def _dispatch(self) -> None:
+        """Hand free slots to queued callers in scheduling order"""
+        now = time.monotonic()
+        while self.in_flight < int(self.limit) and now >= self._cooldown_until:
+            waiter = self._queue.pop(self._eligible)
+            if waiter is None:
+                break
+            if waiter.future.done():
+                continue
+            self._acquire(waiter.tenant, waiter.priority)
+            entry = [now, float(waiter.tokens)]
+            self._usage.append(entry)
+            waiter.future.set_result(entry)
+
+        # Cooldowns and the token window expire without a release to trigger dispatch
+        if self.waiting and self._timer is None and self.in_flight < int(self.limit):
+            self._timer = asyncio.get_running_loop().call_later(self._next_change(now), self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _acquire(self, tenant: str, priority: str) -> None:
+        self.in_flight += 1
+        self.admitted += 1
+        self._class_in_flight[priority] += 1
+        self._tenant_in_flight[tenant] = self._tenant_in_flight.get(tenant, 0) + 1
+
+    def _release(self, tenant: str, priority: str, held: float) -> None:
+        self.in_flight -= 1
+        self._class_in_flight[priority] -= 1
+        remaining = self._tenant_in_flight[tenant] - 1
+        if remaining:
+            self._tenant_in_flight[tenant] = remaining
+        else:
+            del self._tenant_in_flight[tenant]
+        self._service_time = held if self._service_time is None else 0.8 * self._service_time + 0.2 * held
+        self._dispatch()
+
+    def _projected_wait(self, priority: str) -> float:
+        """Rough queueing delay for a new caller of this class, from the average slot hold time"""
+        if self._service_time is None:
+            return 0.0
+        if priority == PRIORITY_BATCH:
+            capacity, busy = self._batch_limit(), self._class_in_flight[PRIORITY_BATCH]
+            ahead = self._queue.depth()
+        else:
+            capacity, busy = int(self.limit), self.in_flight
+            ahead = self._queue.depth(priority)
+        free = max(0, capacity - busy)
+        if ahead < free:
+            return 0.0
+        return (ahead - free + 1) / max(1, capacity) * self._service_time
+
+    # Admission
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0) -> AsyncIterator[list[float]]:
+        """
+        Hold one in-flight slot for the duration of the block.
+
+        Yields the usage entry so the caller can replace the estimate with
+        the real token count once it is known.
+        """
+        request_class = current_request_class()
+        priority = request_class.priority
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise GatewayOverloaded("Too many requests waiting for the model provider", self._suggest_retry_after())
+
+        start = time.monotonic()
+        deadline = start + (self.batch_max_wait if priority == PRIORITY_BATCH else self.max_wait)
+        if request_class.deadline is not None:
+            # The call itself has to fit before the caller's deadline too
+            deadline = min(deadline, request_class.deadline - (self._service_time or 0.0))
+
+        # Deadline-aware admission: refuse now rather than after waiting in vain
+        projected = self._projected_wait(priority)
+        if start + projected > deadline:
+            self.rejected += 1
+            self.rejected_deadline += 1
+            raise GatewayOverloaded(
+                "The model provider cannot serve this request before its deadline",
+                max(projected, self._suggest_retry_after())
+            )
+
+        waiter = Waiter(request_class.tenant, priority, estimated_tokens, deadline,
+                        asyncio.get_running_loop().create_future(), start)
+        self._queue.push(waiter)
+        self._dispatch()
+        try:
+            entry = await asyncio.wait_for(waiter.future, timeout=deadline - start)
+        except BaseException as e:
+            self._queue.remove(waiter)
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the wait was abandoned
+                self._release(waiter.tenant, priority, 0.0)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise GatewayOverloaded(
+                    "Timed out waiting for the model provider", self._suggest_retry_after()
+                ) from None
+            raise
+        finally:
+            self._wait_times[priority].append(time.monotonic() - start)
+
+        admitted_at = time.monotonic()
+        try:
+            yield entry
+        finally:
+            self._release(waiter.tenant, priority, time.monotonic() - admitted_at)
+
+    @asynccontextmanager
+    async def stream(self, estimated_tokens: int = 0) -> AsyncIterator[list[float]]:
+        """
+        Hold a slot for a streamed call, with the throttle handling of `call`.
+
+        A stream cannot be replayed once tokens have gone to the client, so
+        a throttle is not retried here: it halves the limit and surfaces as
+        GatewayOverloaded with a Retry-After hint.
+        """
+        async with self.slot(estimated_tokens) as entry:
+            try:
+                yield entry
+            except Exception as e:
+                info = throttle_info(e)
+                if info is None:
+                    raise
+                _, retry_after = info
+                self._on_throttle(retry_after)
+                raise GatewayOverloaded(
+                    "The model provider is rate limiting requests", retry_after or self._backoff(1)
+                ) from e
+            self._on_success()
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        count_tokens: Optional[Callable[[T], int]] = None,
+    ) -> T:
+        """Run `fn` under admission control, retrying upstream throttles with jittered backoff"""
+        attempt = 0
+        while True:
+            async with self.slot(estimated_tokens) as entry:
+                try:
+                    result = await fn()
+                except Exception as e:
+                    info = throttle_info(e)
+                    if info is None:
+                        raise
+                    _, retry_after = info
+                    self._on_throttle(retry_after)
+                    if attempt >= self.max_retries:
+                        raise GatewayOverloaded(
+                            "The model provider is rate limiting requests",
+                            retry_after or self._backoff(attempt + 1)
+                        ) from e
+                else:
+                    self._on_success()
+                    if count_tokens is not None:
+                        entry[1] = float(count_tokens(result))
+                    return result
+
+            self.retries += 1
+            await asyncio.sleep(retry_after or self._backoff(attempt))
+            attempt += 1
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, concurrency and wait-time metrics, overall and per priority class"""
+        waits = sorted(wait for times in self._wait_times.values() for wait in times)
+        classes = self._queue.stats()
+        for priority, info in classes.items():
+            class_waits = sorted(self._wait_times[priority])
+            info["in_flight"] = self._class_in_flight[priority]
+            info["wait_ms_p95"] = round(class_waits[int(len(class_waits) * 0.95) - 1] * 1000, 2) if class_waits else 0.0
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "concurrency_limit": int(self.limit),
+            "tokens_last_minute": int(self._tokens_used(time.monotonic())),
+            "tokens_per_minute_budget": self.tokens_per_minute or None,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "rejected_deadline": self.rejected_deadline,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "wait_ms_p50": round(waits[len(waits) // 2] * 1000, 2) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95) - 1] * 1000, 2) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 2) if waits else 0.0,
+            "tenants_in_flight": len(self._tenant_in_flight),
+            "classes": classes,
+        }
+
+
+def create_provider_gateway() -> ProviderGateway:
+    """Build the provider gateway from environment settings"""
+    return ProviderGateway(
+        max_concurrency=int(os.getenv("PROVIDER_MAX_CONCURRENCY", "8")),
+        tokens_per_minute=int(os.getenv("PROVIDER_TOKENS_PER_MINUTE", "0")),
+        max_queue=int(os.getenv("PROVIDER_MAX_QUEUE", "100")),
+        max_wait=float(os.getenv("PROVIDER_MAX_WAIT", "10")),
+        max_retries=int(os.getenv("PROVIDER_MAX_RETRIES", "2")),
+        batch_max_wait=float(os.getenv("PROVIDER_BATCH_MAX_WAIT", "120")),
+        batch_share=float(os.getenv("PROVIDER_BATCH_SHARE", "0.5")),
+        tenant_max_concurrency=int(os.getenv("PROVIDER_TENANT_MAX_CONCURRENCY", "0")),
+        tenant_weights=parse_weights(os.getenv("SCHEDULER_TENANT_WEIGHTS", "")),
+    )
@@ -0,0 +1,376 @@
+"""
+EmailCraft AI - Outbound mail queue
+Durable send queue with retry scheduling, per-domain limits and dead-lettering
+"""
+
+import json
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from smtp_pool import SMTPSettings, build_message, get_smtp_pool, smtp_error_code
+
+logger = logging.getLogger(__name__)
+
+# Delivery states
+STATE_QUEUED = "queued"
+STATE_SENDING = "sending"
+STATE_RETRYING = "retrying"
+STATE_SENT = "sent"
+STATE_DEAD = "dead"
+
+# Recorded when a worker died (or hung) holding a job's lease
+LEASE_EXPIRED_ERROR = "Delivery did not finish before its lease expired"
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is over its depth limit"""
+
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Mail queue is full ({depth} pending messages)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+@dataclass
+class MailJob:
+    """One queued message"""
+    id: str
+    domain: str
+    payload: dict[str, Any]
+    attempts: int
+
+
+class MailQueue(ABC):
+    """
+    Storage interface for outbound mail.
+
+    The SQLite implementation below is meant for single-host deployments;
+    a broker-backed queue only needs to provide these operations.
+    """
+
+    @abstractmethod
+    def enqueue(self, payload: dict[str, Any]) -> str: ...
+
+    @abstractmethod
+    def claim(self, exclude_domains: set[str]) -> Optional[MailJob]: ...
+
+    @abstractmethod
+    def mark_sent(self, job_id: str) -> None: ...
+
+    @abstractmethod
+    def mark_retry(self, job_id: str, delay: float, error: str) -> None: ...
+
+    @abstractmethod
+    def mark_dead(self, job_id: str, error: str, attempted: bool = True) -> None: ...
+
+    @abstractmethod
+    def status(self, job_id: str) -> Optional[dict[str, Any]]: ...
+
+    @abstractmethod
+    def depth(self) -> int: ...
+
+
+class SQLiteMailQueue(MailQueue):
+    """
+    File-backed queue; claimed jobs are leased so a crashed worker's jobs
+    are retried. An expired lease counts as an attempt, so a job that
+    keeps crashing its worker still runs out of attempts.
+    """
+
+    def __init__(self, path: str, max_depth: int = 10_000, lease: float = 300.0):
+        self.path = path
+        self.max_depth = max_depth
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mail_queue ("
+            "id TEXT PRIMARY KEY, domain TEXT NOT NULL, payload TEXT NOT NULL, state TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, lease_until REAL, "
+            "last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS mail_queue_due ON mail_queue (state, next_attempt_at)"
+        )
+
+    def enqueue(self, payload: dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        domain = payload["recipient_email"].rsplit("@", 1)[-1].lower()
+        now = time.time()
+        with self._lock:
+            conn = self._conn
+            # The depth check and the insert share one write transaction, so
+            # concurrent enqueues (from any process) cannot overshoot max_depth
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                depth = conn.execute(
+                    "SELECT COUNT(*) FROM mail_queue WHERE state IN (?, ?, ?)",
+                    (STATE_QUEUED, STATE_RETRYING, STATE_SENDING),
+                ).fetchone()[0]
+                if depth >= self.max_depth:
+                    raise QueueFullError(depth, retry_after=30)
+                conn.execute(
+                    "INSERT INTO mail_queue (id, domain, payload, state, next_attempt_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, domain, json.dumps(payload), STATE_QUEUED, now, now, now),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim(self, exclude_domains: set[str]) -> Optional[MailJob]:
+        now = time.time()
+        excluded = sorted(exclude_domains)
+        placeholders = ",".join("?" * len(excluded))
+        domain_filter = f"AND domain NOT IN ({placeholders})" if excluded else ""
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE mail_queue SET state = ?, lease_until = ?, updated_at = ?, "
+                "attempts = CASE WHEN state = ? THEN attempts + 1 ELSE attempts END, "
+                "last_error = CASE WHEN state = ? THEN ? ELSE last_error END WHERE id = ("
+                "SELECT id FROM mail_queue WHERE ("
+                "(state IN (?, ?) AND next_attempt_at <= ?) OR (state = ? AND lease_until < ?)"
+                f") {domain_filter} ORDER BY next_attempt_at LIMIT 1"
+                ") RETURNING id, domain, payload, attempts",
+                (STATE_SENDING, now + self.lease, now, STATE_SENDING, STATE_SENDING, LEASE_EXPIRED_ERROR,
+                 STATE_QUEUED, STATE_RETRYING, now, STATE_SENDING, now, *excluded),
+            ).fetchone()
+        if row is None:
+            return None
+        return MailJob(row["id"], row["domain"], json.loads(row["payload"]), row["attempts"])
+
+    def mark_sent(self, job_id: str) -> None:
+        self._finish(job_id, STATE_SENT, None, 0.0)
+
+    def mark_retry(self, job_id: str, delay: float, error: str) -> None:
+        self._finish(job_id, STATE_RETRYING, error, delay)
+
+    def mark_dead(self, job_id: str, error: str, attempted: bool = True) -> None:
+        self._finish(job_id, STATE_DEAD, error, 0.0, attempted)
+
+    def _finish(self, job_id: str, state: str, error: Optional[str], delay: float, attempted: bool = True) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE mail_queue SET state = ?, attempts = attempts + ?, last_error = ?, "
+                "next_attempt_at = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                (state, int(attempted), error, now + delay, now, job_id),
+            )
+
+    def status(self, job_id: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, state, attempts, last_error, next_attempt_at, created_at, updated_at, payload "
+                "FROM mail_queue WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "message_id": row["id"],
+            "state": row["state"],
+            "recipient": json.loads(row["payload"])["recipient_email"],
+            "attempts": row["attempts"],
+            "last_error": row["last_error"],
+            "next_attempt_at": row["next_attempt_at"] if row["state"] == STATE_RETRYING else None,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM mail_queue WHERE state IN (?, ?, ?)",
+                (STATE_QUEUED, STATE_RETRYING, STATE_SENDING),
+            ).fetchone()[0]
+
+
+class MailWorker:
+    """
+    Background delivery threads.
+
+    Temporary failures (4xx replies, dropped connections) are retried with
+    jittered exponential backoff; permanent 5xx failures, rejected SMTP
+    credentials and jobs out of attempts are dead-lettered. No more than `per_domain` messages are in
+    flight to one recipient domain at a time.
+    """
+
+    def __init__(
+        self,
+        queue: MailQueue,
+        settings_factory: Callable[[], SMTPSettings] = SMTPSettings.from_env,
+        workers: int = 2,
+        per_domain: int = 2,
+        max_attempts: int = 8,
+        base_delay: float = 30.0,
+        max_delay: float = 3600.0,
+        poll_interval: float = 1.0,
+    ):
+        self.queue = queue
+        self.settings_factory = settings_factory
+        self.workers = workers
+        self.per_domain = per_domain
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._in_flight: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"mail-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Mail workers started - workers: {self.workers}, per_domain: {self.per_domain}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt, with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempts)))
+
+    def _claim(self) -> Optional[MailJob]:
+        with self._lock:
+            busy = {domain for domain, count in self._in_flight.items() if count >= self.per_domain}
+            job = self.queue.claim(busy)
+            if job is not None:
+                self._in_flight[job.domain] = self._in_flight.get(job.domain, 0) + 1
+            return job
+
+    def _release(self, job: MailJob) -> None:
+        with self._lock:
+            self._in_flight[job.domain] -= 1
+            if not self._in_flight[job.domain]:
+                del self._in_flight[job.domain]
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                self.deliver(job)
+            finally:
+                self._release(job)
+
+    def deliver(self, job: MailJob) -> None:
+        """Attempt one delivery and record the outcome"""
+        if job.attempts >= self.max_attempts:
+            # Only reachable through expired leases, i.e. earlier attempts that never reported back
+            self.queue.mark_dead(job.id, LEASE_EXPIRED_ERROR, attempted=False)
+            logger.error(f"Queued email {job.id} dead-lettered after {job.attempts} attempts: {LEASE_EXPIRED_ERROR}")
+            return
+        try:
+            settings = self.settings_factory()
+            payload = job.payload
+            message = build_message(
+                settings,
+                payload["recipient_email"],
+                payload["subject"],
+                payload["body"],
+                payload.get("sender_name", "EmailCraft AI")
+            )
+            result = get_smtp_pool().send_messages(settings, [message])[0]
+        except smtplib.SMTPException as e:
+            # Raised before the message was sent, e.g. while logging in
+            result = {
+                "success": False,
+                "error": str(e),
+                "code": smtp_error_code(e),
+                "permanent": isinstance(e, smtplib.SMTPAuthenticationError),
+            }
+        except Exception as e:
+            result = {"success": False, "error": str(e), "code": None}
+
+        if result["success"]:
+            self.queue.mark_sent(job.id)
+            logger.info(f"Queued email {job.id} delivered")
+            return
+
+        code = result.get("code")
+        attempts = job.attempts + 1
+        permanent = result.get("permanent") or (code is not None and code >= 500)
+        if permanent or attempts >= self.max_attempts:
+            self.queue.mark_dead(job.id, result["error"])
+            logger.error(f"Queued email {job.id} dead-lettered after {attempts} attempts: {result['error']}")
+        else:
+            delay = self.backoff(attempts)
+            self.queue.mark_retry(job.id, delay, result["error"])
+            logger.warning(f"Queued email {job.id} failed, retrying in {delay:.0f}s: {result['error']}")
+
+
+# Global queue and workers, created when MAIL_QUEUE_PATH is set
+_mail_queue: Optional[MailQueue] = None
+_mail_worker: Optional[MailWorker] = None
+_mail_queue_lock = threading.Lock()
+
+
+def get_mail_queue() -> Optional[MailQueue]:
+    """Return the process-wide mail queue, or None when queueing is disabled"""
+    global _mail_queue
+    path = os.getenv("MAIL_QUEUE_PATH")
+    if not path:
+        return None
+    with _mail_queue_lock:
+        if _mail_queue is None:
+            _mail_queue = SQLiteMailQueue(path, max_depth=int(os.getenv("MAIL_QUEUE_MAX_DEPTH", "10000")))
+    return _mail_queue
+
+
+def ensure_mail_worker() -> Optional[MailWorker]:
+    """Start in-process delivery workers unless MAIL_QUEUE_WORKERS is 0"""
+    global _mail_worker
+    queue = get_mail_queue()
+    workers = int(os.getenv("MAIL_QUEUE_WORKERS", "2"))
+    if queue is None or workers <= 0:
+        return None
+    with _mail_queue_lock:
+        if _mail_worker is None:
+            _mail_worker = MailWorker(
+                queue,
+                workers=workers,
+                per_domain=int(os.getenv("MAIL_QUEUE_PER_DOMAIN", "2")),
+                max_attempts=int(os.getenv("MAIL_QUEUE_MAX_ATTEMPTS", "8")),
+                base_delay=float(os.getenv("MAIL_QUEUE_RETRY_BASE", "30")),
+            )
+            _mail_worker.start()
+    return _mail_worker
+
+
+if __name__ == "__main__":
+    # Standalone worker process: python backend/mail_queue.py
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if get_mail_queue() is None:
+        raise SystemExit("Set MAIL_QUEUE_PATH to the queue database")
+    worker = ensure_mail_worker()
+    if worker is None:
+        raise SystemExit("Set MAIL_QUEUE_WORKERS to at least 1")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        worker.stop()
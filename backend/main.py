@@ -3,17 +3,57 @@ EmailCraft AI - Backend API
 Professional email writing assistant powered by Pydantic AI
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, field_validator
-from pydantic_ai import Agent
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+import asyncio
 import logging
 import os
-from typing import Optional, Literal
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import TYPE_CHECKING, Optional, Literal, Union
 from datetime import datetime
 import httpx
 from dotenv import load_dotenv
 
+from batch import render_template, run_batch, to_ndjson
+from cache import (
+    cache_key, cache_mode_from_headers, create_response_cache, MemoryCache, CACHE_MODE_BYPASS, CACHE_MODE_DEFAULT
+)
+from deadlines import (
+    MAX_GENERATION_SECONDS, ClientDisconnected, DeadlineExceeded, deadline_from_headers, relay,
+    remaining, run_until, wait_for_disconnect
+)
+from gateway import GatewayOverloaded, create_provider_gateway
+from mail_queue import QueueFullError, ensure_mail_worker, get_mail_queue
+from metrics import (
+    CACHE_LOOKUPS, CANCELLED_REQUESTS, CONTENT_TYPE, GENERATION_REQUESTS, OUTPUT_PARSE, REFINEMENTS, REFINE_EDITS,
+    REGISTRY, TEMPLATE_ROUTING, TOKENS_SAVED, MetricsMiddleware, model_call, record_since_start, record_tokens,
+    register_components, span
+)
+from postprocess import StreamingEmailParser, append_signature, parse_email, render_signature
+from prompts import EDIT_SYSTEM_PROMPT, SYSTEM_PROMPT, AssembledPrompt, PromptBudgetExceeded, create_prompt_builder
+from provider import OPENROUTER_BASE_URL, provider_http_client
+from ratelimit import RateLimitMiddleware, create_rate_limiter
+from refine import apply_local_edits, apply_model_edits, plan_local_edits, requested_tone, split_for_model
+from router import create_model_router, model_list_from_env
+from scheduler import PRIORITY_BATCH, current_request_class, request_class_from_headers, scheduling
+from semantic_cache import create_semantic_cache
+from singleflight import SingleFlight
+from smtp_pool import SMTPSettings, build_message, get_smtp_pool, send_batch, validate_address
+from streaming import SSE_HEADERS, sse_event
+from structured import StructuredEmail, output_type as structured_output_type
+from templates import create_template_library
+
+if TYPE_CHECKING:
+    # pydantic-ai and the OpenAI SDK take about a second to import; they are
+    # loaded on first use so health checks answer straight away
+    from pydantic_ai import Agent
+    from pydantic_ai.models.openai import OpenAIChatModel
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -24,13 +64,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warm up the agent in the background and resume delivery of queued mail
+    left over from a previous run; persist the semantic cache on shutdown
+    """
+    if os.getenv("EMAIL_AGENT_WARMUP", "true").lower() not in ("0", "false", "no"):
+        asyncio.get_running_loop().run_in_executor(None, warm_up_email_agent)
+    await asyncio.to_thread(ensure_mail_worker)  # no-op unless MAIL_QUEUE_PATH is set
+    yield
+    if semantic_cache is not None:
+        semantic_cache.save()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="EmailCraft AI API",
     description="AI-powered professional email writing assistant",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Per-client budgets for generate and send routes; added first so it runs
+# inside CORS (preflight requests and 429s still get CORS headers)
+rate_limiter = create_rate_limiter()
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -38,9 +99,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing", "X-Cache", "Retry-After"],
 )
 
+# Request metrics, request ids and Server-Timing headers
+app.add_middleware(MetricsMiddleware)
+
+# Batch generation limits
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# Largest batch accepted by /api/send-emails/batch
+SEND_BATCH_MAX_MESSAGES = int(os.getenv("SEND_BATCH_MAX_MESSAGES", "100"))
+
+# Most drafts one /api/generate-email call may ask for
+MAX_VARIANTS = int(os.getenv("EMAIL_MAX_VARIANTS", "5"))
+
+# Output mode for requests that do not choose one: "text" or "structured"
+DEFAULT_OUTPUT_MODE = "structured" if os.getenv("EMAIL_OUTPUT_MODE", "text").lower() == "structured" else "text"
+
+# A client repeating a request within this many seconds counts as a regeneration
+REGENERATE_WINDOW = float(os.getenv("REGENERATE_WINDOW", "600"))
+
+
 # Request/Response Models
+class SenderSignature(BaseModel):
+    """Sender details appended below the generated email"""
+    name: Optional[str] = Field(None, max_length=100)
+    title: Optional[str] = Field(None, max_length=100)
+    department: Optional[str] = Field(None, max_length=100)
+    company: Optional[str] = Field(None, max_length=100)
+    phone: Optional[str] = Field(None, max_length=50)
+    email: Optional[str] = Field(None, max_length=254)
+    linkedin: Optional[str] = Field(None, max_length=200)
+
+
 class EmailRequest(BaseModel):
     """Email generation request model with validation"""
     context: str = Field(
@@ -63,6 +157,28 @@ class EmailRequest(BaseModel):
         max_length=500,
         description="Any additional context or requirements"
     )
+    mention_attachments: bool = Field(
+        default=False,
+        description="Say that documents (resume, portfolio, etc.) are attached"
+    )
+    sender_signature: Optional[SenderSignature] = Field(
+        None,
+        description="Signature appended below the email; applied after caching"
+    )
+    generation: Literal["auto", "model"] = Field(
+        default="auto",
+        description="'auto' answers common intents from templates; 'model' always calls the model"
+    )
+    variants: int = Field(
+        default=1,
+        ge=1,
+        le=MAX_VARIANTS,
+        description="Number of drafts to return; more than one returns a list"
+    )
+    output_mode: Literal["text", "structured"] = Field(
+        default=DEFAULT_OUTPUT_MODE,
+        description="'structured' asks the model for a typed email (subject, sections, suggestions) through a tool call"
+    )
     
     @field_validator('context')
     @classmethod
@@ -71,6 +187,21 @@ class EmailRequest(BaseModel):
         if not v.strip():
             raise ValueError("Context cannot be empty")
         return v.strip()
+    
+    @model_validator(mode='after')
+    def validate_variants(self) -> 'EmailRequest':
+        """Variants come from one multi-choice completion, which is plain text"""
+        if self.variants > 1 and self.output_mode == "structured":
+            raise ValueError("variants are only available with the text output mode")
+        return self
+
+
+class TokenUsage(BaseModel):
+    """Token cost of one generation"""
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    max_tokens: int
 
 
 class EmailResponse(BaseModel):
@@ -80,6 +211,99 @@ class EmailResponse(BaseModel):
     tone: str
     generated_at: str
     suggestions: list[str]
+    usage: Optional[TokenUsage] = None
+    generation: Literal["model", "template", "edit"] = "model"
+    intent: Optional[str] = None  # template intent, when generation is "template"
+    edits: Optional[list[str]] = None  # changes made by /api/refine-email
+    partial: bool = False  # a stream cut short by its deadline
+
+
+class RefineRequest(BaseModel):
+    """Edit a previous draft instead of regenerating it"""
+    email: EmailResponse
+    instruction: str = Field(
+        ...,
+        min_length=3,
+        max_length=500,
+        description="What to change, e.g. 'make the closing more casual' or 'make it shorter'"
+    )
+    sender_signature: Optional[SenderSignature] = Field(
+        None,
+        description="Signature to swap in when the instruction asks for it"
+    )
+    
+    @field_validator('instruction')
+    @classmethod
+    def validate_instruction(cls, v: str) -> str:
+        if not v.strip():
+            raise ValueError("Instruction cannot be empty")
+        return v.strip()
+
+
+class BatchEmailRequest(BaseModel):
+    """
+    Batch generation request
+    
+    Either `items` (EmailRequest-style objects, each with an optional `id`)
+    or a `template` whose text fields contain {variable} placeholders plus
+    one `recipients` entry of variables per email.
+    """
+    items: Optional[list[dict]] = Field(None, max_length=BATCH_MAX_ITEMS)
+    template: Optional[dict] = None
+    recipients: Optional[list[dict]] = Field(None, max_length=BATCH_MAX_ITEMS)
+    concurrency: int = Field(
+        default=BATCH_DEFAULT_CONCURRENCY,
+        ge=1,
+        le=BATCH_MAX_CONCURRENCY,
+        description="Maximum number of items generated at once"
+    )
+    skip_ids: list[str] = Field(
+        default_factory=list,
+        description="Item ids already received, to resume an interrupted batch"
+    )
+    
+    @model_validator(mode='after')
+    def validate_source(self) -> 'BatchEmailRequest':
+        """Require exactly one of items or template + recipients"""
+        if (self.items is None) == (self.template is None):
+            raise ValueError("Provide either 'items' or 'template' with 'recipients'")
+        if self.template is not None and not self.recipients:
+            raise ValueError("'recipients' is required when using a template")
+        return self
+    
+    def iter_items(self):
+        """Yield (item_id, payload) pairs; ids default to the item's position"""
+        if self.items is not None:
+            for index, item in enumerate(self.items):
+                yield str(item.get("id", index)), item
+        else:
+            for index, variables in enumerate(self.recipients):
+                yield str(variables.get("id", index)), variables
+
+
+class SendEmailRequest(BaseModel):
+    """Single email delivery request"""
+    recipient_email: str = Field(..., min_length=3, max_length=254)
+    subject: str = Field(..., min_length=1, max_length=500)
+    body: str = Field(..., min_length=1)
+    sender_name: str = Field(default="EmailCraft AI", max_length=100)
+    
+    @field_validator('recipient_email')
+    @classmethod
+    def validate_recipient(cls, v: str) -> str:
+        """A single bare address, safe to put in an SMTP command"""
+        return validate_address(v)
+
+
+class SendBatchRequest(BaseModel):
+    """
+    Batch delivery request
+    
+    Entries missing a recipient, subject or body are reported in the
+    results instead of failing the whole batch.
+    """
+    emails: list[dict] = Field(..., min_length=1, max_length=SEND_BATCH_MAX_MESSAGES)
+    sender_name: str = Field(default="EmailCraft AI", max_length=100)
 
 
 class HealthResponse(BaseModel):
@@ -89,9 +313,29 @@ class HealthResponse(BaseModel):
     version: str
 
 
+# Model configuration
+# Using gpt-3.5-turbo which works reliably (very low cost, credits from OpenRouter).
+# EMAIL_MODELS lists fallback candidates (OpenRouter ids, comma separated); the
+# first entry is the primary model and identifies cached responses.
+MODEL_NAMES = model_list_from_env('openai:gpt-3.5-turbo')
+MODEL_NAME = MODEL_NAMES[0]
+
+# Compact prompt templates and per-request token budgets
+prompt_builder = create_prompt_builder()
+
+
+# Admission control in front of the model provider
+provider_gateway = create_provider_gateway()
+
+
+async def observe_rate_limits(response: httpx.Response) -> None:
+    """Feed provider rate-limit headers to the gateway"""
+    provider_gateway.observe_headers(response.headers)
+
+
 # Initialize AI Agent
-def create_email_agent() -> Agent:
-    """Create and configure the Pydantic AI agent for email generation"""
+def create_email_agent() -> tuple["Agent", dict[str, "OpenAIChatModel"]]:
+    """Create the Pydantic AI agent and one model per routing candidate"""
     
     # Use a free model from OpenRouter
     api_key = os.getenv("OPENROUTER_API_KEY", "")
@@ -100,36 +344,450 @@ def create_email_agent() -> Agent:
         logger.error("No API key found. Please set OPENROUTER_API_KEY environment variable.")
         raise ValueError("OPENROUTER_API_KEY environment variable is required")
     
-    system_prompt = """You are an expert email writing assistant. Your task is to craft professional, 
-    clear, and effective emails based on the user's context and requirements.
+    base_url = os.getenv("OPENROUTER_BASE_URL", OPENROUTER_BASE_URL)
+    if base_url == OPENROUTER_BASE_URL and not api_key.startswith("sk-or-v1-"):
+        raise ValueError("Invalid OPENROUTER_API_KEY format. Please get a new key from https://openrouter.ai/settings/keys")
     
-    Guidelines:
-    - Always maintain the requested tone
-    - Keep emails concise but complete
-    - Use proper email etiquette
-    - Include appropriate greetings and closings
-    - Be culturally sensitive and professional
-    - Avoid jargon unless specifically requested
+    from openai import AsyncOpenAI
+    from pydantic_ai import Agent
+    from pydantic_ai.models.openai import OpenAIChatModel
+    from pydantic_ai.providers.openai import OpenAIProvider
     
-    Format your response as a complete email with greeting, body, and closing."""
-    
-    # Configure OpenRouter as OpenAI-compatible endpoint
-    os.environ["OPENAI_API_KEY"] = api_key
-    os.environ["OPENAI_BASE_URL"] = "https://openrouter.ai/api/v1"
+    # Configure OpenRouter as OpenAI-compatible endpoint. The SDK's own retries
+    # are disabled so the provider gateway alone decides when to retry.
+    openai_client = AsyncOpenAI(
+        base_url=base_url,
+        api_key=api_key,
+        max_retries=0,
+        http_client=provider_http_client(base_url, response_hooks=[observe_rate_limits]),
+    )
+    provider = OpenAIProvider(openai_client=openai_client)
+    models = {
+        name: OpenAIChatModel(name.removeprefix('openai:'), provider=provider)
+        for name in MODEL_NAMES
+    }
     
     # Create agent with OpenRouter model using OpenAI compatibility
-    # Using gpt-3.5-turbo which works reliably (very low cost, credits from OpenRouter)
     agent = Agent(
-        'openai:gpt-3.5-turbo',
-        system_prompt=system_prompt,
+        models[MODEL_NAME],
+        system_prompt=SYSTEM_PROMPT,
         retries=2,
     )
     
-    return agent
+    return agent, models
+
+
+# Global agent instance and routing candidates, created on first use
+_email_agent: Optional["Agent"] = None
+_agent_models: dict[str, "OpenAIChatModel"] = {}
+_agent_lock = threading.Lock()
+
+
+def get_email_agent() -> tuple["Agent", dict[str, "OpenAIChatModel"]]:
+    """Return the agent and its models, creating them on first call"""
+    global _email_agent, _agent_models
+    if _email_agent is None:
+        with _agent_lock:
+            if _email_agent is None:
+                agent, models = create_email_agent()
+                _agent_models = models
+                _email_agent = agent
+                logger.info(f"Email agent ready - Models: {', '.join(models)}")
+    return _email_agent, _agent_models
+
+
+async def email_agent_ready() -> tuple["Agent", dict[str, "OpenAIChatModel"]]:
+    """Like get_email_agent, but builds the agent off the event loop"""
+    if _email_agent is not None:
+        return _email_agent, _agent_models
+    return await asyncio.to_thread(get_email_agent)
+
+
+def warm_up_email_agent() -> None:
+    """Build the agent ahead of the first request; failures are retried on first use"""
+    try:
+        get_email_agent()
+    except Exception as e:
+        logger.error(f"Email agent warm-up failed: {str(e)}")
+
+
+model_router = create_model_router(MODEL_NAMES, no_fallback=(GatewayOverloaded, DeadlineExceeded))
+
+# Global response cache (None when disabled)
+response_cache = create_response_cache()
+
+# Near-duplicate tier behind the exact cache (None when disabled)
+semantic_cache = create_semantic_cache()
+
+# LLM-free drafts for common intents (None when disabled)
+template_library = create_template_library()
+
+# Recent generation requests per client, to count regenerations
+recent_generations = MemoryCache(max_entries=int(os.getenv("REGENERATE_TRACK_ENTRIES", "10000")), ttl=REGENERATE_WINDOW)
+
+# Identical in-flight generations, keyed on prompt, tone and model
+inflight_generations: SingleFlight[EmailResponse] = SingleFlight()
+
+register_components(provider_gateway, model_router, response_cache, inflight_generations, semantic_cache, rate_limiter)
+
+
+def build_prompt(request: EmailRequest) -> AssembledPrompt:
+    """Build the user prompt for the AI agent within the token budget"""
+    return prompt_builder.build(
+        request.tone,
+        request.context,
+        recipient_name=request.recipient_name,
+        additional_details=request.additional_details,
+        mention_attachments=request.mention_attachments,
+        structured=request.output_mode == "structured"
+    )
+
+
+def request_cache_key(request: EmailRequest) -> str:
+    """Response cache key; the signature is applied afterwards, so it is left out"""
+    return cache_key(
+        request.model_dump(exclude={"sender_signature", "generation", "variants"}), MODEL_NAME, SYSTEM_PROMPT
+    )
+
+
+def semantic_partition(request: EmailRequest) -> str:
+    """Requests are only compared with others that produce the same shape of email"""
+    recipient = "named" if request.recipient_name and request.recipient_name.strip() else "unnamed"
+    attachments = "attachments" if request.mention_attachments else "plain"
+    return f"{request.tone}-{recipient}-{attachments}-{MODEL_NAME}"
+
+
+def semantic_text(request: EmailRequest) -> str:
+    return f"{request.context}\n{request.additional_details or ''}"
+
+
+async def lookup_cached(request: EmailRequest, key: str, cache_mode: str) -> tuple[Optional[dict], Optional[str]]:
+    """
+    Exact cache first, then the semantic tier; returns the unsigned response
+    and its X-Cache status. The SQLite tier is read in a worker thread.
+    """
+    if cache_mode != CACHE_MODE_DEFAULT:
+        if response_cache is not None:
+            CACHE_LOOKUPS.inc(result=cache_mode)
+        return None, None
+    
+    if response_cache is not None:
+        with span("cache_lookup"):
+            cached = await response_cache.aget(key)
+        CACHE_LOOKUPS.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached, "HIT"
+    
+    if semantic_cache is not None:
+        with span("semantic_lookup"):
+            similar = semantic_cache.get(semantic_partition(request), semantic_text(request), request.recipient_name)
+        if similar is not None:
+            return similar, "SEMANTIC"
+    return None, None
+
+
+async def store_response(request: EmailRequest, key: str, cache_mode: str, email_response: EmailResponse) -> None:
+    """Write a fresh (unsigned) response to the exact and semantic caches"""
+    if cache_mode == CACHE_MODE_BYPASS:
+        return
+    value = email_response.model_dump()
+    if response_cache is not None:
+        await response_cache.aset(key, value)
+    if semantic_cache is not None:
+        semantic_cache.set(semantic_partition(request), semantic_text(request), value, request.recipient_name)
+
+
+def client_host(http_request: Request) -> Optional[str]:
+    return http_request.client.host if http_request.client else None
+
+
+def track_generation(request: EmailRequest, tenant: str, key: str) -> None:
+    """Count the request, flagging a repeat of the client's recent request as a regeneration"""
+    recent_key = f"{tenant}:{key}"
+    repeat = recent_generations.get(recent_key) is not None
+    recent_generations.set(recent_key, {"output_mode": request.output_mode})
+    GENERATION_REQUESTS.inc(mode=request.output_mode, repeat="true" if repeat else "false")
+
+
+def signature_for(request: EmailRequest) -> Optional[dict]:
+    return request.sender_signature.model_dump() if request.sender_signature is not None else None
+
+
+def sign_response(request: EmailRequest, email_response: EmailResponse) -> EmailResponse:
+    """Append the sender signature to a cached or shared response"""
+    signature = signature_for(request)
+    if not render_signature(signature):
+        return email_response
+    return email_response.model_copy(update={"body": append_signature(email_response.body, signature)})
+
+
+def template_response(request: EmailRequest) -> Optional[EmailResponse]:
+    """Answer a common intent from the template library, or None when the model is needed"""
+    if template_library is None or request.generation != "auto" or request.variants > 1:
+        return None
+    with span("template"):
+        draft, classification = template_library.draft(
+            request.tone,
+            request.context,
+            recipient_name=request.recipient_name,
+            additional_details=request.additional_details,
+            mention_attachments=request.mention_attachments
+        )
+    TEMPLATE_ROUTING.inc(intent=classification.intent or "other", path="template" if draft else "model")
+    if draft is None:
+        return None
+    logger.info(f"Email served from template - Intent: {draft.intent}, Confidence: {draft.confidence}")
+    return EmailResponse(
+        subject=draft.subject,
+        body=draft.body,
+        tone=request.tone,
+        generated_at=datetime.utcnow().isoformat(),
+        suggestions=EMAIL_SUGGESTIONS,
+        generation="template",
+        intent=draft.intent
+    )
+
+
+def model_settings(prompt: AssembledPrompt) -> dict:
+    """
+    Settings for an upstream call, evaluated when the gateway admits it:
+    the timeout is whatever the request's deadline leaves after queueing
+    """
+    settings = {"max_tokens": prompt.max_tokens}
+    timeout = remaining(current_request_class().deadline)
+    if timeout is not None:
+        settings["timeout"] = timeout
+    return settings
+
+
+def record_cancellation(endpoint: str, reason: str, unused_tokens: int = 0) -> None:
+    """Count a generation stopped early and the output budget it did not spend"""
+    CANCELLED_REQUESTS.inc(endpoint=endpoint, reason=reason)
+    if unused_tokens > 0:
+        TOKENS_SAVED.inc(unused_tokens, reason=reason)
+    logger.info(f"Generation cancelled - Endpoint: {endpoint}, Reason: {reason}")
+
+
+def unused_budget(request: EmailRequest) -> int:
+    """Output tokens a cancelled generation could still have spent"""
+    try:
+        return build_prompt(request).max_tokens * request.variants
+    except PromptBudgetExceeded:
+        return 0
+
+
+async def run_generation(request: EmailRequest, prompt: AssembledPrompt) -> EmailResponse:
+    """
+    Generate one draft and shape it into an EmailResponse. Text drafts are
+    a single chat completion; only structured output needs the agent's
+    tool call and validation retries.
+    """
+    if request.output_mode != "structured":
+        completion, model_used = await run_completion(SYSTEM_PROMPT, prompt)
+        email_text = completion.choices[0].message.content if completion.choices else None
+        if not email_text:
+            raise ValueError(f"Model {model_used} returned an empty draft")
+        logger.info(f"Email generated successfully - Model: {model_used}")
+        
+        usage = completion.usage
+        with span("parse"):
+            return build_email_response(
+                request,
+                email_text,
+                prompt_builder.usage(
+                    prompt,
+                    email_text,
+                    usage.prompt_tokens if usage else None,
+                    usage.completion_tokens if usage else None
+                )
+            )
+    
+    email_agent, agent_models = await email_agent_ready()
+    
+    async def call_model(model: str):
+        with model_call(model):
+            result = await provider_gateway.call(
+                lambda: email_agent.run(
+                    prompt.text,
+                    output_type=structured_output_type(),
+                    model=agent_models[model],
+                    model_settings=model_settings(prompt)
+                ),
+                estimated_tokens=prompt.budget_tokens,
+                count_tokens=lambda run: run.usage().total_tokens
+            )
+        usage = result.usage()
+        record_tokens(model, usage.input_tokens, usage.output_tokens)
+        return result
+    
+    # The router picks the fastest healthy model and hedges slow calls
+    result, model_used = await model_router.run(call_model)
+    logger.info(f"Email generated successfully - Model: {model_used}")
+    
+    usage = result.usage()
+    with span("parse"):
+        output = result.output
+        email = output if isinstance(output, StructuredEmail) else StructuredEmail.model_validate(output)
+        return build_structured_response(
+            request,
+            email,
+            prompt_builder.usage(prompt, email.email_body(), usage.input_tokens, usage.output_tokens)
+        )
+
+
+async def generate_with_cache(request: EmailRequest, cache_mode: str = CACHE_MODE_DEFAULT) -> tuple[EmailResponse, str]:
+    """Serve a template, a cached response or a (coalesced) generation; returns the X-Cache status"""
+    templated = template_response(request)
+    if templated is not None:
+        return sign_response(request, templated), "TEMPLATE"
+    
+    key = request_cache_key(request)
+    cached, cache_status = await lookup_cached(request, key, cache_mode)
+    if cached is not None:
+        logger.info(f"Email served from cache ({cache_status})")
+        return sign_response(request, EmailResponse(**cached)), cache_status
+    
+    with span("prompt"):
+        prompt = build_prompt(request)
+    
+    # Identical concurrent requests share one upstream call; a caller with a
+    # later deadline runs it again if it fails on the first caller's deadline
+    email_response = await inflight_generations.do(
+        cache_key({"prompt": prompt.text, "tone": request.tone}, MODEL_NAME, SYSTEM_PROMPT),
+        lambda: run_generation(request, prompt),
+        deadline=current_request_class().deadline
+    )
+    
+    await store_response(request, key, cache_mode, email_response)
+    return sign_response(request, email_response), "MISS" if cache_mode == CACHE_MODE_DEFAULT else cache_mode.upper()
+
+
+# Models seen returning fewer choices than the `n` they were asked for
+single_choice_models: set[str] = set()
+
+
+async def run_completion(system_prompt: str, prompt: AssembledPrompt, n: int = 1):
+    """
+    One routed, admission-controlled chat completion through the agent
+    model's OpenAI client, for calls the agent cannot make: several
+    choices (pydantic-ai only reads the first) or a different system
+    prompt. Returns the completion and the model used.
+    """
+    from openai.types.chat import ChatCompletion
+    
+    _, agent_models = await email_agent_ready()
+    
+    def create(chat_model: "OpenAIChatModel"):
+        # The body is already plain JSON, so post it as is: chat.completions.create
+        # spends about 3 ms of CPU per call walking its typed parameters
+        settings = model_settings(prompt)
+        timeout = settings.pop("timeout", None)
+        return chat_model.client.post(
+            "/chat/completions",
+            body={
+                "model": chat_model.model_name,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt.text},
+                ],
+                **settings,
+                **({"n": n} if n > 1 else {}),
+            },
+            options={"timeout": timeout} if timeout is not None else {},
+            cast_to=ChatCompletion,
+        )
+    
+    async def call_model(model: str):
+        chat_model = agent_models[model]
+        with model_call(model):
+            completion = await provider_gateway.call(
+                lambda: create(chat_model),
+                estimated_tokens=prompt.input_tokens + prompt.max_tokens * n,
+                count_tokens=lambda completion: completion.usage.total_tokens if completion.usage else 0
+            )
+        if completion.usage is not None:
+            record_tokens(model, completion.usage.prompt_tokens, completion.usage.completion_tokens)
+        return completion
+    
+    return await model_router.run(call_model)
+
+
+async def run_variants(request: EmailRequest, prompt: AssembledPrompt) -> list[EmailResponse]:
+    """
+    Generate `request.variants` drafts from one upstream call using the
+    provider's `n` parameter; drafts the model did not return are fanned
+    out as parallel single generations.
+    """
+    count = request.variants
+    if model_router.order()[0] in single_choice_models:
+        return list(await asyncio.gather(*(run_generation(request, prompt) for _ in range(count))))
+    
+    completion, model_used = await run_completion(SYSTEM_PROMPT, prompt, count)
+    texts = [choice.message.content for choice in completion.choices if choice.message.content][:count]
+    logger.info(f"Email variants generated - Model: {model_used}, Drafts: {len(texts)} of {count}")
+    
+    with span("parse"):
+        # The prompt is paid once; each draft reports its own completion tokens
+        drafts = [
+            build_email_response(request, text, prompt_builder.usage(prompt, text, prompt.input_tokens))
+            for text in texts
+        ]
+    if len(drafts) < count:
+        # Remember models that ignore `n`, so later calls fan out straight away
+        single_choice_models.add(model_used)
+        drafts += await asyncio.gather(*(run_generation(request, prompt) for _ in range(count - len(drafts))))
+    return drafts
+
+
+async def generate_variants(request: EmailRequest) -> list[EmailResponse]:
+    """Several signed drafts for one request; variants are never cached"""
+    with span("prompt"):
+        prompt = build_prompt(request)
+    drafts = await run_variants(request, prompt)
+    return [sign_response(request, draft) for draft in drafts]
+
+
+# Suggestions returned with every draft
+EMAIL_SUGGESTIONS = [
+    "Review the email for tone and clarity",
+    "Personalize with specific details if needed",
+    "Proofread before sending"
+]
+
+
+def build_email_response(request: EmailRequest, email_text: str, usage: Optional[dict] = None) -> EmailResponse:
+    """Split the subject out of the generated text and build the response"""
+    parsed = parse_email(email_text)
+    OUTPUT_PARSE.inc(mode="text", result="ok" if parsed.subject else "fallback")
+    
+    return EmailResponse(
+        subject=parsed.subject or f"Re: {request.context[:50]}...",
+        body=parsed.body,
+        tone=request.tone,
+        generated_at=datetime.utcnow().isoformat(),
+        suggestions=EMAIL_SUGGESTIONS,
+        usage=usage
+    )
 
 
-# Global agent instance
-email_agent = create_email_agent()
+def build_structured_response(request: EmailRequest, email: StructuredEmail, usage: Optional[dict] = None) -> EmailResponse:
+    """Build the response from the model's typed email, with its own suggestions"""
+    if not email.subject:
+        result = "fallback"
+    else:
+        result = "repaired" if email.repairs else "ok"
+    OUTPUT_PARSE.inc(mode="structured", result=result)
+    if email.repairs:
+        logger.info(f"Structured output repaired locally: {', '.join(email.repairs)}")
+    
+    return EmailResponse(
+        subject=email.subject or f"Re: {request.context[:50]}...",
+        body=email.email_body(),
+        tone=request.tone,
+        generated_at=datetime.utcnow().isoformat(),
+        suggestions=email.suggestions or EMAIL_SUGGESTIONS,
+        usage=usage
+    )
 
 
 # API Endpoints
@@ -144,6 +802,7 @@ async def root():
 
 
 @app.get("/health", response_model=HealthResponse)
+@app.get("/api/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
     logger.info("Health check requested")
@@ -154,70 +813,108 @@ async def health_check():
     )
 
 
-@app.post("/api/generate-email", response_model=EmailResponse)
-async def generate_email(request: EmailRequest):
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Response cache and semantic cache hit, miss and eviction counters"""
+    stats = {"enabled": False} if response_cache is None else {"enabled": True, **response_cache.stats()}
+    stats["semantic"] = {"enabled": False} if semantic_cache is None else {"enabled": True, **semantic_cache.stats()}
+    return stats
+
+
+@app.get("/api/gateway/stats")
+async def gateway_stats():
+    """Provider gateway queue depth, concurrency and wait-time metrics"""
+    return provider_gateway.stats()
+
+
+@app.get("/api/models/stats")
+async def model_stats():
+    """Per-model latency, error rate and hedging counters"""
+    return model_router.stats()
+
+
+@app.get("/metrics")
+@app.get("/api/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.post("/api/generate-email", response_model=Union[EmailResponse, list[EmailResponse]])
+async def generate_email(request: EmailRequest, http_request: Request):
     """
     Generate a professional email based on context and requirements
     
     This endpoint uses Pydantic AI to intelligently craft emails with proper
-    tone, structure, and content based on the user's input.
+    tone, structure, and content based on the user's input. Identical requests
+    are served from the response cache (and near-duplicates from the semantic
+    cache when enabled); send `X-Cache-Mode: bypass` or `X-Cache-Mode: refresh`
+    to skip or repopulate them. Model calls are scheduled per API key (or
+    client IP); send `X-Priority: batch` for work that is not waited on.
+    
+    Common intents (follow-ups, meeting requests, thank-you notes, leave
+    requests) are answered from templates without a model call unless
+    `generation` is "model"; the response's `generation` field says which
+    path was taken. With `variants` > 1 the response is a list of drafts
+    generated in one upstream call. `output_mode: "structured"` asks the
+    model for a typed email through a tool call, with its own suggestions.
+    
+    Send `X-Request-Timeout` (seconds) to bound how long the server works
+    on the request; it answers 504 when the budget runs out, and stops the
+    upstream call as soon as the client disconnects.
     """
+    record_since_start("validation")
+    deadline = deadline_from_headers(http_request.headers)
+    request_class = request_class_from_headers(
+        http_request.headers, client_host(http_request), deadline=deadline, tenants=provider_gateway.tenants
+    )
     try:
         logger.info(f"Email generation requested - Tone: {request.tone}, Context length: {len(request.context)}")
         
-        # Build the prompt for the AI agent
-        recipient = f"to {request.recipient_name}" if request.recipient_name else ""
-        additional = f"\n\nAdditional details: {request.additional_details}" if request.additional_details else ""
-        
-        prompt = f"""Write a {request.tone} email {recipient} with the following context:
-
-Context: {request.context}{additional}
-
-Tone: {request.tone}
-
-Write a complete, ready-to-send professional email."""
+        cache_mode = cache_mode_from_headers(http_request.headers)
+        track_generation(request, request_class.tenant, request_cache_key(request))
         
-        # Run the agent with timeout and error handling
+        # Run the agent within the request's deadline, cancelled if the client leaves
         try:
-            result = await email_agent.run(prompt)
-            
-            # Get the generated email text
-            email_text = result.data if hasattr(result, 'data') else str(result)
-            
-            # Extract subject from first line or create one
-            lines = email_text.strip().split('\n')
-            subject_line = f"Re: {request.context[:50]}..."
-            
-            # Try to find a subject line in the response
-            for i, line in enumerate(lines):
-                if line.lower().startswith('subject:'):
-                    subject_line = line.split(':', 1)[1].strip()
-                    email_text = '\n'.join(lines[:i] + lines[i+1:])
-                    break
+            if request.variants > 1:
+                with scheduling(request_class):
+                    drafts = await run_until(generate_variants(request), deadline, http_request.receive)
+                with span("serialize"):
+                    body = "[" + ",".join(draft.model_dump_json() for draft in drafts) + "]"
+                return Response(body, media_type="application/json", headers={"X-Cache": "BYPASS"})
             
-            # Create suggestions
-            suggestions = [
-                "Review the email for tone and clarity",
-                "Personalize with specific details if needed",
-                "Proofread before sending"
-            ]
-            
-            logger.info("Email generated successfully")
-            
-            return EmailResponse(
-                subject=subject_line,
-                body=email_text.strip(),
-                tone=request.tone,
-                generated_at=datetime.utcnow().isoformat(),
-                suggestions=suggestions
-            )
+            with scheduling(request_class):
+                email_response, cache_status = await run_until(
+                    generate_with_cache(request, cache_mode), deadline, http_request.receive
+                )
+            with span("serialize"):
+                body = email_response.model_dump_json()
+            return Response(body, media_type="application/json", headers={"X-Cache": cache_status})
             
+        except ClientDisconnected:
+            record_cancellation("generate", "disconnect", unused_budget(request))
+            # Nobody is left to read it; 499 as in "client closed request"
+            return Response(status_code=499)
+        except DeadlineExceeded:
+            record_cancellation("generate", "deadline", unused_budget(request))
+            logger.warning("Email generation ran out of time")
+            raise HTTPException(status_code=504, detail="The email could not be generated within the time budget")
+        except PromptBudgetExceeded as e:
+            logger.warning(f"Email generation rejected: {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e))
         except httpx.TimeoutException:
             logger.error("Request timeout while generating email")
             raise HTTPException(
                 status_code=504,
                 detail="Request timeout. Please try again."
             )
+        except GatewayOverloaded as e:
+            logger.warning(f"Email generation rejected: {str(e)}")
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
         except Exception as e:
             logger.error(f"Error during agent execution: {str(e)}")
             raise HTTPException(
@@ -225,6 +922,8 @@ Write a complete, ready-to-send professional email."""
                 detail=f"Error generating email: {str(e)}"
             )
     
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -236,6 +935,387 @@ Write a complete, ready-to-send professional email."""
         )
 
 
+@app.post("/api/generate-email/stream")
+async def generate_email_stream(request: EmailRequest, http_request: Request):
+    """
+    Stream a generated email as Server-Sent Events
+    
+    Events: `start` once the request is accepted, `subject` as soon as the
+    subject line is complete, `token` for each chunk of body text, and a
+    final `done` carrying the full EmailResponse (or `error` on failure).
+    Template and cached responses are sent whole. Only one draft can be
+    streamed; use /api/generate-email for `variants`. Streams are always
+    generated in the text output mode.
+    
+    When the time budget (`X-Request-Timeout`, at most the server's
+    maximum generation time) runs out mid-stream, the upstream call is
+    stopped and `done` carries what was written so far with `partial`
+    set. The upstream call also stops as soon as the client disconnects.
+    """
+    record_since_start("validation")
+    deadline = deadline_from_headers(http_request.headers)
+    logger.info(f"Streaming email generation requested - Tone: {request.tone}, Context length: {len(request.context)}")
+    if request.variants > 1:
+        raise HTTPException(status_code=400, detail="Streaming returns a single draft; use /api/generate-email for variants")
+    if request.output_mode != "text":
+        request = request.model_copy(update={"output_mode": "text"})
+    
+    cache_mode = cache_mode_from_headers(http_request.headers)
+    request_class = request_class_from_headers(
+        http_request.headers, client_host(http_request), deadline=deadline, tenants=provider_gateway.tenants
+    )
+    key = request_cache_key(request)
+    track_generation(request, request_class.tenant, key)
+    templated = template_response(request)
+    cached = None if templated is not None else (await lookup_cached(request, key, cache_mode))[0]
+    
+    async def events():
+        with scheduling(request_class):
+            async for event in generate_events():
+                yield event
+    
+    async def generate_events():
+        yield sse_event("start", {
+            "tone": request.tone,
+            "cached": cached is not None,
+            "generation": "template" if templated is not None else "model"
+        })
+        
+        ready = templated if templated is not None else EmailResponse(**cached) if cached is not None else None
+        if ready is not None:
+            email_response = sign_response(request, ready)
+            yield sse_event("subject", {"subject": email_response.subject})
+            yield sse_event("token", {"text": email_response.body})
+            yield sse_event("done", email_response.model_dump())
+            return
+        
+        parser = StreamingEmailParser()
+        model = model_router.order(explore=True)[0]
+        chunks = []
+        prompt = None
+        deltas: asyncio.Queue[str] = asyncio.Queue()
+        disconnected = asyncio.ensure_future(wait_for_disconnect(http_request.receive))
+        
+        def unused_stream_budget() -> int:
+            if prompt is None:
+                return 0
+            return max(0, prompt.max_tokens - prompt_builder.counter.count("".join(chunks)))
+        
+        async def stream_upstream():
+            # Runs in its own task so the stream can be stopped between chunks
+            async with provider_gateway.stream(prompt.budget_tokens) as entry:
+                with model_call(model):
+                    async with email_agent.run_stream(
+                        prompt.text,
+                        model=agent_models[model],
+                        model_settings=model_settings(prompt)
+                    ) as result:
+                        async for delta in result.stream_text(delta=True, debounce_by=None):
+                            deltas.put_nowait(delta)
+                        run_usage = result.usage()
+                entry[1] = run_usage.total_tokens
+            return run_usage
+        
+        try:
+            email_agent, agent_models = await email_agent_ready()
+            with span("prompt"):
+                prompt = build_prompt(request)
+            started = time.monotonic()
+            upstream = asyncio.ensure_future(stream_upstream())
+            partial = False
+            try:
+                async for delta in relay(deltas, upstream, deadline, disconnected):
+                    chunks.append(delta)
+                    subject, text = parser.feed(delta)
+                    if subject is not None:
+                        yield sse_event("subject", {"subject": subject})
+                    if text:
+                        yield sse_event("token", {"text": text})
+            except DeadlineExceeded:
+                # Out of time: finish with what was written so far, if anything
+                email_text = "".join(chunks)
+                record_cancellation("stream", "deadline", unused_stream_budget())
+                if not email_text.strip():
+                    raise
+                partial = True
+                run_usage = None
+            else:
+                run_usage = upstream.result()
+                model_router.record(model, time.monotonic() - started)
+                record_tokens(model, run_usage.input_tokens, run_usage.output_tokens)
+            
+            tail = parser.flush()
+            if tail:
+                yield sse_event("token", {"text": tail})
+            signature = render_signature(signature_for(request))
+            if signature:
+                yield sse_event("token", {"text": f"\n\n{signature}"})
+            
+            email_text = "".join(chunks)
+            with span("parse"):
+                email_response = build_email_response(
+                    request,
+                    email_text,
+                    prompt_builder.usage(
+                        prompt, email_text,
+                        run_usage.input_tokens if run_usage else None, run_usage.output_tokens if run_usage else None
+                    )
+                )
+            if partial:
+                email_response = email_response.model_copy(update={"partial": True})
+                logger.info("Email stream cut short by its deadline")
+            else:
+                await store_response(request, key, cache_mode, email_response)
+                logger.info("Email streamed successfully")
+            yield sse_event("done", sign_response(request, email_response).model_dump())
+        
+        except ClientDisconnected:
+            record_cancellation("stream", "disconnect", unused_stream_budget())
+        except asyncio.CancelledError:
+            # The server cancels the response when it notices the disconnect first
+            record_cancellation("stream", "disconnect", unused_stream_budget())
+            raise
+        except DeadlineExceeded:
+            logger.warning("Streaming email generation ran out of time")
+            yield sse_event("error", {"status_code": 504, "detail": "The email could not be generated within the time budget"})
+        except PromptBudgetExceeded as e:
+            logger.warning(f"Streaming email generation rejected: {str(e)}")
+            yield sse_event("error", {"status_code": 400, "detail": str(e)})
+        except httpx.TimeoutException:
+            logger.error("Request timeout while streaming email")
+            yield sse_event("error", {"status_code": 504, "detail": "Request timeout. Please try again."})
+        except GatewayOverloaded as e:
+            logger.warning(f"Streaming email generation rejected: {str(e)}")
+            yield sse_event("error", {"status_code": 429, "detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            model_router.record(model, None)
+            logger.error(f"Error during streaming agent execution: {str(e)}")
+            yield sse_event("error", {"status_code": 500, "detail": f"Error generating email: {str(e)}"})
+        finally:
+            disconnected.cancel()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/api/generate-emails/batch")
+async def generate_emails_batch(batch: BatchEmailRequest, http_request: Request):
+    """
+    Generate many emails in one request, streamed back as NDJSON
+    
+    Each line is `{"id", "status": "ok", "email"}` or `{"id", "status":
+    "error", "error"}` in completion order, followed by a summary line.
+    Resend the same batch with `skip_ids` to resume after a disconnect.
+    Its model calls are scheduled in the batch class, behind interactive
+    requests.
+    """
+    logger.info(f"Batch generation requested - Items: {len(batch.items or batch.recipients)}, Concurrency: {batch.concurrency}")
+    cache_mode = cache_mode_from_headers(http_request.headers)
+    request_class = request_class_from_headers(
+        http_request.headers, client_host(http_request), priority=PRIORITY_BATCH, tenants=provider_gateway.tenants
+    )
+    
+    async def generate_item(item: dict) -> dict:
+        payload = render_template(batch.template, item) if batch.template is not None else item
+        try:
+            request = EmailRequest(**{k: v for k, v in payload.items() if k != "id"})
+        except ValidationError as e:
+            raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+        if request.variants > 1:
+            raise ValueError("variants: batch items generate a single draft")
+        # Each item may queue behind interactive requests for up to
+        # PROVIDER_BATCH_MAX_WAIT, then gets the server's maximum generation time
+        deadline = time.monotonic() + provider_gateway.batch_max_wait + MAX_GENERATION_SECONDS
+        try:
+            with scheduling(replace(current_request_class(), deadline=deadline)):
+                email_response, _ = await run_until(generate_with_cache(request, cache_mode), deadline)
+        except DeadlineExceeded:
+            record_cancellation("batch", "deadline", unused_budget(request))
+            raise
+        return email_response.model_dump()
+    
+    async def lines():
+        with scheduling(request_class):
+            async for record in run_batch(batch.iter_items(), generate_item, batch.concurrency, set(batch.skip_ids)):
+                yield to_ndjson(record)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/api/refine-email", response_model=EmailResponse)
+async def refine_email(request: RefineRequest, http_request: Request):
+    """
+    Apply a follow-up instruction to an existing draft
+    
+    Greeting and sign-off tone, the recipient's name, attachment mentions,
+    the subject and the signature are edited locally without a model call.
+    Anything else is sent to the model, which replies with only the
+    changed spans; they are applied here, so the sender's name and
+    signature are never resent.
+    """
+    record_since_start("validation")
+    previous = request.email
+    logger.info(f"Email refinement requested - Instruction length: {len(request.instruction)}")
+    
+    edits = plan_local_edits(request.instruction)
+    if edits is not None:
+        if any(edit.kind == "signature" for edit in edits) and request.sender_signature is None:
+            raise HTTPException(status_code=400, detail="sender_signature is required to change the signature")
+        with span("edit"):
+            signature = render_signature(request.sender_signature.model_dump()) if request.sender_signature else ""
+            refined = apply_local_edits(previous.subject, previous.body, previous.tone, edits, signature)
+        REFINEMENTS.inc(path="local")
+        return previous.model_copy(update={
+            "subject": refined.subject,
+            "body": refined.body,
+            "generated_at": datetime.utcnow().isoformat(),
+            "usage": None,
+            "generation": "edit",
+            "edits": refined.edits,
+        })
+    
+    deadline = deadline_from_headers(http_request.headers)
+    request_class = request_class_from_headers(
+        http_request.headers, client_host(http_request), deadline=deadline, tenants=provider_gateway.tenants
+    )
+    tone = requested_tone(request.instruction) or previous.tone
+    try:
+        with span("prompt"):
+            head, _ = split_for_model(previous.body)
+            prompt = prompt_builder.build_edit(tone, previous.subject, head, request.instruction)
+        with scheduling(request_class):
+            completion, model_used = await run_until(
+                run_completion(EDIT_SYSTEM_PROMPT, prompt), deadline, http_request.receive
+            )
+        reply = (completion.choices[0].message.content or "") if completion.choices else ""
+        with span("edit"):
+            refined, applied, proposed = apply_model_edits(previous.subject, previous.body, reply)
+        REFINE_EDITS.inc(applied, result="applied")
+        REFINE_EDITS.inc(proposed - applied, result="failed")
+        REFINEMENTS.inc(path="model")
+        logger.info(f"Email refined - Model: {model_used}, Edits applied: {applied} of {proposed}")
+    except ClientDisconnected:
+        record_cancellation("refine", "disconnect", prompt.max_tokens)
+        return Response(status_code=499)
+    except DeadlineExceeded:
+        record_cancellation("refine", "deadline", prompt.max_tokens)
+        logger.warning("Email refinement ran out of time")
+        raise HTTPException(status_code=504, detail="The email could not be refined within the time budget")
+    except PromptBudgetExceeded as e:
+        logger.warning(f"Email refinement rejected: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.TimeoutException:
+        logger.error("Request timeout while refining email")
+        raise HTTPException(status_code=504, detail="Request timeout. Please try again.")
+    except GatewayOverloaded as e:
+        logger.warning(f"Email refinement rejected: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.error(f"Error during email refinement: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error refining email: {str(e)}")
+    
+    usage = completion.usage
+    return previous.model_copy(update={
+        "subject": refined.subject,
+        "body": refined.body,
+        "tone": tone,
+        "generated_at": datetime.utcnow().isoformat(),
+        "usage": TokenUsage(**prompt_builder.usage(
+            prompt, reply, usage.prompt_tokens if usage else None, usage.completion_tokens if usage else None
+        )),
+        "generation": "model",
+        "edits": refined.edits,
+    })
+
+
+@app.post("/api/send-email")
+async def send_email(request: SendEmailRequest):
+    """
+    Send one generated email
+
+    With a mail queue configured the message is queued and a 202 with a
+    status URL is returned straight away; otherwise it is delivered over a
+    pooled SMTP connection. SMTP calls run in a worker thread so they never
+    block the event loop.
+    """
+    record_since_start("validation")
+    try:
+        settings = SMTPSettings.from_env()
+
+        # With a mail queue configured, hand the message to the workers and return at once
+        mail_queue = get_mail_queue()
+        if mail_queue is not None:
+            with span("enqueue"):
+                message_id = await asyncio.to_thread(mail_queue.enqueue, request.model_dump())
+            ensure_mail_worker()
+            return JSONResponse(status_code=202, content={
+                "success": True,
+                "queued": True,
+                "message": f"Email to {request.recipient_email} queued for delivery",
+                "message_id": message_id,
+                "status_url": f"/api/send-emails/status?id={message_id}",
+                "recipient": request.recipient_email,
+                "subject": request.subject
+            })
+
+        message = build_message(settings, request.recipient_email, request.subject, request.body, request.sender_name)
+        with span("smtp"):
+            results = await asyncio.to_thread(get_smtp_pool().send_messages, settings, [message])
+        if not results[0]["success"]:
+            raise RuntimeError(results[0]["error"])
+
+        return {
+            "success": True,
+            "message": f"Email sent successfully to {request.recipient_email}",
+            "recipient": request.recipient_email,
+            "subject": request.subject
+        }
+
+    except QueueFullError as e:
+        logger.warning(f"Email rejected: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="Mail queue is full, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.error(f"Error sending email: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
+
+
+@app.post("/api/send-emails/batch")
+async def send_emails_batch(batch: SendBatchRequest):
+    """Send many emails over one pooled SMTP session; returns one result per email"""
+    try:
+        settings = SMTPSettings.from_env()
+        with span("smtp"):
+            results = await asyncio.to_thread(send_batch, get_smtp_pool(), settings, batch.emails, batch.sender_name)
+    except Exception as e:
+        logger.error(f"Error sending email batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to send emails: {str(e)}")
+
+    sent = sum(1 for result in results if result["success"])
+    return {
+        "success": sent == len(results),
+        "sent": sent,
+        "failed": len(results) - sent,
+        "results": results
+    }
+
+
+@app.get("/api/send-emails/status")
+async def send_status(message_id: Optional[str] = Query(None, alias="id")):
+    """Delivery state of a queued email"""
+    mail_queue = get_mail_queue()
+    if mail_queue is None:
+        raise HTTPException(status_code=404, detail="Mail queue is not enabled")
+    if not message_id:
+        raise HTTPException(status_code=400, detail="Query parameter 'id' is required")
+    status = await asyncio.to_thread(mail_queue.status, message_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown message id: {message_id}")
+    return status
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler for unhandled errors"""
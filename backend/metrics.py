@@ -0,0 +1,420 @@
+"""
+EmailCraft AI - Metrics and tracing
+Prometheus counters and histograms plus request-scoped pipeline stage spans
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# OpenTelemetry spans are emitted only when the optional API package is installed
+try:
+    from opentelemetry import trace as otel_trace
+    OTEL_AVAILABLE = True
+    _tracer = otel_trace.get_tracer("emailcraft")
+except ImportError:
+    OTEL_AVAILABLE = False
+    _tracer = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (labels, value) pairs reported by a collector callback
+Samples = list[tuple[dict[str, str], float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._render_samples()
+
+    @abstractmethod
+    def _render_samples(self) -> list[str]: ...
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed observations with sum and count"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: dict[tuple[str, ...], list[float]] = {}  # bucket counts, then sum
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-1] += value
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for key, series in items:
+            labels = self._labels(key)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics exposed on /metrics.
+
+    Components that already keep their own counters (the gateway, router
+    and cache) are exported through collector callbacks evaluated at
+    scrape time rather than being made to depend on this module.
+    """
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], Iterable[tuple[str, str, str, Samples]]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[tuple[str, str, str, Samples]]]) -> None:
+        """`collector()` yields (name, "counter" | "gauge", help, samples) tuples"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Pipeline metrics
+REQUESTS = REGISTRY.register(Counter(
+    "emailcraft_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status")))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "emailcraft_request_duration_seconds", "End-to-end request latency", ("endpoint",)))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "emailcraft_requests_in_flight", "Requests currently being handled"))
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "emailcraft_stage_duration_seconds", "Latency of each generation pipeline stage", ("stage",)))
+MODEL_LATENCY = REGISTRY.register(Histogram(
+    "emailcraft_model_duration_seconds", "Upstream model call latency", ("model", "outcome")))
+TOKENS = REGISTRY.register(Counter(
+    "emailcraft_tokens_total", "Tokens reported by the provider", ("model", "kind")))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "emailcraft_cache_lookups_total", "Response cache lookups by result", ("result",)))
+TEMPLATE_ROUTING = REGISTRY.register(Counter(
+    "emailcraft_template_routing_total", "Template fast-path decisions by classified intent", ("intent", "path")))
+OUTPUT_PARSE = REGISTRY.register(Counter(
+    "emailcraft_output_parse_total", "Parsed model outputs by output mode and result (ok, repaired, fallback)",
+    ("mode", "result")))
+GENERATION_REQUESTS = REGISTRY.register(Counter(
+    "emailcraft_generation_requests_total", "Generation requests by output mode; repeat=true marks regenerations",
+    ("mode", "repeat")))
+REFINEMENTS = REGISTRY.register(Counter(
+    "emailcraft_refinements_total", "Draft refinements by path (local edits or model span edits)", ("path",)))
+REFINE_EDITS = REGISTRY.register(Counter(
+    "emailcraft_refine_edits_total", "Span edits proposed by the model, by whether they applied", ("result",)))
+CANCELLED_REQUESTS = REGISTRY.register(Counter(
+    "emailcraft_cancelled_requests_total", "Generations stopped early, by endpoint and reason (disconnect, deadline)",
+    ("endpoint", "reason")))
+TOKENS_SAVED = REGISTRY.register(Counter(
+    "emailcraft_tokens_saved_total", "Unused max_tokens budget of cancelled model calls (an upper bound on tokens saved)",
+    ("reason",)))
+RATE_LIMITED = REGISTRY.register(Counter(
+    "emailcraft_rate_limited_total", "Requests rejected with 429 by budget and the bucket that ran out (ip or key)",
+    ("budget", "scope")))
+
+
+def record_tokens(model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    """Count provider-reported usage; missing fields are skipped"""
+    if prompt_tokens:
+        TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    if completion_tokens:
+        TOKENS.inc(completion_tokens, model=model, kind="completion")
+
+
+def register_components(gateway=None, router=None, cache=None, inflight=None, semantic_cache=None,
+                        rate_limiter=None) -> None:
+    """Export the provider gateway, model router, response caches, single-flight and rate limiter counters"""
+    def collect():
+        if gateway is not None:
+            stats = gateway.stats()
+            yield "emailcraft_gateway_in_flight", "gauge", "Upstream calls in flight", [({}, stats["in_flight"])]
+            yield "emailcraft_gateway_queue_depth", "gauge", "Callers waiting for admission", [({}, stats["queue_depth"])]
+            yield "emailcraft_gateway_concurrency_limit", "gauge", "Current AIMD concurrency limit", [({}, stats["concurrency_limit"])]
+            for name in ("admitted", "rejected", "rejected_deadline", "throttled", "retries"):
+                yield f"emailcraft_gateway_{name}_total", "counter", f"Gateway {name.replace('_', ' ')} count", [({}, stats[name])]
+            classes = stats["classes"]
+            yield "emailcraft_scheduler_queue_depth", "gauge", "Callers waiting by priority class", [
+                ({"priority": priority}, info["queue_depth"]) for priority, info in classes.items()
+            ]
+            yield "emailcraft_scheduler_in_flight", "gauge", "Upstream calls in flight by priority class", [
+                ({"priority": priority}, info["in_flight"]) for priority, info in classes.items()
+            ]
+            yield "emailcraft_scheduler_tenants_in_flight", "gauge", "Tenants with calls in flight", [({}, stats["tenants_in_flight"])]
+        if router is not None:
+            stats = router.stats()
+            for name in ("hedged", "hedge_wins", "fallbacks", "explorations"):
+                yield f"emailcraft_router_{name}_total", "counter", f"Model router {name.replace('_', ' ')}", [({}, stats[name])]
+            yield "emailcraft_model_healthy", "gauge", "1 if the model is routable", [
+                ({"model": model}, 1 if info["healthy"] else 0) for model, info in stats["models"].items()
+            ]
+        if cache is not None:
+            stats = cache.stats()
+            yield "emailcraft_cache_evictions_total", "counter", "Response cache evictions", [({}, stats["evictions"])]
+            yield "emailcraft_cache_entries", "gauge", "Entries in the in-memory cache", [({}, stats["memory_entries"])]
+        if semantic_cache is not None:
+            stats = semantic_cache.stats()
+            yield "emailcraft_semantic_cache_lookups_total", "counter", "Semantic cache lookups by result", [
+                ({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])
+            ]
+            yield "emailcraft_semantic_cache_evictions_total", "counter", "Semantic cache evictions", [({}, stats["evictions"])]
+            yield "emailcraft_semantic_cache_entries", "gauge", "Entries in the semantic cache", [({}, stats["entries"])]
+        if inflight is not None:
+            yield "emailcraft_coalesced_total", "counter", "Requests served by another in-flight call", [({}, inflight.coalesced)]
+            yield "emailcraft_coalesced_reruns_total", "counter", "Shared calls run again for a caller with a later deadline", [
+                ({}, inflight.reruns)
+            ]
+        if rate_limiter is not None:
+            stats = rate_limiter.stats()
+            if stats["clients"] is not None:
+                yield "emailcraft_rate_limit_clients", "gauge", "Rate limit buckets held in memory", [({}, stats["clients"])]
+            yield "emailcraft_rate_limit_evictions_total", "counter", "Idle rate limit buckets dropped", [({}, stats["evictions"])]
+            yield "emailcraft_rate_limit_backend_errors_total", "counter", "Rate limit checks skipped after a backend error", [
+                ({}, stats["backend_errors"])
+            ]
+
+    REGISTRY.add_collector(collect)
+
+
+async def propagate_request_id(request) -> None:
+    """httpx request hook that forwards the current request id upstream"""
+    request_id = current_request_id()
+    if request_id is not None:
+        request.headers["X-Request-ID"] = request_id
+
+
+# Request tracing
+
+class RequestTrace:
+    """Request id and per-stage timings for one request"""
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.status: Optional[int] = None
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_LATENCY.observe(seconds, stage=stage)
+
+    def server_timing(self) -> str:
+        """Stage durations as a Server-Timing header value"""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+    def summary(self) -> str:
+        return " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.stages.items())
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("emailcraft_trace", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def _clean_request_id(value: Optional[str]) -> Optional[str]:
+    """Accept a caller-supplied id only if it is short and printable"""
+    if value and len(value) <= 128 and value.isprintable() and " " not in value:
+        return value
+    return None
+
+
+@contextmanager
+def span(stage: str, **attributes: Any) -> Iterator[None]:
+    """Time one pipeline stage for the current request"""
+    trace = _current_trace.get()
+    with ExitStack() as stack:
+        if OTEL_AVAILABLE:
+            stack.enter_context(_tracer.start_as_current_span(
+                f"emailcraft.{stage}",
+                attributes={"request.id": trace.request_id if trace else "", **attributes}
+            ))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if trace is not None:
+                trace.record(stage, elapsed)
+            else:
+                STAGE_LATENCY.observe(elapsed, stage=stage)
+
+
+def record_since_start(stage: str) -> None:
+    """Record the time from request start until now as one stage (e.g. body parsing and validation)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(stage, time.perf_counter() - trace.started)
+
+
+@contextmanager
+def model_call(model: str) -> Iterator[None]:
+    """Time one upstream call as the `upstream` stage and per model, by outcome"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with span("upstream", model=model):
+            yield
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        MODEL_LATENCY.observe(time.perf_counter() - start, model=model, outcome=outcome)
+
+
+def _finish(endpoint: str, trace: RequestTrace) -> None:
+    elapsed = time.perf_counter() - trace.started
+    status = str(trace.status or 500)
+    REQUESTS.inc(endpoint=endpoint, status=status)
+    REQUEST_LATENCY.observe(elapsed, endpoint=endpoint)
+    if trace.stages:
+        logger.info(f"Request {trace.request_id} {endpoint} {status} in {elapsed * 1000:.1f}ms - {trace.summary()}")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that opens a RequestTrace per HTTP request.
+
+    Counts requests by route template and status, tracks in-flight
+    requests until the last body chunk is sent (so streamed responses are
+    included) and echoes X-Request-ID on every response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(b"x-request-id", b"").decode("latin-1")
+        trace = RequestTrace(_clean_request_id(incoming))
+        token = _current_trace.set(trace)
+        IN_FLIGHT.inc()
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                extra = [(b"x-request-id", trace.request_id.encode("latin-1"))]
+                if trace.stages:
+                    extra.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            IN_FLIGHT.dec()
+            _current_trace.reset(token)
+            route = scope.get("route")
+            _finish(getattr(route, "path", "unmatched"), trace)
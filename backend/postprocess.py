@@ -0,0 +1,267 @@
+"""
+EmailCraft AI - Response post-processing
+Single-pass parsing of generated emails, signature rendering and streaming cleanup
+"""
+
+import re
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Any, Optional
+
+# A whole reply wrapped in a markdown code fence
+_FENCED = re.compile(r"\A\s*```[\w-]*[ \t]*\n(.*?)\n?```\s*\Z", re.DOTALL)
+
+# "Subject: ...", also with markdown emphasis or a heading marker
+_SUBJECT = re.compile(
+    r"[ \t]*(?:#+[ \t]*)?(?:\*\*|__)?subject(?:\*\*|__)?[ \t]*:([^\n]*)\n?",
+    re.IGNORECASE
+)
+
+_GREETING = re.compile(
+    r"(?:dear|hi|hello|hey|greetings|good (?:morning|afternoon|evening)|to whom it may concern)\b[^\n]*",
+    re.IGNORECASE
+)
+
+_CLOSING = re.compile(
+    r"(?:best|best regards|kind regards|warm regards|regards|sincerely|yours sincerely|yours truly|"
+    r"yours faithfully|respectfully|thanks|thank you|many thanks|cheers|all the best|take care|warmly)"
+    r"[ \t]*[,.!]?[ \t]*\Z",
+    re.IGNORECASE
+)
+
+# How many trailing lines are searched for the sign-off
+CLOSING_WINDOW_LINES = 6
+
+# Trailing lines that may still turn out to be the closing fence of a stream
+_FENCE_TAIL = re.compile(r"(?:\n[ \t]*`{0,3}[ \t]*)+\Z")
+
+
+@dataclass
+class ParsedEmail:
+    """
+    A generated email: its subject and everything else as `body`.
+
+    The body is split into greeting, content and closing on first access,
+    since most callers only need the subject and body.
+    """
+    subject: Optional[str]
+    body: str
+
+    @cached_property
+    def _sections(self) -> tuple[Optional[str], str, Optional[str]]:
+        return split_body(self.body)
+
+    @property
+    def greeting(self) -> Optional[str]:
+        return self._sections[0]
+
+    @property
+    def content(self) -> str:
+        return self._sections[1]
+
+    @property
+    def closing(self) -> Optional[str]:
+        return self._sections[2]
+
+
+def strip_fences(text: str) -> str:
+    """Remove a code fence the model wrapped around the whole reply"""
+    if not text.lstrip().startswith("```"):
+        return text
+    match = _FENCED.match(text)
+    return match.group(1) if match else text
+
+
+def _subject_value(match: re.Match) -> Optional[str]:
+    return match.group(1).strip().strip("*").strip() or None
+
+
+def _find_subject(text: str) -> Optional[re.Match]:
+    """First subject line in the text; the first line is checked before scanning the rest"""
+    match = _SUBJECT.match(text)
+    if match:
+        return match
+    lowered = text.lower()
+    position = lowered.find("subject")
+    while position != -1:
+        match = _SUBJECT.match(text, text.rfind("\n", 0, position) + 1)
+        if match:
+            return match
+        position = lowered.find("subject", position + 7)
+    return None
+
+
+def parse_email(text: str) -> ParsedEmail:
+    """
+    Strip a wrapping code fence and split out the subject.
+
+    The first subject line anywhere in the text is taken as the subject
+    and removed from the body.
+    """
+    text = strip_fences(text).strip()
+    match = _find_subject(text)
+    if match is None:
+        return ParsedEmail(None, text)
+    return ParsedEmail(_subject_value(match), (text[:match.start()] + text[match.end():]).strip())
+
+
+def split_body(body: str) -> tuple[Optional[str], str, Optional[str]]:
+    """
+    Split an email body into (greeting, content, closing).
+
+    The greeting is the first line if it looks like one; the closing runs
+    from the last sign-off line near the end of the body.
+    """
+    greeting = None
+    content_start = 0
+    match = _GREETING.match(body)
+    if match:
+        greeting = match.group(0).strip()
+        content_start = match.end()
+
+    # Walk the last few lines backwards; the last sign-off line starts the closing
+    content_end = line_end = len(body)
+    for _ in range(CLOSING_WINDOW_LINES):
+        newline = body.rfind("\n", content_start, line_end)
+        if newline == -1 and content_start:
+            break
+        if _CLOSING.match(body, newline + 1, line_end):
+            content_end = newline + 1
+            break
+        if newline == -1:
+            break
+        line_end = newline
+    closing = body[content_end:].strip() or None
+
+    return greeting, body[content_start:content_end].strip(), closing
+
+
+# Signatures
+
+# Line layout; fields on one line are joined with " | "
+SIGNATURE_LAYOUT = (
+    ("name",),
+    ("title", "department"),
+    ("company",),
+    ("phone", "email"),
+    ("linkedin",),
+)
+
+
+SIGNATURE_FIELDS = tuple(field for line in SIGNATURE_LAYOUT for field in line)
+
+
+@lru_cache(maxsize=256)
+def _render_signature(values: tuple) -> str:
+    filled = dict(zip(SIGNATURE_FIELDS, values))
+    lines = (" | ".join(filled[field] for field in line if filled[field]) for line in SIGNATURE_LAYOUT)
+    return "\n".join(line for line in lines if line)
+
+
+def render_signature(signature: Optional[dict[str, Any]]) -> str:
+    """Render a sender signature dict; blocks are cached per distinct signature"""
+    if not signature:
+        return ""
+    return _render_signature(tuple(map(signature.get, SIGNATURE_FIELDS)))
+
+
+def append_signature(body: str, signature: Optional[dict[str, Any]]) -> str:
+    """Strip the body and append the rendered signature after a blank line"""
+    body = body.strip()
+    rendered = render_signature(signature)
+    return f"{body}\n\n{rendered}" if rendered else body
+
+
+# Streaming
+
+class StreamingEmailParser:
+    """
+    Incremental counterpart of parse_email for token streams.
+
+    Drops a leading code fence and its closing fence, reports a subject
+    line found on the first non-blank line and removes it (with the blank
+    lines after it) from the emitted text. Text is held back only while it
+    could still be a fence or a subject line.
+    """
+
+    def __init__(self):
+        self.subject: Optional[str] = None
+        self._buffer = ""
+        self._state = "start"  # start -> subject -> body
+        self._fenced = False
+        self._at_body_start = True
+        self._tail = ""  # possible closing fence held back in fenced mode
+
+    def feed(self, chunk: str) -> tuple[Optional[str], str]:
+        """Consume a chunk; return (subject if just found, body text to emit)"""
+        if self._state == "body":
+            return None, self._emit(chunk)
+
+        self._buffer += chunk
+        found = None
+        while self._state != "body":
+            stripped = self._buffer.lstrip()
+            if "\n" not in stripped:
+                if not self._could_continue(stripped):
+                    return found, self._release()
+                return found, ""
+
+            line, rest = stripped.split("\n", 1)
+            if self._state == "start" and line.startswith("```"):
+                self._fenced = True
+                self._state = "subject"
+                self._buffer = rest
+                continue
+
+            match = _SUBJECT.match(line)
+            if match:
+                self.subject = _subject_value(match)
+                found = self.subject
+                self._buffer = ""
+                self._state = "body"
+                return found, self._emit(rest)
+            return found, self._release()
+        return found, ""
+
+    def flush(self) -> str:
+        """Release anything still held back at the end of the stream"""
+        if self._state != "body":
+            match = _SUBJECT.match(self._buffer.strip())
+            if match:
+                self.subject = _subject_value(match)
+                self._buffer = ""
+                self._state = "body"
+                return ""
+            return self._release() + self._flush_tail()
+        return self._flush_tail()
+
+    def _could_continue(self, head: str) -> bool:
+        """Whether an incomplete first line might still become a fence or subject line"""
+        if self._state == "start" and (head.startswith("```") or "```".startswith(head)):
+            return True
+        label = head.lstrip("#*_ \t").lower()
+        return label.startswith("subject") or "subject".startswith(label)
+
+    def _release(self) -> str:
+        text, self._buffer = self._buffer, ""
+        self._state = "body"
+        return self._emit(text)
+
+    def _emit(self, text: str) -> str:
+        if self._at_body_start:
+            text = text.lstrip("\n")
+            self._at_body_start = not text
+        if not self._fenced:
+            return text
+        # Hold back trailing lines that may turn out to be the closing fence
+        text = self._tail + text
+        match = _FENCE_TAIL.search(text)
+        if match:
+            self._tail = text[match.start():]
+            return text[:match.start()]
+        self._tail = ""
+        return text
+
+    def _flush_tail(self) -> str:
+        tail, self._tail = self._tail, ""
+        return tail if tail.strip().strip("`") else ""
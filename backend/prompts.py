@@ -0,0 +1,211 @@
+"""
+EmailCraft AI - Prompt assembly
+Compact per-tone prompt templates, local token counting and per-request token budgets
+"""
+
+import importlib.util
+import logging
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from structured import STRUCTURED_INSTRUCTION, STRUCTURED_OUTPUT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Exact BPE counts are used only when tiktoken is installed and selected;
+# its encodings are downloaded on first use, so it is opt-in and imported lazily
+TIKTOKEN_AVAILABLE = importlib.util.find_spec("tiktoken") is not None
+
+# Shared by every tone; kept short because it is sent with every call
+SYSTEM_PROMPT = """You write ready-to-send emails.
+Reply with "Subject: <subject>" on the first line, then the greeting, body and closing.
+Match the requested tone, stay concise and clear, and avoid jargon unless asked."""
+
+# Refinement replies list only the changed spans
+EDIT_SYSTEM_PROMPT = """You edit emails. Reply only with the edits, each as:
+FIND: <exact text from the email>
+REPLACE: <new text>
+Use the smallest spans that make the change; the subject line can be edited too.
+Reply NONE if nothing needs to change."""
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenCounter:
+    """
+    Local token counter.
+
+    The default heuristic counts words and punctuation, splitting long
+    words into four-character pieces, which lands close to BPE counts
+    for English prose. Set PROMPT_TOKENIZER=tiktoken to use
+    exact counts (PROMPT_TOKENIZER_ENCODING picks the encoding).
+    """
+
+    def __init__(self, tokenizer: str = "heuristic", encoding: str = "cl100k_base"):
+        self.tokenizer = tokenizer
+        self.encoding_name = encoding
+        self._encoding = None
+        self._lock = threading.Lock()
+        if tokenizer == "tiktoken" and not TIKTOKEN_AVAILABLE:
+            logger.warning("PROMPT_TOKENIZER=tiktoken but tiktoken is not installed, using the heuristic")
+            self.tokenizer = "heuristic"
+
+    def _load_encoding(self):
+        with self._lock:
+            if self._encoding is None and self.tokenizer == "tiktoken":
+                try:
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+                except Exception as e:
+                    logger.warning(f"Could not load tiktoken encoding {self.encoding_name}, using the heuristic: {str(e)}")
+                    self.tokenizer = "heuristic"
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer == "tiktoken":
+            encoding = self._encoding or self._load_encoding()
+            if encoding is not None:
+                return len(encoding.encode(text))
+        return sum(math.ceil(len(piece) / 4) for piece in _WORD.findall(text))
+
+
+@dataclass(frozen=True)
+class ToneTemplate:
+    """Instruction line and output cap for one tone"""
+    instruction: str
+    max_output_tokens: int
+
+
+# Output caps keep short tones short; formal letters get the most room
+TONE_TEMPLATES = {
+    "professional": ToneTemplate("Write a professional email: courteous, clear and to the point.", 350),
+    "friendly": ToneTemplate("Write a friendly email: warm and personable but still polished.", 300),
+    "formal": ToneTemplate("Write a formal email: respectful and precise, without contractions.", 400),
+    "casual": ToneTemplate("Write a casual email: relaxed and brief.", 200),
+}
+
+DEFAULT_OUTPUT_CAP = 350
+
+
+class PromptBudgetExceeded(ValueError):
+    """Raised when the assembled prompt is over the input token budget"""
+
+    def __init__(self, input_tokens: int, limit: int):
+        super().__init__(f"Request is too long: {input_tokens} input tokens, the limit is {limit}")
+        self.input_tokens = input_tokens
+        self.limit = limit
+
+
+@dataclass(frozen=True)
+class AssembledPrompt:
+    """User prompt plus its token accounting"""
+    text: str
+    input_tokens: int  # system prompt plus user prompt
+    max_tokens: int  # output cap sent to the provider
+
+    @property
+    def budget_tokens(self) -> int:
+        """Worst-case tokens for admission control"""
+        return self.input_tokens + self.max_tokens
+
+
+class PromptBuilder:
+    """
+    Assemble compact prompts within a per-request token budget.
+
+    Tone templates are fixed at construction and the system prompt is
+    counted once, so each request only counts its own fields.
+    """
+
+    def __init__(
+        self,
+        counter: Optional[TokenCounter] = None,
+        system_prompt: str = SYSTEM_PROMPT,
+        max_input_tokens: int = 1500,
+        max_output_tokens: int = 600,
+    ):
+        self.counter = counter or TokenCounter()
+        self.system_prompt = system_prompt
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self._system_tokens: Optional[int] = None
+
+    @property
+    def system_tokens(self) -> int:
+        if self._system_tokens is None:
+            self._system_tokens = self.counter.count(self.system_prompt)
+        return self._system_tokens
+
+    def template(self, tone: str) -> ToneTemplate:
+        template = TONE_TEMPLATES.get(tone)
+        if template is None:
+            template = ToneTemplate(f"Write a {tone} email.", DEFAULT_OUTPUT_CAP)
+        return template
+
+    def build(
+        self,
+        tone: str,
+        context: str,
+        recipient_name: Optional[str] = None,
+        additional_details: Optional[str] = None,
+        mention_attachments: bool = False,
+        structured: bool = False,
+    ) -> AssembledPrompt:
+        template = self.template(tone)
+        lines = [template.instruction]
+        if recipient_name:
+            lines.append(f"To: {recipient_name}")
+        lines.append(f"Context: {context}")
+        if additional_details:
+            lines.append(f"Details: {additional_details}")
+        if mention_attachments:
+            lines.append("Say that relevant documents (resume, portfolio, etc.) are attached.")
+        if structured:
+            lines.append(STRUCTURED_INSTRUCTION)
+        text = "\n".join(lines)
+
+        input_tokens = self.system_tokens + self.counter.count(text)
+        if input_tokens > self.max_input_tokens:
+            raise PromptBudgetExceeded(input_tokens, self.max_input_tokens)
+        max_tokens = min(template.max_output_tokens, self.max_output_tokens)
+        if structured:
+            max_tokens += STRUCTURED_OUTPUT_TOKENS
+        return AssembledPrompt(text, input_tokens, max_tokens)
+
+    def build_edit(self, tone: str, subject: str, body: str, instruction: str) -> AssembledPrompt:
+        """Prompt for span edits to an existing draft; output is capped like a full email of the tone"""
+        text = f"Subject: {subject}\n\n{body}\n\nInstruction: {instruction}"
+        input_tokens = self.counter.count(EDIT_SYSTEM_PROMPT) + self.counter.count(text)
+        if input_tokens > self.max_input_tokens:
+            raise PromptBudgetExceeded(input_tokens, self.max_input_tokens)
+        return AssembledPrompt(text, input_tokens, min(self.template(tone).max_output_tokens, self.max_output_tokens))
+
+    def usage(self, prompt: AssembledPrompt, completion_text: str,
+              prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None) -> dict[str, int]:
+        """Token cost of one generation; provider-reported counts win over local ones"""
+        prompt_tokens = prompt_tokens or prompt.input_tokens
+        completion_tokens = completion_tokens or self.counter.count(completion_text)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "max_tokens": prompt.max_tokens,
+        }
+
+
+def create_prompt_builder() -> PromptBuilder:
+    """Build the prompt builder from environment settings"""
+    return PromptBuilder(
+        TokenCounter(
+            tokenizer=os.getenv("PROMPT_TOKENIZER", "heuristic"),
+            encoding=os.getenv("PROMPT_TOKENIZER_ENCODING", "cl100k_base"),
+        ),
+        max_input_tokens=int(os.getenv("PROMPT_MAX_INPUT_TOKENS", "1500")),
+        max_output_tokens=int(os.getenv("PROMPT_MAX_OUTPUT_TOKENS", "600")),
+    )
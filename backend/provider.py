@@ -0,0 +1,81 @@
+"""
+EmailCraft AI - Provider client
+Pooled HTTP client settings for OpenRouter chat completion calls
+"""
+
+import logging
+import os
+from typing import Awaitable, Callable, Optional, Sequence
+
+import httpx
+
+from metrics import propagate_request_id
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# OpenRouter attributes requests to the app by these headers
+OPENROUTER_HEADERS = {
+    "HTTP-Referer": "https://emailcraft-ai.vercel.app",
+    "X-Title": "EmailCraft AI",
+}
+
+# HTTP/2 is only available when the optional `h2` package is installed
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def provider_limits(
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
+) -> httpx.Limits:
+    """
+    Connection pool limits for OpenRouter clients (OPENROUTER_MAX_CONNECTIONS,
+    OPENROUTER_MAX_KEEPALIVE, OPENROUTER_KEEPALIVE_EXPIRY). A small pool is
+    also cheaper per request: httpcore scans every pooled connection each
+    time a request is assigned.
+    """
+    return httpx.Limits(
+        max_connections=max_connections if max_connections is not None
+        else _env_int("OPENROUTER_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=max_keepalive_connections if max_keepalive_connections is not None
+        else _env_int("OPENROUTER_MAX_KEEPALIVE", 10),
+        keepalive_expiry=keepalive_expiry if keepalive_expiry is not None
+        else _env_float("OPENROUTER_KEEPALIVE_EXPIRY", 60.0),
+    )
+
+
+def provider_http_client(
+    base_url: str = OPENROUTER_BASE_URL,
+    response_hooks: Sequence[Callable[[httpx.Response], Awaitable[None]]] = (),
+) -> httpx.AsyncClient:
+    """
+    The pooled AsyncClient the agent's OpenAI client sends through. Created
+    once per process, so warm instances skip DNS, TCP and TLS setup
+    (OPENROUTER_TIMEOUT plus the provider_limits settings). Requests to
+    OpenRouter carry the app attribution headers.
+    """
+    return httpx.AsyncClient(
+        headers=OPENROUTER_HEADERS if base_url == OPENROUTER_BASE_URL else None,
+        timeout=_env_float("OPENROUTER_TIMEOUT", 90.0),
+        limits=provider_limits(),
+        http2=HTTP2_AVAILABLE,
+        event_hooks={"request": [propagate_request_id], "response": list(response_hooks)},
+    )
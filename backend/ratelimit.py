@@ -0,0 +1,331 @@
+"""
+EmailCraft AI - Rate limiting
+Per-client token buckets checked in ASGI middleware, before any request body is read
+"""
+
+import asyncio
+import importlib.util
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from metrics import RATE_LIMITED
+from scheduler import api_key_from_headers, client_ip, hash_api_key
+
+logger = logging.getLogger(__name__)
+
+# redis is optional; the shared Redis backend is only offered when it is installed
+REDIS_AVAILABLE = importlib.util.find_spec("redis") is not None
+
+# Routes that spend model tokens or send mail, by budget
+GENERATE_ROUTES = (
+    "/api/generate-email",
+    "/api/generate-email/stream",
+    "/api/generate-emails/batch",
+    "/api/refine-email",
+)
+SEND_ROUTES = ("/api/send-email", "/api/send-emails/batch")
+
+_HEADERS = (b"x-api-key", b"authorization", b"x-forwarded-for")
+
+
+@dataclass(frozen=True)
+class Budget:
+    """A token bucket: `burst` requests at once, refilled at `rate` per second"""
+    name: str
+    rate: float
+    burst: float
+
+
+class MemoryBuckets:
+    """
+    Buckets for this process, in least-recently-used order.
+
+    A bucket that has refilled completely is the same as no bucket, so
+    idle clients are dropped from the front on every call (amortized O(1))
+    and memory only grows with clients active within one refill window.
+    `max_clients` caps it even under a flood of distinct clients.
+    """
+
+    def __init__(self, max_clients: int = 100_000):
+        self.max_clients = max_clients
+        self.evictions = 0
+        # key -> [tokens, updated, full_at]
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    async def take(self, key: str, budget: Budget, cost: float = 1.0) -> tuple[bool, float]:
+        return self.take_now(key, budget, cost, time.monotonic())
+
+    def take_now(self, key: str, budget: Budget, cost: float, now: float) -> tuple[bool, float]:
+        """Spend `cost` tokens; returns (allowed, seconds until it would be)"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = budget.burst
+            bucket = self._buckets[key] = [0.0, 0.0, 0.0]
+        else:
+            tokens = min(budget.burst, bucket[0] + (now - bucket[1]) * budget.rate)
+            self._buckets.move_to_end(key)
+
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        bucket[0], bucket[1], bucket[2] = tokens, now, now + (budget.burst - tokens) / budget.rate
+        self._evict(now)
+        return allowed, 0.0 if allowed else (cost - tokens) / budget.rate
+
+    def _evict(self, now: float) -> None:
+        buckets = self._buckets
+        while buckets:
+            bucket = next(iter(buckets.values()))
+            if bucket[2] > now and len(buckets) <= self.max_clients:
+                break
+            buckets.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    """
+    Buckets in a SQLite file shared by the workers on one host. Each take
+    is one short write transaction; full buckets are pruned periodically.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._takes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=1.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)"
+        )
+
+    async def take(self, key: str, budget: Budget, cost: float = 1.0) -> tuple[bool, float]:
+        # The transaction can wait up to the busy timeout on another worker's lock
+        return await asyncio.to_thread(self.take_now, key, budget, cost, time.time())
+
+    def take_now(self, key: str, budget: Budget, cost: float, now: float) -> tuple[bool, float]:
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                tokens = budget.burst if row is None else min(budget.burst, row[0] + (now - row[1]) * budget.rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, now + (budget.burst - tokens) / budget.rate),
+                )
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0:
+                    self.evictions += conn.execute("DELETE FROM rate_buckets WHERE full_at <= ?", (now,)).rowcount
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return allowed, 0.0 if allowed else (cost - tokens) / budget.rate
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+
+
+# Refill and spend atomically on the Redis server, using its clock so every
+# instance agrees; keys expire once the bucket would be full again.
+_REDIS_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = burst
+if state[1] then
+    tokens = math.min(burst, tonumber(state[1]) + (now - tonumber(state[2])) * rate)
+end
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBuckets:
+    """Buckets in Redis (or anything speaking its protocol), shared by every instance"""
+
+    def __init__(self, url: str, prefix: str = "emailcraft:rl:"):
+        import redis.asyncio as redis_asyncio
+
+        self.prefix = prefix
+        self.evictions = 0
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(_REDIS_TAKE)
+
+    async def take(self, key: str, budget: Budget, cost: float = 1.0) -> tuple[bool, float]:
+        allowed, tokens = await self._script(keys=[self.prefix + key], args=[budget.rate, budget.burst, cost])
+        tokens = float(tokens)
+        return bool(allowed), 0.0 if allowed else (cost - tokens) / budget.rate
+
+
+class RateLimiter:
+    """
+    Checks a request against its route's budget for the client IP and,
+    when one is sent, the API key. Keys are not verified here, so the IP
+    bucket always applies too: rotating made-up keys gains nothing.
+
+    The backend failing (a locked database, Redis unreachable) lets the
+    request through; rate limiting should never take the API down.
+    """
+
+    def __init__(self, budgets: dict[str, Budget], backend):
+        self.backend = backend
+        self.budgets = budgets
+        self.routes: dict[str, Budget] = {}
+        for path in GENERATE_ROUTES:
+            if "generate" in budgets:
+                self.routes[path] = budgets["generate"]
+        for path in SEND_ROUTES:
+            if "send" in budgets:
+                self.routes[path] = budgets["send"]
+        self.backend_errors = 0
+
+    def budget_for(self, method: str, path: str) -> Optional[Budget]:
+        if method != "POST":
+            return None
+        return self.routes.get(path.rstrip("/") or "/")
+
+    async def check(self, budget: Budget, headers: dict[str, str], client_host: Optional[str]) -> Optional[tuple[str, float]]:
+        """(scope, retry after seconds) when the request is over budget, otherwise None"""
+        identities = [("ip", client_ip(headers, client_host))]
+        api_key = api_key_from_headers(headers)
+        if api_key:
+            identities.append(("key", hash_api_key(api_key)))
+
+        for scope, identity in identities:
+            try:
+                allowed, retry_after = await self.backend.take(f"{budget.name}:{identity}", budget)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f"Rate limit backend error, allowing request: {str(e)}")
+                return None
+            if not allowed:
+                RATE_LIMITED.inc(budget=budget.name, scope=scope)
+                return scope, retry_after
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            # Shared backends are not counted on every scrape
+            "clients": len(self.backend) if isinstance(self.backend, MemoryBuckets) else None,
+            "evictions": self.backend.evictions,
+            "backend_errors": self.backend_errors,
+        }
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware answering 429 with Retry-After for clients over their
+    budget. It only looks at the method, path and a few headers, so
+    rejected requests cost no body parsing, validation or model call.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiter
+        if limiter is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = limiter.budget_for(scope["method"], scope["path"])
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope.get("headers") or () if name in _HEADERS
+        }
+        client = scope.get("client")
+        limited = await limiter.check(budget, headers, client[0] if client else None)
+        if limited is None:
+            await self.app(scope, receive, send)
+            return
+
+        limited_scope, retry_after = limited
+        body = json.dumps({
+            "detail": f"Rate limit exceeded for {budget.name} requests ({limited_scope}), retry in {retry_after:.1f}s"
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def budget_from_env(name: str, per_minute: str, burst: str) -> Optional[Budget]:
+    """A budget from RATE_LIMIT_<NAME>_PER_MINUTE/_BURST; a rate of 0 disables it"""
+    prefix = f"RATE_LIMIT_{name.upper()}"
+    rate = float(os.getenv(f"{prefix}_PER_MINUTE", per_minute)) / 60.0
+    if rate <= 0:
+        return None
+    return Budget(name, rate, max(1.0, float(os.getenv(f"{prefix}_BURST", burst))))
+
+
+def create_rate_limiter() -> Optional[RateLimiter]:
+    """Build the rate limiter from environment settings"""
+    if os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+
+    budgets = {}
+    for budget in (budget_from_env("generate", "30", "10"), budget_from_env("send", "10", "5")):
+        if budget is not None:
+            budgets[budget.name] = budget
+    if not budgets:
+        return None
+
+    backend = None
+    redis_url = os.getenv("RATE_LIMIT_REDIS_URL")
+    sqlite_path = os.getenv("RATE_LIMIT_SQLITE_PATH")
+    if redis_url:
+        if REDIS_AVAILABLE:
+            backend = RedisBuckets(redis_url)
+        else:
+            logger.warning("RATE_LIMIT_REDIS_URL is set but the redis package is not installed; using in-memory buckets")
+    elif sqlite_path:
+        try:
+            backend = SQLiteBuckets(sqlite_path)
+        except sqlite3.Error as e:
+            logger.error(f"Could not open rate limit database {sqlite_path}: {str(e)}")
+    if backend is None:
+        backend = MemoryBuckets(max_clients=int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000")))
+
+    return RateLimiter(budgets, backend)
@@ -0,0 +1,299 @@
+"""
+EmailCraft AI - Draft refinement
+Local edits for common follow-up instructions and span edits returned by the model
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+from postprocess import parse_email, split_body
+from templates import GREETINGS, SIGN_OFFS
+
+_WORDS = re.compile(r"[a-z0-9']+")
+
+# Instruction words that carry no edit of their own
+STOPWORDS = frozenset("""
+a an the to it its this that my me i our we you your and also then please just can could would should
+make change set use be is more much bit little slightly way instead rather than so too one new email draft
+line part with of in for from into on at as
+""".split())
+
+_TONE_WORDS = {
+    "formal": "formal", "polite": "formal",
+    "professional": "professional",
+    "friendly": "friendly", "friendlier": "friendly", "warm": "friendly", "warmer": "friendly",
+    "casual": "casual", "informal": "casual", "relaxed": "casual",
+}
+_TONE = "|".join(_TONE_WORDS)
+_PART = r"greeting|salutation|opening|sign[- ]?off|closing|closer"
+_DOCUMENT = (r"resume|cv|portfolio|cover letter|references|invoice|report|proposal|slides|deck|contract"
+             r"|documents?|files?")
+
+# One pattern per local edit; an instruction is handled locally only if its
+# matches explain every content word in it
+_RULES = (
+    ("part_text", re.compile(
+        rf"\b(subject(?: line)?|{_PART})\b[^\"'“”]*?\bto\s*[\"“'](.+?)[\"”']", re.I)),
+    ("part_tone", re.compile(
+        rf"\b({_PART})s?\b(?:\s+and\s+(?:the\s+)?({_PART})s?\b)?[^.;\"]{{0,30}}?\b({_TONE})\b", re.I)),
+    ("tone_part", re.compile(
+        rf"\b({_TONE})\s+({_PART})s?\b(?:\s+and\s+(?:a\s+|the\s+)?(?:(?:{_TONE})\s+)?({_PART})s?\b)?", re.I)),
+    ("recipient", re.compile(
+        r"(?i:\b(?:address(?:ed)?\s+(?:it|this|the\s+email)\s+to|change\s+the\s+(?:recipient|name)\s+to"
+        r"|send\s+(?:it\s+)?to))\s+([A-Z][\w.'-]*(?:\s+[A-Z][\w.'-]*){0,3})")),
+    ("remove_attachment", re.compile(
+        r"\b(?:remove|drop|delete|take\s+out)\b[^.;]{0,30}?\battach\w*\b(?:\s+(?:mention|sentence|line|reference|part))?",
+        re.I)),
+    ("add_attachment", re.compile(
+        rf"\b(?:mention|say|note|add|include|state|tell\s+them)\b[^.;]{{0,40}}?\b({_DOCUMENT})\b"
+        rf"[^.;]{{0,20}}?\battach\w*\b", re.I)),
+    ("add_attachment", re.compile(
+        rf"\b(?:(?:mention|say|note|add|include|state|tell\s+them)\b[^.;]{{0,40}}?\battach\w*|attach\w*)\b"
+        rf"(?:[^.;]{{0,30}}?\b({_DOCUMENT})\b)?", re.I)),
+    ("remove_signature", re.compile(r"\b(?:remove|drop|delete)\b[^.;]{0,20}?\bsignature\b", re.I)),
+    ("signature", re.compile(
+        r"\b(?:swap|change|update|use|replace|add|switch|put)\b[^.;]{0,30}?\bsignature\b"
+        r"(?:\s+(?:block|details|instead))?", re.I)),
+)
+
+_GREETING_NAME = re.compile(
+    r"(dear|hi|hello|hey|good (?:morning|afternoon|evening))\b[ \t]*(.*?)[ \t]*([,!.:]?)[ \t]*\Z", re.I
+)
+_NOT_NAMES = {"", "there", "all", "everyone", "team", "sir or madam", "hiring manager"}
+
+_ATTACHMENT_SENTENCE = re.compile(r"[ \t]*[^.!?\n]*\battach\w*\b[^.!?\n]*[.!?]", re.I)
+
+
+@dataclass
+class LocalEdit:
+    """One edit applied without the model"""
+    kind: str
+    value: Optional[str] = None
+    parts: tuple[str, ...] = ()
+
+
+@dataclass
+class RefinedDraft:
+    subject: str
+    body: str
+    edits: list[str] = field(default_factory=list)
+
+
+def _part(name: str) -> str:
+    name = name.lower().replace(" ", "-")
+    return "greeting" if name in ("greeting", "salutation", "opening") else "closing"
+
+
+def plan_local_edits(instruction: str) -> Optional[list[LocalEdit]]:
+    """
+    Local edits for an instruction, or None when any part of it needs the
+    model ("shorter", "mention the deadline", ...).
+    """
+    edits: list[LocalEdit] = []
+    explained: set[str] = set()
+    taken: list[tuple[int, int]] = []
+    for kind, pattern in _RULES:
+        for match in pattern.finditer(instruction):
+            if any(start < match.end() and match.start() < end for start, end in taken):
+                continue
+            taken.append(match.span())
+            explained.update(_WORDS.findall(match.group(0).lower()))
+            groups = match.groups()
+            if kind == "part_text":
+                part = "subject" if groups[0].lower().startswith("subject") else _part(groups[0])
+                edits.append(LocalEdit(kind, groups[1].strip(), (part,)))
+            elif kind == "part_tone":
+                parts = tuple(_part(name) for name in groups[:2] if name)
+                edits.append(LocalEdit(kind, _TONE_WORDS[groups[2].lower()], parts))
+            elif kind == "tone_part":
+                parts = tuple(_part(name) for name in groups[1:] if name)
+                edits.append(LocalEdit("part_tone", _TONE_WORDS[groups[0].lower()], parts))
+            elif kind in ("recipient", "add_attachment"):
+                edits.append(LocalEdit(kind, groups[0]))
+            else:
+                edits.append(LocalEdit(kind))
+
+    content = [word for word in _WORDS.findall(instruction.lower()) if word not in STOPWORDS]
+    if not edits or any(word not in explained for word in content):
+        return None
+    return edits
+
+
+def requested_tone(instruction: str) -> Optional[str]:
+    """The tone a whole-email instruction asks for ("make it more formal"), if any"""
+    match = re.search(rf"\b({_TONE})\b", instruction, re.I)
+    return _TONE_WORDS[match.group(1).lower()] if match else None
+
+
+def recipient_from_greeting(greeting: Optional[str]) -> Optional[str]:
+    match = _GREETING_NAME.match(greeting or "")
+    if match is None or match.group(2).lower() in _NOT_NAMES:
+        return None
+    return match.group(2)
+
+
+def _closing_bounds(body: str) -> Optional[tuple[int, int]]:
+    """Start and end of the sign-off line; the sender's name and signature follow it"""
+    _, _, closing = split_body(body)
+    if closing is None:
+        return None
+    start = body.rfind(closing)
+    return start, start + len(closing.split("\n", 1)[0])
+
+
+def set_greeting(body: str, greeting: str) -> str:
+    current, _, _ = split_body(body)
+    if current is None:
+        return f"{greeting}\n\n{body}"
+    start = body.find(current)
+    return body[:start] + greeting + body[start + len(current):]
+
+
+def set_sign_off(body: str, sign_off: str) -> str:
+    bounds = _closing_bounds(body)
+    if bounds is None:
+        return f"{body.rstrip()}\n\n{sign_off}"
+    return body[:bounds[0]] + sign_off + body[bounds[1]:]
+
+
+def set_signature(body: str, signature: str) -> str:
+    """Replace everything after the sign-off (sender name, old signature) with `signature`"""
+    bounds = _closing_bounds(body)
+    head = body[:bounds[1]] if bounds is not None else body.rstrip()
+    return f"{head}\n\n{signature}" if signature else head
+
+
+def remove_signature(body: str) -> str:
+    """Drop the signature block, keeping a sender name written directly under the sign-off"""
+    bounds = _closing_bounds(body)
+    if bounds is None:
+        return body
+    name, _, _ = body[bounds[1]:].partition("\n\n")
+    return body[:bounds[1]] + (name.rstrip() if name.startswith("\n") else "")
+
+
+def add_attachment_sentence(body: str, sentence: str) -> str:
+    """Append the sentence to the last paragraph before the sign-off"""
+    _, content, _ = split_body(body)
+    if not content:
+        return body
+    end = body.rfind(content) + len(content)
+    return body[:end] + " " + sentence + body[end:]
+
+
+def remove_attachment_sentences(body: str) -> str:
+    body = _ATTACHMENT_SENTENCE.sub("", body)
+    return re.sub(r"\n{3,}", "\n\n", re.sub(r"[ \t]+\n", "\n", body)).strip()
+
+
+def attachment_sentence(document: Optional[str], tone: str) -> str:
+    if document:
+        thing = "my CV" if document.lower() == "cv" else f"my {document.lower()}"
+    else:
+        thing = "the relevant documents"
+    if tone == "casual":
+        return f"I've attached {thing}."
+    return f"I have attached {thing} for your reference."
+
+
+def apply_local_edits(subject: str, body: str, tone: str, edits: list[LocalEdit],
+                      signature: str = "") -> RefinedDraft:
+    """Apply planned edits; `signature` is the rendered signature to swap in"""
+    applied = []
+    for edit in edits:
+        if edit.kind == "part_text":
+            if edit.parts[0] == "subject":
+                subject = edit.value
+            elif edit.parts[0] == "greeting":
+                body = set_greeting(body, edit.value)
+            else:
+                body = set_sign_off(body, edit.value)
+            applied.append(f"{edit.parts[0]}: {edit.value}")
+        elif edit.kind == "part_tone":
+            for part in edit.parts:
+                if part == "greeting":
+                    greeting, _, _ = split_body(body)
+                    name = recipient_from_greeting(greeting)
+                    with_name, without_name = GREETINGS[edit.value]
+                    body = set_greeting(body, with_name.format(name=name) if name else without_name)
+                else:
+                    body = set_sign_off(body, SIGN_OFFS[edit.value])
+                applied.append(f"{part}: {edit.value}")
+        elif edit.kind == "recipient":
+            greeting, _, _ = split_body(body)
+            match = _GREETING_NAME.match(greeting or "")
+            word = match.group(1) if match and match.group(1).lower() != "good morning" else "Dear"
+            body = set_greeting(body, f"{word[:1].upper()}{word[1:]} {edit.value},")
+            applied.append(f"recipient: {edit.value}")
+        elif edit.kind == "add_attachment":
+            if not _ATTACHMENT_SENTENCE.search(body):
+                body = add_attachment_sentence(body, attachment_sentence(edit.value, tone))
+            applied.append("attachment mention")
+        elif edit.kind == "remove_attachment":
+            body = remove_attachment_sentences(body)
+            applied.append("attachment mention removed")
+        elif edit.kind == "signature":
+            body = set_signature(body, signature)
+            applied.append("signature")
+        elif edit.kind == "remove_signature":
+            body = remove_signature(body)
+            applied.append("signature removed")
+    return RefinedDraft(subject, body, applied)
+
+
+# Model edits
+
+_EDIT = re.compile(r"^FIND:[ \t]?(.*?)\n^REPLACE:[ \t]?(.*?)(?=\n^FIND:|\Z)", re.DOTALL | re.MULTILINE)
+
+
+def parse_edits(text: str) -> list[tuple[str, str]]:
+    """(find, replace) pairs from the model's reply; "NONE" or anything unparsable gives no edits"""
+    return [(find.strip("\n"), replace.strip("\n")) for find, replace in _EDIT.findall(text.strip())
+            if find.strip()]
+
+
+def _locate(text: str, find: str) -> Optional[tuple[int, int]]:
+    """Exact match first, then one that ignores whitespace differences and case"""
+    start = text.find(find)
+    if start != -1:
+        return start, start + len(find)
+    pattern = r"\s+".join(re.escape(part) for part in find.split())
+    match = re.search(pattern, text) or re.search(pattern, text, re.I)
+    return match.span() if match else None
+
+
+def apply_edits(text: str, edits: list[tuple[str, str]]) -> tuple[str, int]:
+    """Apply find/replace edits in order; returns the text and how many applied"""
+    applied = 0
+    for find, replace in edits:
+        span = _locate(text, find)
+        if span is None:
+            continue
+        text = text[:span[0]] + replace + text[span[1]:]
+        applied += 1
+    return text, applied
+
+
+def split_for_model(body: str) -> tuple[str, str]:
+    """
+    (text sent to the model, tail kept aside): the sender's name and
+    signature after the sign-off are not sent, and are put back afterwards.
+    """
+    bounds = _closing_bounds(body)
+    if bounds is None:
+        return body, ""
+    return body[:bounds[1]], body[bounds[1]:]
+
+
+def apply_model_edits(subject: str, body: str, reply: str) -> tuple[RefinedDraft, int, int]:
+    """Apply the model's span edits to the subject line and body; returns the draft, edits applied and proposed"""
+    head, tail = split_for_model(body)
+    edits = parse_edits(reply)
+    text, applied = apply_edits(f"Subject: {subject}\n\n{head}", edits)
+    parsed = parse_email(text)
+    return RefinedDraft(
+        parsed.subject or subject,
+        parsed.body + tail,
+        [f"{applied} of {len(edits)} model edits"],
+    ), applied, len(edits)
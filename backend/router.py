@@ -0,0 +1,234 @@
+"""
+EmailCraft AI - Model router
+Latency-aware model selection with hedged requests and fallback
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ModelStats:
+    """Moving averages of latency and error rate for one model"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.last_failure = 0.0
+        self._samples: deque[float] = deque(maxlen=200)
+
+    def record_success(self, latency: float) -> None:
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+        self.error_rate = (1 - self.alpha) * self.error_rate
+        self._samples.append(latency)
+
+    def record_failure(self) -> None:
+        self.requests += 1
+        self.errors += 1
+        self.consecutive_failures += 1
+        self.last_failure = time.monotonic()
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+
+    def p95(self, min_samples: int = 10) -> Optional[float]:
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+class ModelRouter:
+    """
+    Route each request across an ordered list of candidate models.
+
+    Healthy models are tried fastest first (by moving-average latency;
+    models without data keep their configured order). So that a fallback's
+    latency is ever learned, `explore` of routed requests try a healthy
+    model without data first. A model is unhealthy
+    after `failure_threshold` consecutive failures, until `cooldown`
+    seconds have passed. With hedging on, if the chosen model has not
+    answered by its p95 latency, the next model is started too; the first
+    success wins and the other call is cancelled. Failures fall through to
+    the next candidate, except for the exception types in `no_fallback`.
+    """
+
+    def __init__(
+        self,
+        models: list[str],
+        hedge: bool = True,
+        hedge_delay: float = 8.0,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        no_fallback: tuple[type[BaseException], ...] = (),
+        explore: float = 0.05,
+    ):
+        if not models:
+            raise ValueError("At least one model is required")
+        self.models = list(models)
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.no_fallback = no_fallback
+        self.explore = explore
+        self.model_stats = {model: ModelStats() for model in self.models}
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.explorations = 0
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+    def healthy(self, model: str) -> bool:
+        stats = self.model_stats[model]
+        return (
+            stats.consecutive_failures < self.failure_threshold
+            or time.monotonic() - stats.last_failure > self.cooldown
+        )
+
+    def order(self, explore: bool = False) -> list[str]:
+        """
+        Candidates to try: healthy models fastest first, then unhealthy ones
+        as a last resort. With `explore`, a share of calls put a healthy
+        model without latency data first.
+        """
+        def latency(model: str) -> float:
+            value = self.model_stats[model].latency
+            return float("inf") if value is None else value
+
+        healthy = sorted((m for m in self.models if self.healthy(m)), key=latency)
+        unmeasured = [m for m in healthy[1:] if self.model_stats[m].latency is None]
+        if explore and unmeasured and random.random() < self.explore:
+            model = random.choice(unmeasured)
+            healthy.remove(model)
+            healthy.insert(0, model)
+            self.explorations += 1
+        return healthy + [m for m in self.models if m not in healthy]
+
+    def record(self, model: str, latency: Optional[float]) -> None:
+        """Record an outcome measured outside `run`; None marks a failure"""
+        if latency is None:
+            self.model_stats[model].record_failure()
+        else:
+            self.model_stats[model].record_success(latency)
+
+    def _hedge_after(self, model: str) -> float:
+        return self.model_stats[model].p95() or self.hedge_delay
+
+    async def _timed(self, model: str, call: Callable[[str], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        try:
+            result = await call(model)
+        except asyncio.CancelledError:
+            raise
+        except self.no_fallback:
+            # Rejected before reaching the model (overload, deadline); not the model's fault
+            raise
+        except Exception:
+            self.model_stats[model].record_failure()
+            raise
+        self.model_stats[model].record_success(time.monotonic() - start)
+        return result
+
+    async def _hedged(self, primary: str, rest: list[str], call: Callable[[str], Awaitable[T]]) -> tuple[T, str]:
+        first = asyncio.ensure_future(self._timed(primary, call))
+        models = {first: primary}
+        try:
+            if not self.hedge or not rest:
+                return await first, primary
+
+            done, _ = await asyncio.wait({first}, timeout=self._hedge_after(primary))
+            if done:
+                return first.result(), primary
+
+            secondary = rest.pop(0)
+            self.hedged += 1
+            logger.info(f"Hedging {primary} with {secondary}")
+            second = asyncio.ensure_future(self._timed(secondary, call))
+            models[second] = secondary
+            pending = {first, second}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result(), models[task]
+                    error = task.exception()
+            raise error
+        finally:
+            # Also runs when the caller is cancelled, so no upstream call outlives it
+            unfinished = [task for task in models if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def run(self, call: Callable[[str], Awaitable[T]]) -> tuple[T, str]:
+        """Run `call(model)` against the best candidate; returns (result, model used)"""
+        candidates = self.order(explore=True)
+        while True:
+            primary = candidates.pop(0)
+            try:
+                return await self._hedged(primary, candidates, call)
+            except self.no_fallback:
+                raise
+            except Exception as e:
+                if not candidates:
+                    raise
+                self.fallbacks += 1
+                logger.warning(f"Model {primary} failed, falling back to {candidates[0]}: {str(e)}")
+
+    def stats(self) -> dict[str, Any]:
+        """Per-model latency and error rates plus hedging counters"""
+        return {
+            "models": {
+                model: {
+                    "healthy": self.healthy(model),
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "error_rate": round(stats.error_rate, 4),
+                    "latency_ms": round(stats.latency * 1000, 2) if stats.latency is not None else None,
+                    "p95_ms": round(stats.p95() * 1000, 2) if stats.p95() is not None else None,
+                }
+                for model, stats in self.model_stats.items()
+            },
+            "order": self.order(),
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "explorations": self.explorations,
+        }
+
+
+def model_list_from_env(default: str) -> list[str]:
+    """Candidate models from EMAIL_MODELS (comma separated), falling back to `default`"""
+    models = [m.strip() for m in os.getenv("EMAIL_MODELS", "").split(",") if m.strip()]
+    return models or [default]
+
+
+def create_model_router(models: list[str], no_fallback: tuple[type[BaseException], ...] = ()) -> ModelRouter:
+    """Build the model router from environment settings"""
+    return ModelRouter(
+        models,
+        hedge=os.getenv("MODEL_HEDGING", "true").lower() not in ("0", "false", "no"),
+        hedge_delay=float(os.getenv("MODEL_HEDGE_DELAY", "8")),
+        no_fallback=no_fallback,
+        explore=float(os.getenv("MODEL_EXPLORE_RATE", "0.05")),
+    )
@@ -0,0 +1,213 @@
+"""
+EmailCraft AI - Request scheduler
+Priority classes and weighted fair queuing per tenant for upstream model calls
+"""
+
+import hashlib
+import os
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Container, Iterator, Mapping, Optional
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+
+# Highest priority first
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+
+
+@dataclass(frozen=True)
+class RequestClass:
+    """Who a model call is for and how urgently it is needed"""
+    tenant: str = "anonymous"
+    priority: str = PRIORITY_INTERACTIVE
+    deadline: Optional[float] = None  # time.monotonic() by which the call should finish
+
+
+_current_class: ContextVar[RequestClass] = ContextVar("emailcraft_request_class", default=RequestClass())
+
+
+def current_request_class() -> RequestClass:
+    return _current_class.get()
+
+
+@contextmanager
+def scheduling(request_class: RequestClass) -> Iterator[RequestClass]:
+    """Schedule the model calls made inside the block (and tasks started there) as `request_class`"""
+    token = _current_class.set(request_class)
+    try:
+        yield request_class
+    finally:
+        _current_class.reset(token)
+
+
+def hash_api_key(api_key: str) -> str:
+    """Stable short id for an API key, so raw keys never reach stats or logs"""
+    return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def api_key_from_headers(headers: Mapping[str, str]) -> Optional[str]:
+    """The API key sent as X-API-Key or a bearer token, if any"""
+    api_key = headers.get("x-api-key")
+    if not api_key:
+        authorization = headers.get("authorization", "")
+        if authorization[:7].lower() == "bearer ":
+            api_key = authorization[7:].strip()
+    return api_key or None
+
+
+def client_ip(headers: Mapping[str, str], client_host: Optional[str]) -> str:
+    """
+    `ip:<address>` of the client. X-Forwarded-For is only trusted with
+    TRUST_FORWARDED_FOR=true, i.e. behind a proxy that sets it.
+    """
+    if os.getenv("TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes"):
+        forwarded = headers.get("x-forwarded-for", "").split(",")[0].strip()
+        if forwarded:
+            return f"ip:{forwarded}"
+    return f"ip:{client_host or 'unknown'}"
+
+
+def client_identity(headers: Mapping[str, str], client_host: Optional[str], tenants: Container[str] = ()) -> str:
+    """
+    Tenant id for a request: the hashed API key if it is one of `tenants`
+    (the keys configured in SCHEDULER_TENANT_WEIGHTS), otherwise the client
+    IP. Other keys are not validated, so sending a new one on every request
+    must not make a new tenant.
+    """
+    api_key = api_key_from_headers(headers)
+    if api_key:
+        tenant = hash_api_key(api_key)
+        if tenant in tenants:
+            return tenant
+    return client_ip(headers, client_host)
+
+
+def request_class_from_headers(headers: Mapping[str, str], client_host: Optional[str],
+                               priority: Optional[str] = None, deadline: Optional[float] = None,
+                               tenants: Container[str] = ()) -> RequestClass:
+    """
+    Build the request class for an incoming request. Clients may mark
+    themselves `X-Priority: batch`; `priority` forces the class (e.g. for
+    the batch endpoint). `tenants` are the API key tenants the gateway
+    knows (see client_identity).
+    """
+    if priority is None:
+        requested = headers.get("x-priority", "").strip().lower()
+        priority = PRIORITY_BATCH if requested == PRIORITY_BATCH else PRIORITY_INTERACTIVE
+    return RequestClass(tenant=client_identity(headers, client_host, tenants), priority=priority, deadline=deadline)
+
+
+def parse_weights(value: str) -> dict[str, float]:
+    """
+    Parse `SCHEDULER_TENANT_WEIGHTS` (comma separated `tenant=weight`).
+    Tenants are API keys, which are hashed here, or `ip:<address>`. Only
+    keys listed here are tenants of their own.
+    """
+    weights = {}
+    for item in value.split(","):
+        tenant, _, weight = item.strip().rpartition("=")
+        if not tenant or not weight:
+            continue
+        weights[tenant if tenant.startswith("ip:") else hash_api_key(tenant)] = float(weight)
+    return weights
+
+
+class Waiter:
+    """One caller queued for an upstream slot"""
+    __slots__ = ("tenant", "priority", "tokens", "deadline", "start", "finish", "future", "enqueued_at")
+
+    def __init__(self, tenant: str, priority: str, tokens: int, deadline: float, future, enqueued_at: float):
+        self.tenant = tenant
+        self.priority = priority
+        self.tokens = tokens
+        self.deadline = deadline
+        self.start = 0.0
+        self.finish = 0.0
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class FairQueue:
+    """
+    Strict priority between classes; weighted fair queuing between tenants
+    within a class.
+
+    Uses start-time fair queuing: each waiter gets a virtual finish time
+    `max(V, tenant's last finish) + cost / weight`, and the eligible tenant
+    head with the smallest finish time goes next. A tenant with ten
+    thousand queued requests therefore waits its turn behind a tenant with
+    one, instead of in front of it. Only tenants with queued requests are
+    kept, so memory is O(active tenants).
+    """
+
+    def __init__(self, weights: Optional[dict[str, float]] = None, default_weight: float = 1.0):
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self._queues: dict[str, dict[str, deque[Waiter]]] = {priority: {} for priority in PRIORITIES}
+        self._virtual: dict[str, float] = {priority: 0.0 for priority in PRIORITIES}
+        self._last_finish: dict[tuple[str, str], float] = {}
+        self._depth: dict[str, int] = {priority: 0 for priority in PRIORITIES}
+
+    def push(self, waiter: Waiter, cost: float = 1.0) -> None:
+        key = (waiter.priority, waiter.tenant)
+        waiter.start = max(self._virtual[waiter.priority], self._last_finish.get(key, 0.0))
+        waiter.finish = waiter.start + cost / self.weights.get(waiter.tenant, self.default_weight)
+        self._last_finish[key] = waiter.finish
+        self._queues[waiter.priority].setdefault(waiter.tenant, deque()).append(waiter)
+        self._depth[waiter.priority] += 1
+
+    def remove(self, waiter: Waiter) -> None:
+        queue = self._queues[waiter.priority].get(waiter.tenant)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        self._depth[waiter.priority] -= 1
+        if not queue:
+            self._forget(waiter.priority, waiter.tenant)
+
+    def pop(self, eligible: Callable[[Waiter], bool]) -> Optional[Waiter]:
+        """Next waiter to admit, skipping tenant heads that `eligible` rejects"""
+        for priority in PRIORITIES:
+            best = None
+            for queue in self._queues[priority].values():
+                head = queue[0]
+                if (best is None or head.finish < best.finish) and eligible(head):
+                    best = head
+            if best is None:
+                continue
+            queue = self._queues[priority][best.tenant]
+            queue.popleft()
+            self._depth[priority] -= 1
+            # Virtual time advances to the start tag of the waiter being served
+            self._virtual[priority] = max(self._virtual[priority], best.start)
+            if not queue:
+                self._forget(priority, best.tenant)
+            return best
+        return None
+
+    def _forget(self, priority: str, tenant: str) -> None:
+        del self._queues[priority][tenant]
+        # Finish tags at or behind virtual time no longer affect anyone's start tag
+        if len(self._last_finish) > 2 * self.tenants() + 64:
+            self._last_finish = {
+                key: finish for key, finish in self._last_finish.items()
+                if finish > self._virtual[key[0]] or key[1] in self._queues[key[0]]
+            }
+
+    def depth(self, priority: Optional[str] = None) -> int:
+        if priority is None:
+            return sum(self._depth.values())
+        return self._depth[priority]
+
+    def tenants(self) -> int:
+        return sum(len(queues) for queues in self._queues.values())
+
+    def stats(self) -> dict[str, Any]:
+        return {priority: {"queue_depth": self._depth[priority], "tenants_waiting": len(self._queues[priority])}
+                for priority in PRIORITIES}
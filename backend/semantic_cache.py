@@ -0,0 +1,316 @@
+"""
+EmailCraft AI - Semantic cache
+Near-duplicate lookup of generated emails by hashed n-gram similarity
+"""
+
+import importlib.util
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# The semantic tier is only available when the optional `numpy` package is
+# installed; it is imported on first use so a cold start without the tier skips it
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+_WORDS = re.compile(r"[a-z0-9']+")
+_NUMBERS = re.compile(r"\d+")
+_PARTITION_NAME = re.compile(r"[^a-z0-9_-]")
+
+DEFAULT_DIMS = 512
+
+
+def embed(text: str, dims: int = DEFAULT_DIMS) -> "np.ndarray":
+    """
+    Unit-length signed feature-hashing vector of words, word bigrams and
+    character trigrams. Runs offline in microseconds; crc32 keeps vectors
+    stable across processes so they can be persisted.
+    """
+    import numpy as np
+
+    words = _WORDS.findall(text.lower())
+    joined = f" {' '.join(words)} "
+    features = [f"w:{word}" for word in words]
+    features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    features += [joined[i:i + 3] for i in range(len(joined) - 2)]
+
+    if not features:
+        return np.zeros(dims, dtype=np.float32)
+    hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features),
+                         dtype=np.uint32, count=len(features))
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+    vector = np.bincount(hashes % dims, weights=signs, minlength=dims).astype(np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def repersonalize(value: dict, old_name: Optional[str], new_name: Optional[str]) -> dict:
+    """Swap the recipient a cached draft was written for (full, first and last name) for a new one"""
+    if not old_name or not new_name or old_name == new_name:
+        return value
+    old_parts, new_parts = old_name.split(), new_name.split()
+    if not old_parts or not new_parts:
+        return value
+    names = {old_name: new_name, old_parts[0]: new_parts[0]}
+    # A surname is only swapped for a surname, never for the new first name
+    if len(old_parts) > 1 and len(new_parts) > 1:
+        names.setdefault(old_parts[-1], new_parts[-1])
+    # Longest names first so a full name is replaced before its parts
+    pattern = re.compile("|".join(rf"\b{re.escape(name)}\b" for name in sorted(names, key=len, reverse=True)))
+    replace = lambda text: pattern.sub(lambda match: names[match.group(0)], text)
+    return {**value, "subject": replace(value["subject"]), "body": replace(value["body"])}
+
+
+class _Partition:
+    """
+    Vectors of one partition in a fixed-capacity matrix (memory-mapped when
+    persisted) plus per-row entries. Free rows hold zero vectors, so they
+    never score above the threshold.
+    """
+
+    def __init__(self, name: str, capacity: int, dims: int, directory: Optional[str] = None):
+        import numpy as np
+
+        self.name = name
+        self.capacity = capacity
+        self.dims = dims
+        self.size = 0  # rows ever used; lookups only scan vectors[:size]
+        self.entries: list[Optional[dict]] = []
+        self.free: list[int] = []
+        self.used = np.zeros(capacity, dtype=np.float64)
+        self._paths = None
+        if directory is None:
+            self.vectors = np.zeros((capacity, dims), dtype=np.float32)
+        else:
+            self._paths = (os.path.join(directory, f"{name}.vectors"), os.path.join(directory, f"{name}.json"))
+            self._open()
+
+    def _open(self) -> None:
+        """Map the vector file and restore the rows whose metadata still matches"""
+        import numpy as np
+
+        vector_path, meta_path = self._paths
+        expected = self.capacity * self.dims * 4
+        exists = os.path.exists(vector_path) and os.path.getsize(vector_path) == expected
+        self.vectors = np.memmap(vector_path, dtype=np.float32, mode="r+" if exists else "w+",
+                                 shape=(self.capacity, self.dims))
+        meta = None
+        if exists and os.path.exists(meta_path):
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring semantic cache metadata {meta_path}: {str(e)}")
+        if not meta or meta.get("dims") != self.dims or meta.get("capacity") != self.capacity:
+            self.vectors[:] = 0
+            return
+
+        self.size = meta["size"]
+        self.entries = meta["entries"]
+        self.used[:self.size] = meta["used"]
+        for row, entry in enumerate(self.entries):
+            # Rows rewritten after the last save no longer match their checksum
+            if entry is not None and entry["checksum"] != self._checksum(row):
+                self.entries[row] = None
+            if self.entries[row] is None:
+                self.vectors[row] = 0
+                self.free.append(row)
+
+    def _checksum(self, row: int) -> int:
+        return zlib.crc32(self.vectors[row].tobytes())
+
+    def best(self, query: "np.ndarray") -> tuple[int, float]:
+        """Row with the highest cosine similarity to a unit query vector"""
+        if not self.size:
+            return -1, 0.0
+        scores = self.vectors[:self.size] @ query
+        row = int(scores.argmax())
+        return row, float(scores[row])
+
+    def put(self, vector: "np.ndarray", entry: dict, now: float) -> bool:
+        """Store a row, evicting the least recently used one when full; returns True on eviction"""
+        evicted = False
+        if self.free:
+            row = self.free.pop()
+        elif self.size < self.capacity:
+            row = self.size
+            self.size += 1
+            self.entries.append(None)
+        else:
+            row = int(self.used[:self.size].argmin())
+            evicted = True
+        self.vectors[row] = vector
+        entry["checksum"] = self._checksum(row)
+        self.entries[row] = entry
+        self.used[row] = now
+        return evicted
+
+    def drop(self, row: int) -> None:
+        self.vectors[row] = 0
+        self.entries[row] = None
+        self.used[row] = 0.0
+        self.free.append(row)
+
+    def save(self) -> None:
+        """Flush the mapped vectors, then atomically replace the metadata"""
+        if self._paths is None:
+            return
+        vector_path, meta_path = self._paths
+        self.vectors.flush()
+        meta = {
+            "dims": self.dims,
+            "capacity": self.capacity,
+            "size": self.size,
+            "entries": self.entries,
+            "used": self.used[:self.size].tolist(),
+        }
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, separators=(",", ":"))
+        os.replace(tmp_path, meta_path)
+
+    def __len__(self) -> int:
+        return self.size - len(self.free)
+
+
+class SemanticCache:
+    """
+    Near-duplicate cache of generated emails.
+
+    Requests are partitioned by everything that changes the draft's shape
+    (tone, whether there is a recipient, attachments), so only the free-text
+    context is compared. A stored draft is returned when its cosine
+    similarity reaches `threshold` and the requests mention the same
+    numbers (dates, amounts and quarters rarely survive a paraphrase
+    unchanged). The recipient name is swapped into the returned draft.
+    """
+
+    def __init__(self, threshold: float = 0.9, dims: int = DEFAULT_DIMS, max_entries: int = 2048,
+                 ttl: float = 3600.0, path: Optional[str] = None, save_every: int = 32,
+                 encoder: Optional[Callable[[str, int], "np.ndarray"]] = None):
+        self.threshold = threshold
+        self.dims = dims
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.save_every = save_every
+        self.encoder = encoder or embed
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._partitions: dict[str, _Partition] = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def _partition(self, name: str) -> _Partition:
+        partition = self._partitions.get(name)
+        if partition is None:
+            safe_name = _PARTITION_NAME.sub("_", name.lower())
+            partition = self._partitions[name] = _Partition(safe_name, self.max_entries, self.dims, self.path)
+        return partition
+
+    def get(self, partition: str, text: str, recipient_name: Optional[str] = None) -> Optional[dict]:
+        """Cached draft for a near-duplicate request, re-personalized for `recipient_name`"""
+        query = self.encoder(text, self.dims)
+        numbers = sorted(_NUMBERS.findall(text))
+        now = time.time()
+        with self._lock:
+            part = self._partition(partition)
+            row, score = part.best(query)
+            entry = part.entries[row] if row >= 0 and score >= self.threshold else None
+            if entry is not None and entry["expires_at"] < now:
+                part.drop(row)
+                self.evictions += 1
+                entry = None
+            if entry is None or entry["numbers"] != numbers:
+                self.misses += 1
+                return None
+            part.used[row] = now
+            self.hits += 1
+        logger.info(f"Semantic cache hit - similarity {score:.3f}")
+        return repersonalize(entry["value"], entry["recipient"], recipient_name)
+
+    def set(self, partition: str, text: str, value: dict, recipient_name: Optional[str] = None) -> None:
+        vector = self.encoder(text, self.dims)
+        now = time.time()
+        entry = {
+            "value": value,
+            "recipient": recipient_name,
+            "numbers": sorted(_NUMBERS.findall(text)),
+            "expires_at": now + self.ttl,
+        }
+        with self._lock:
+            part = self._partition(partition)
+            # A near-identical entry is replaced rather than duplicated
+            row, score = part.best(vector)
+            if row >= 0 and score >= 0.999 and part.entries[row] is not None:
+                part.drop(row)
+            if part.put(vector, entry, now):
+                self.evictions += 1
+            self._unsaved += 1
+            if self.path and self._unsaved >= self.save_every:
+                self._save_locked()
+
+    def save(self) -> None:
+        """Persist every partition (no-op without a path)"""
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self) -> None:
+        self._unsaved = 0
+        for part in self._partitions.values():
+            try:
+                part.save()
+            except OSError as e:
+                logger.error(f"Could not save semantic cache partition {part.name}: {str(e)}")
+
+    def clear(self) -> None:
+        with self._lock:
+            for part in self._partitions.values():
+                for row in range(part.size):
+                    if part.entries[row] is not None:
+                        part.drop(row)
+
+    def stats(self) -> dict[str, Any]:
+        """Hit, miss and eviction counters"""
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = sum(len(part) for part in self._partitions.values())
+            partitions = len(self._partitions)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "partitions": partitions,
+            "threshold": self.threshold,
+            "persistent": self.path is not None,
+        }
+
+
+def create_semantic_cache() -> Optional[SemanticCache]:
+    """Build the semantic cache from environment settings (disabled by default)"""
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    if not NUMPY_AVAILABLE:
+        logger.warning("SEMANTIC_CACHE_ENABLED is set but numpy is not installed; semantic cache disabled")
+        return None
+    import numpy  # noqa: F401 - loaded with the app rather than on the first lookup
+
+    return SemanticCache(
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+        dims=int(os.getenv("SEMANTIC_CACHE_DIMS", str(DEFAULT_DIMS))),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048")),
+        ttl=float(os.getenv("SEMANTIC_CACHE_TTL", os.getenv("EMAIL_CACHE_TTL", "3600"))),
+        path=os.getenv("SEMANTIC_CACHE_PATH") or None,
+        save_every=int(os.getenv("SEMANTIC_CACHE_SAVE_EVERY", "32")),
+    )
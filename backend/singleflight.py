@@ -0,0 +1,86 @@
+"""
+EmailCraft AI - Request coalescing
+Collapse identical in-flight generation requests into one upstream call
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    """A shared upstream call, the deadline it runs under and the number of callers waiting on it"""
+
+    def __init__(self, task: "asyncio.Task[T]", deadline: Optional[float]):
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """
+    Run at most one coroutine per key at a time.
+
+    Callers that arrive while a call for the same key is running wait on
+    that call and receive its result or exception. Cancelling a waiter only
+    detaches it; the upstream call is cancelled once nobody is waiting.
+
+    The call runs under the `deadline` (time.monotonic()) of the caller
+    that started it. A caller that joined it with more time left is not
+    failed by that deadline: if the call fails once its deadline has
+    passed, the caller runs it again under its own.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, _Call[T]] = {}
+        self.coalesced = 0
+        self.reruns = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        while True:
+            call = self._calls.get(key)
+            started = call is None
+            if started:
+                call = _Call(asyncio.ensure_future(fn()), deadline)
+                self._calls[key] = call
+                call.task.add_done_callback(lambda _, call=call: self._forget(key, call))
+            else:
+                self.coalesced += 1
+                logger.info(f"Coalesced duplicate request - waiters: {call.waiters + 1}")
+
+            call.waiters += 1
+            try:
+                return await asyncio.shield(call.task)
+            except asyncio.CancelledError:
+                if call.waiters == 1 and not call.task.done():
+                    call.task.cancel()
+                    # New callers must not join a call that is still unwinding
+                    self._forget(key, call)
+                raise
+            except Exception:
+                if started or not _outlives(deadline, call.deadline):
+                    raise
+            finally:
+                call.waiters -= 1
+            self.reruns += 1
+            logger.info("Shared call ran out of its deadline, running it again for a caller with time left")
+
+    def _forget(self, key: str, call: _Call[T]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+def _outlives(deadline: Optional[float], call_deadline: Optional[float]) -> bool:
+    """Whether a caller with `deadline` still has time after a call bounded by `call_deadline` ran out"""
+    now = time.monotonic()
+    if call_deadline is None or now < call_deadline:
+        return False
+    return deadline is None or deadline > now
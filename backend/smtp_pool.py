@@ -0,0 +1,319 @@
+"""
+EmailCraft AI - SMTP transport
+Pooled, authenticated SMTP connections with pipelined batch delivery
+"""
+
+import logging
+import os
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import parseaddr
+from typing import Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+PoolKey = tuple[str, int, str]
+
+# Errors that leave the session itself usable once RSET is sent
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+@dataclass(frozen=True)
+class SMTPSettings:
+    """SMTP server and credentials"""
+    host: str
+    port: int
+    username: str
+    password: str
+    sender_email: str
+    starttls: bool = True
+
+    @property
+    def key(self) -> PoolKey:
+        return (self.host, self.port, self.username)
+
+    @classmethod
+    def from_env(cls) -> "SMTPSettings":
+        """Read SMTP configuration from environment variables"""
+        username = os.environ.get("SMTP_USERNAME")
+        password = os.environ.get("SMTP_PASSWORD")
+        if not username or not password:
+            raise ValueError("Email credentials not configured. Please set SMTP_USERNAME and SMTP_PASSWORD environment variables.")
+        return cls(
+            host=os.environ.get("SMTP_HOST", "smtp.gmail.com"),
+            port=int(os.environ.get("SMTP_PORT", "587")),
+            username=username,
+            password=password,
+            sender_email=os.environ.get("SENDER_EMAIL", username),
+            starttls=os.environ.get("SMTP_STARTTLS", "true").lower() not in ("0", "false", "no"),
+        )
+
+
+def validate_address(address: str) -> str:
+    """
+    Return a bare recipient address, or raise ValueError.
+
+    Addresses end up inside raw SMTP commands, so line breaks and angle
+    brackets are rejected outright rather than quoted.
+    """
+    address = address.strip()
+    if any(char in address for char in "\r\n<>"):
+        raise ValueError("Email address must not contain line breaks or angle brackets")
+    _, parsed = parseaddr(address)
+    local, _, domain = parsed.rpartition("@")
+    if parsed != address or not local or "." not in domain:
+        raise ValueError(f"Invalid email address: {address!r}")
+    return parsed
+
+
+def build_message(settings: SMTPSettings, recipient_email: str, subject: str, body: str,
+                  sender_name: str = "EmailCraft AI") -> MIMEMultipart:
+    """Create the MIME message for one generated email"""
+    message = MIMEMultipart()
+    message['From'] = f"{sender_name} <{settings.sender_email}>"
+    message['To'] = recipient_email
+    message['Subject'] = subject
+    message.attach(MIMEText(body, 'plain'))
+    return message
+
+
+def send_pipelined(server: smtplib.SMTP, from_addr: str, to_addrs: list[str], message: bytes) -> dict[str, tuple[int, bytes]]:
+    """
+    Send one message, pipelining MAIL FROM and every RCPT TO in one write.
+
+    Falls back to plain sendmail when the server does not advertise
+    PIPELINING (RFC 2920). Returns refused recipients like sendmail does.
+    """
+    if not server.does_esmtp or not server.has_extn("pipelining"):
+        return server.sendmail(from_addr, to_addrs, message)
+
+    commands = [f"MAIL FROM:{smtplib.quoteaddr(from_addr)}"] + [f"RCPT TO:{smtplib.quoteaddr(addr)}" for addr in to_addrs]
+    server.send("".join(f"{command}\r\n" for command in commands))
+    mail_reply = server.getreply()
+    rcpt_replies = [server.getreply() for _ in to_addrs]
+
+    if mail_reply[0] != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(mail_reply[0], mail_reply[1], from_addr)
+
+    refused = {
+        addr: reply for addr, reply in zip(to_addrs, rcpt_replies)
+        if reply[0] not in (250, 251)
+    }
+    if len(refused) == len(to_addrs):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, response = server.data(message)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPDataError(code, response)
+    return refused
+
+
+class SMTPPool:
+    """
+    Authenticated SMTP connections kept per (host, port, user).
+
+    Idle connections are checked with NOOP before reuse and replaced when
+    the check fails or they have been idle past `idle_timeout`. At most
+    `max_per_host` connections are open to one server at a time.
+    """
+
+    def __init__(self, max_per_host: int = 4, idle_timeout: float = 60.0, timeout: float = 30.0):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle: dict[PoolKey, list[tuple[float, smtplib.SMTP]]] = {}
+        self._slots: dict[PoolKey, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, key: PoolKey) -> threading.BoundedSemaphore:
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.max_per_host)
+            return self._slots[key]
+
+    def _connect(self, settings: SMTPSettings) -> smtplib.SMTP:
+        server = smtplib.SMTP(settings.host, settings.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if settings.starttls:
+                server.starttls()  # Enable TLS encryption
+                server.ehlo()
+            server.login(settings.username, settings.password)
+        except Exception:
+            _close(server)
+            raise
+        logger.info(f"SMTP connection opened - {settings.host}:{settings.port}")
+        return server
+
+    def _checkout(self, settings: SMTPSettings) -> smtplib.SMTP:
+        """Reuse a healthy idle connection or open a new one"""
+        while True:
+            with self._lock:
+                idle = self._idle.get(settings.key)
+                entry = idle.pop() if idle else None
+            if entry is None:
+                return self._connect(settings)
+
+            idle_since, server = entry
+            if time.monotonic() - idle_since > self.idle_timeout:
+                _close(server)
+                continue
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            _close(server)
+
+    def _checkin(self, key: PoolKey, server: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.setdefault(key, []).append((time.monotonic(), server))
+
+    @contextmanager
+    def connection(self, settings: SMTPSettings) -> Iterator[smtplib.SMTP]:
+        """Borrow an authenticated connection for the duration of the block"""
+        slot = self._slot(settings.key)
+        if not slot.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No SMTP connection available for {settings.host}:{settings.port}")
+        server: Optional[smtplib.SMTP] = None
+        try:
+            server = self._checkout(settings)
+            yield server
+        except _MESSAGE_ERRORS:
+            raise
+        except Exception:
+            if server is not None:
+                _close(server)
+                server = None
+            raise
+        finally:
+            if server is not None:
+                self._checkin(settings.key, server)
+            slot.release()
+
+    def send_messages(self, settings: SMTPSettings, messages: list[MIMEMultipart]) -> list[dict[str, Any]]:
+        """
+        Deliver messages over one pooled session.
+
+        A dropped connection is reopened once and delivery continues with
+        the next unsent message. Returns one result per message.
+        """
+        results: list[dict[str, Any]] = []
+        pending = list(messages)
+        reconnected = False
+        while pending:
+            try:
+                with self.connection(settings) as server:
+                    while pending:
+                        message = pending[0]
+                        recipient = message['To']
+                        try:
+                            send_pipelined(
+                                server,
+                                parseaddr(message['From'])[1] or settings.sender_email,
+                                [recipient],
+                                message.as_bytes()
+                            )
+                            results.append({"recipient": recipient, "success": True})
+                        except _MESSAGE_ERRORS as e:
+                            results.append({
+                                "recipient": recipient,
+                                "success": False,
+                                "error": str(e),
+                                "code": smtp_error_code(e)
+                            })
+                        pending.pop(0)
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                if reconnected:
+                    results.extend(
+                        {"recipient": m['To'], "success": False, "error": str(e)} for m in pending
+                    )
+                    break
+                logger.warning(f"SMTP connection lost, reconnecting: {str(e)}")
+                reconnected = True
+        return results
+
+    def close(self) -> None:
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for entries in idle.values():
+            for _, server in entries:
+                _close(server)
+
+
+def send_batch(pool: SMTPPool, settings: SMTPSettings, emails: list[dict[str, Any]],
+               sender_name: str = "EmailCraft AI") -> list[dict[str, Any]]:
+    """
+    Deliver a batch of {recipient_email, subject, body[, sender_name]} dicts
+    over one pooled session. Invalid entries are reported, not sent; the
+    results keep the order of the input.
+    """
+    messages = []
+    results: list[Optional[dict[str, Any]]] = [None] * len(emails)
+    positions = []
+    for i, email in enumerate(emails):
+        if not email.get('recipient_email'):
+            results[i] = {"recipient": None, "success": False, "error": "Recipient email is required"}
+            continue
+        try:
+            recipient = validate_address(str(email['recipient_email']))
+        except ValueError as e:
+            results[i] = {"recipient": email['recipient_email'], "success": False, "error": str(e)}
+            continue
+        if not email.get('subject') or not email.get('body'):
+            results[i] = {"recipient": recipient, "success": False, "error": "Email subject and body are required"}
+        else:
+            messages.append(build_message(
+                settings,
+                recipient,
+                email['subject'],
+                email['body'],
+                email.get('sender_name') or sender_name
+            ))
+            positions.append(i)
+
+    for i, result in zip(positions, pool.send_messages(settings, messages)):
+        results[i] = result
+    return results
+
+
+def smtp_error_code(error: Exception) -> Optional[int]:
+    """SMTP reply code carried by a delivery error, if any"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return max(codes) if codes else None
+    return getattr(error, "smtp_code", None)
+
+
+def _close(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+
+# Global SMTP pool, shared by every request in this process
+_smtp_pool: Optional[SMTPPool] = None
+_smtp_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPPool:
+    """Return the process-wide SMTP pool, creating it on first use"""
+    global _smtp_pool
+    if _smtp_pool is None:
+        with _smtp_pool_lock:
+            if _smtp_pool is None:
+                _smtp_pool = SMTPPool(
+                    max_per_host=int(os.getenv("SMTP_MAX_CONNECTIONS", "4")),
+                    idle_timeout=float(os.getenv("SMTP_IDLE_TIMEOUT", "60")),
+                )
+    return _smtp_pool
@@ -0,0 +1,158 @@
+"""
+EmailCraft AI - Structured output
+Typed email results through the model's output tool, repaired locally instead of retried
+"""
+
+import re
+from functools import lru_cache
+from typing import Any
+
+from pydantic import BaseModel, Field, model_validator
+from pydantic.json_schema import SkipJsonSchema
+
+from postprocess import parse_email, split_body, strip_fences
+
+OUTPUT_TOOL_NAME = "final_email"
+
+# Appended to the user prompt in structured mode
+STRUCTURED_INSTRUCTION = (
+    f"Return the email with the {OUTPUT_TOOL_NAME} tool, plus two or three specific suggestions "
+    "for improving or personalizing it before sending."
+)
+
+# Extra output room for the suggestions and the tool call's JSON keys
+STRUCTURED_OUTPUT_TOKENS = 80
+
+MAX_SUGGESTIONS = 5
+
+# Field names models commonly use instead of the schema's
+_ALIASES = {
+    "subject_line": "subject", "title": "subject",
+    "salutation": "greeting",
+    "content": "body", "text": "body", "message": "body",
+    "sign_off": "closing", "signoff": "closing", "signature": "closing",
+    "tips": "suggestions",
+}
+
+_SUBJECT_PREFIX = re.compile(r"\A\s*(?:\*\*|__)?subject(?:\*\*|__)?\s*:\s*", re.IGNORECASE)
+_BULLET = re.compile(r"\A\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "\n".join(_text(item) for item in value)
+    return str(value).strip()
+
+
+def _suggestions(value: Any) -> list[str]:
+    items = value.splitlines() if isinstance(value, str) else value if isinstance(value, list) else []
+    cleaned = (_BULLET.sub("", _text(item)).strip() for item in items)
+    return [item for item in cleaned if item][:MAX_SUGGESTIONS]
+
+
+# The class docstring and field descriptions are sent to the model as the
+# tool's schema on every call, so they are written for the model and kept short.
+class StructuredEmail(BaseModel):
+    """A ready-to-send email."""
+    subject: str = Field(description="Subject line, without a 'Subject:' prefix")
+    greeting: str = Field(description="Salutation line, e.g. 'Dear Ms. Lee,'")
+    body: str = Field(description="The main paragraphs, without the greeting or sign-off")
+    closing: str = Field(description="Sign-off line, e.g. 'Best regards,'")
+    suggestions: list[str] = Field(description="Two or three short, specific tips for improving this email")
+    repairs: SkipJsonSchema[list[str]] = Field(default_factory=list, exclude=True)
+
+    @model_validator(mode="before")
+    @classmethod
+    def repair(cls, data: Any) -> Any:
+        """
+        Fix the usual near misses locally (renamed or missing fields, a
+        "Subject:" prefix, the whole email in `body`, suggestions as one
+        string), so validation practically never fails and never costs a
+        retry round trip. `repairs` lists what was fixed.
+        """
+        if isinstance(data, str):
+            return cls.fields_from_text(data)
+        if not isinstance(data, dict):
+            return data
+
+        repairs = []
+        fields: dict[str, Any] = {}
+        for key, value in data.items():
+            name = _ALIASES.get(str(key).lower(), str(key).lower())
+            if name != key:
+                repairs.append(f"renamed {key}")
+            if name not in fields or not fields[name]:
+                fields[name] = value
+
+        for name in ("subject", "greeting", "body", "closing"):
+            value = fields.get(name)
+            if value is None:
+                repairs.append(f"missing {name}")
+            elif not isinstance(value, str):
+                repairs.append(f"{name} type")
+            fields[name] = _text(value)
+
+        subject = fields["subject"]
+        if _SUBJECT_PREFIX.match(subject):
+            subject = _SUBJECT_PREFIX.sub("", subject).strip().strip("*").strip()
+            repairs.append("subject prefix")
+
+        # The whole email (subject line, greeting and sign-off) written into `body`
+        body = strip_fences(fields["body"]).strip()
+        parsed = parse_email(body)
+        if parsed.subject:
+            body = parsed.body
+            subject = subject or parsed.subject
+            repairs.append("subject in body")
+        greeting, content, closing = split_body(body)
+        if greeting or closing:
+            body = content
+            if greeting:
+                fields["greeting"] = fields["greeting"] or greeting
+                repairs.append("greeting in body")
+            if closing:
+                fields["closing"] = fields["closing"] or closing
+                repairs.append("closing in body")
+
+        suggestions = fields.get("suggestions")
+        if suggestions is not None and not (isinstance(suggestions, list) and all(isinstance(s, str) for s in suggestions)):
+            repairs.append("suggestions type")
+
+        return {
+            "subject": subject,
+            "greeting": fields["greeting"],
+            "body": body,
+            "closing": fields["closing"],
+            "suggestions": _suggestions(suggestions),
+            "repairs": repairs,
+        }
+
+    @classmethod
+    def fields_from_text(cls, text: str) -> dict[str, Any]:
+        """Fields for a plain-text reply (a model that answered without the tool)"""
+        parsed = parse_email(text)
+        return {
+            "subject": parsed.subject or "",
+            "greeting": parsed.greeting or "",
+            "body": parsed.content,
+            "closing": parsed.closing or "",
+            "suggestions": [],
+            "repairs": ["text output"],
+        }
+
+    def email_body(self) -> str:
+        """Greeting, content and sign-off as one body"""
+        return "\n\n".join(part for part in (self.greeting, self.body, self.closing) if part)
+
+
+@lru_cache(maxsize=1)
+def output_type():
+    """
+    The agent's output spec in structured mode: the email tool, or plain
+    text from models that answer without calling it (parsed locally
+    instead of asking again). pydantic-ai is imported on first use.
+    """
+    from pydantic_ai import ToolOutput
+    return [ToolOutput(StructuredEmail, name=OUTPUT_TOOL_NAME), str]
@@ -0,0 +1,411 @@
+"""
+EmailCraft AI - Template library
+Local intent classification and parameterized drafts for the most common requests
+"""
+
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_WORDS = re.compile(r"[a-z0-9']+")
+
+# Words that carry no intent of their own; everything else in the context
+# must be explained by the intent's keywords or a slot value
+STOPWORDS = frozenset("""
+a an the to for of on in at by with and or my me i i'm we our us you your them their him her his she he it
+is are was be been this that these those about from please just some any up as so will would can could
+email write draft send ask tell let know want need get quick short note message
+team everyone colleague colleagues boss manager recruiter client due because since regarding
+""".split())
+
+
+@dataclass(frozen=True)
+class Intent:
+    """
+    One email intent: keyword features with weights (a hand-tuned linear
+    model), a bias, and slot patterns that pull parameters out of the context.
+    """
+    name: str
+    features: dict[str, float]
+    bias: float = -1.0
+    slots: dict[str, re.Pattern] = field(default_factory=dict)
+
+
+_WHEN = (r"(?:next|this|last)\s+(?:week|month|monday|tuesday|wednesday|thursday|friday)|tomorrow|today|yesterday"
+         r"|(?:on\s+)?(?:monday|tuesday|wednesday|thursday|friday)(?:\s+(?:morning|afternoon))?"
+         r"|\d+\s+(?:days|weeks)\s+ago")
+
+# Free-text slots end at a clause boundary, so a second request joined on
+# with "and" or a comma is left for the coverage check instead of being
+# swallowed into the slot
+_CONJUNCTIONS = r"\s+(?:and|but|or|then|so|while|also)\b"
+_CLAUSE_END = rf"(?=\s*[.,;!?]|{_CONJUNCTIONS}|\s*$)"
+
+# Content a template would silently drop or contradict: a negation anywhere
+# ("thank you for not hiring me"), or a reason or condition clause that no
+# slot consumed ("... because my mother is sick")
+_NEGATION = re.compile(r"\b(?:not|never|no|nothing|without|cannot)\b|n't\b", re.I)
+_QUALIFIER = re.compile(r"\b(?:because|since|so\s+that|unless|although|though|except|as\s+long\s+as)\b", re.I)
+
+INTENTS = (
+    Intent(
+        "job_application_followup",
+        {"follow up": 1.5, "following up": 1.5, "follow-up": 1.5, "followup": 1.5, "application": 2.0,
+         "applied": 2.0, "job": 1.0, "role": 0.8, "position": 0.8, "opening": 0.5, "status": 0.5,
+         "submitted": 0.5, "interview": 0.3, "hiring": 0.5, "candidacy": 1.0},
+        bias=-2.5,
+        slots={
+            "position": re.compile(r"\b(?:for|as)\s+(?:the|a|an)\s+([\w/&+ -]{2,60}?)\s+(?:role|position|job|opening)\b", re.I),
+            "company": re.compile(r"\bat\s+((?!I\b)[A-Z][\w&.-]*(?:\s+(?!I\b)[A-Z][\w&.-]*){0,3})"),
+            "when": re.compile(rf"\b({_WHEN})\b", re.I),
+        },
+    ),
+    Intent(
+        "meeting_request",
+        {"meeting": 2.0, "meet": 1.5, "call": 1.0, "schedule": 1.2, "set up": 0.8, "catch up": 1.0,
+         "discuss": 0.8, "sync": 1.0, "availability": 0.5, "request": 0.3, "arrange": 0.8, "book": 0.5,
+         "go over": 0.5, "review": 0.3, "chat": 0.8},
+        bias=-1.5,
+        slots={
+            "topic": re.compile(r"\b(?:to\s+discuss|discuss|about|regarding|to\s+go\s+over|to\s+review)\s+"
+                                rf"(.{{3,80}}?)(?=\s+(?:{_WHEN})\b|{_CONJUNCTIONS}|[.,;]|$)", re.I),
+            "when": re.compile(rf"\b({_WHEN})\b", re.I),
+        },
+    ),
+    Intent(
+        "thank_you",
+        {"thank": 2.5, "thanks": 2.5, "thank you": 1.0, "grateful": 1.5, "appreciate": 1.5,
+         "appreciation": 1.5, "gratitude": 1.5, "help": 0.3, "support": 0.3},
+        bias=-1.5,
+        slots={
+            "reason": re.compile(rf"\bfor\s+(.{{3,100}}?){_CLAUSE_END}", re.I),
+        },
+    ),
+    Intent(
+        "leave_request",
+        {"leave": 2.5, "time off": 2.5, "day off": 2.5, "days off": 2.5, "vacation": 2.0, "holiday": 1.5,
+         "pto": 2.5, "absence": 1.5, "sick": 1.0, "request": 0.5, "days": 0.3, "manager": 0.3},
+        bias=-2.0,
+        slots={
+            "duration": re.compile(r"\b((?:\d+|one|two|three|four|five|a|half\s+a)\s+(?:days?|weeks?))\b", re.I),
+            "when": re.compile(rf"\b({_WHEN}|(?:from|on|between)\s+[A-Z][a-z]+\s+\d{{1,2}}"
+                               r"(?:\s*(?:-|to|and)\s*(?:[A-Z][a-z]+\s+)?\d{1,2})?)\b"),
+            "reason": re.compile(rf"\b(?:for|due\s+to|because\s+of)\s+((?:a|an|my|the)\s+[^.,;]{{3,60}}?){_CLAUSE_END}", re.I),
+        },
+    ),
+)
+
+# Context phrasing rewritten for the sender's own voice ("thank them for their help")
+_PRONOUNS = {"their": "your", "his": "your", "her": "your", "them": "you", "him": "you", "they": "you"}
+_PRONOUN = re.compile(r"\b(" + "|".join(_PRONOUNS) + r")\b", re.I)
+
+
+@dataclass
+class Classification:
+    intent: Optional[str]
+    confidence: float
+    slots: dict[str, str]
+
+
+class IntentClassifier:
+    """
+    Linear keyword model with a softmax over the intents plus "other".
+
+    The winning probability is scaled by coverage, the share of the
+    context's content words explained by the intent's keywords or its
+    slot values, so a request that adds anything a template cannot say
+    ("... and mention I have another offer") falls back to the model.
+    Slot values stop at clause boundaries, so they cannot explain a
+    second request joined on to the first, and a negation or a reason
+    clause no slot consumed leaves nothing covered.
+    """
+
+    def __init__(self, intents: tuple[Intent, ...] = INTENTS, sharpness: float = 2.0):
+        self.intents = intents
+        self.sharpness = sharpness
+
+    def classify(self, context: str) -> Classification:
+        text = " " + " ".join(_WORDS.findall(context.lower())) + " "
+        scores = []
+        for intent in self.intents:
+            score = intent.bias
+            for feature, weight in intent.features.items():
+                if f" {feature} " in text:
+                    score += weight
+            scores.append(score)
+
+        best = max(range(len(scores)), key=scores.__getitem__)
+        # "Other" scores 0, so an intent needs positive evidence over its bias
+        total = 1.0 + sum(math.exp(self.sharpness * score) for score in scores)
+        probability = math.exp(self.sharpness * scores[best]) / total
+        intent = self.intents[best]
+
+        slots = {}
+        explained = set()
+        spans = []
+        for name, pattern in intent.slots.items():
+            match = pattern.search(context)
+            if match:
+                slots[name] = match.group(1).strip()
+                explained.update(_WORDS.findall(slots[name].lower()))
+                spans.append(match.span())
+        for feature in intent.features:
+            if f" {feature} " in text:
+                explained.update(feature.split())
+
+        content = [word for word in text.split() if word not in STOPWORDS]
+        coverage = sum(1 for word in content if word in explained) / len(content) if content else 1.0
+        if _NEGATION.search(context) or any(
+            not any(start <= marker.start() < end for start, end in spans) for marker in _QUALIFIER.finditer(context)
+        ):
+            coverage = 0.0
+        return Classification(intent.name, round(probability * coverage, 4), slots)
+
+
+# Templates: (subject, body) per intent and tone. Placeholders are filled
+# from slots with fallbacks, so every template renders with any subset.
+TEMPLATES: dict[str, dict[str, tuple[str, str]]] = {
+    "job_application_followup": {
+        "professional": (
+            "Following up on my application{for_position}",
+            "{greeting}\n\nI hope you are well. I am writing to follow up on my application for {the_position}{at_company}, "
+            "which I submitted {when}. I remain very interested in the opportunity and would welcome the chance "
+            "to discuss how my experience could support your team.{attachments}\n\n"
+            "Please let me know if you need any further information from me. Thank you for your time and consideration.\n\n"
+            "Best regards,",
+        ),
+        "formal": (
+            "Follow-up regarding my application{for_position}",
+            "{greeting}\n\nI am writing to respectfully follow up on my application for {the_position}{at_company}, "
+            "which I submitted {when}. I remain sincerely interested in the position and would be grateful for any "
+            "update you are able to share regarding the status of my application.{attachments}\n\n"
+            "Thank you for your time and consideration. I look forward to hearing from you.\n\n"
+            "Yours sincerely,",
+        ),
+        "friendly": (
+            "Checking in on my application{for_position}",
+            "{greeting}\n\nI hope your week is going well! I wanted to check in on my application for {the_position}"
+            "{at_company}, which I sent {when}. I'm really excited about the role and would love to hear about "
+            "any next steps.{attachments}\n\n"
+            "Thanks so much for your time, and please let me know if there's anything else I can share.\n\n"
+            "Warm regards,",
+        ),
+        "casual": (
+            "Quick check-in on my application",
+            "{greeting}\n\nJust checking in on my application for {the_position}{at_company} from {when_short}. "
+            "Still really keen on it, so let me know if there's any news or anything else you need from me."
+            "{attachments}\n\nThanks!\n\nCheers,",
+        ),
+    },
+    "meeting_request": {
+        "professional": (
+            "Meeting request{about_topic}",
+            "{greeting}\n\nI would like to schedule a meeting {to_discuss}. Would you be available {when}? "
+            "I am happy to work around your schedule, so please let me know a time that suits you.{attachments}\n\n"
+            "Thank you, and I look forward to speaking with you.\n\n"
+            "Best regards,",
+        ),
+        "formal": (
+            "Request for a meeting{about_topic}",
+            "{greeting}\n\nI am writing to request a meeting {to_discuss}. If convenient, I would propose meeting "
+            "{when}; however, I would be glad to accommodate a time that better suits your schedule.{attachments}\n\n"
+            "Thank you for your consideration. I look forward to your reply.\n\n"
+            "Yours sincerely,",
+        ),
+        "friendly": (
+            "Could we find time to meet{about_topic}?",
+            "{greeting}\n\nI hope you're doing well! I'd love to set up some time {to_discuss}. Would {when} work "
+            "for you? Happy to fit in with whatever is easiest on your end.{attachments}\n\n"
+            "Looking forward to catching up!\n\n"
+            "Warm regards,",
+        ),
+        "casual": (
+            "Quick meeting{about_topic}?",
+            "{greeting}\n\nCould we grab some time {to_discuss}? {when_capitalized} works for me, but I'm flexible."
+            "{attachments}\n\nLet me know!\n\nCheers,",
+        ),
+    },
+    "thank_you": {
+        "professional": (
+            "Thank you",
+            "{greeting}\n\nThank you {for_reason}. I really appreciate the time and effort you put in, "
+            "and it made a real difference.{attachments}\n\n"
+            "Thank you again.\n\n"
+            "Best regards,",
+        ),
+        "formal": (
+            "With sincere thanks",
+            "{greeting}\n\nI would like to express my sincere gratitude {for_reason}. Your time and assistance "
+            "are greatly appreciated.{attachments}\n\n"
+            "With thanks and kind regards,\n\n"
+            "Yours sincerely,",
+        ),
+        "friendly": (
+            "Thank you so much!",
+            "{greeting}\n\nI just wanted to say a big thank you {for_reason}. It really meant a lot, "
+            "and I'm so grateful.{attachments}\n\n"
+            "Thanks again!\n\n"
+            "Warm regards,",
+        ),
+        "casual": (
+            "Thanks!",
+            "{greeting}\n\nThanks so much {for_reason}, really appreciate it!{attachments}\n\nCheers,",
+        ),
+    },
+    "leave_request": {
+        "professional": (
+            "Leave request{for_when}",
+            "{greeting}\n\nI would like to request {leave} {when}{for_reason}. I will make sure my "
+            "work is up to date beforehand and arrange cover for anything urgent while I am away.{attachments}\n\n"
+            "Please let me know if this works or if you need any further details.\n\n"
+            "Best regards,",
+        ),
+        "formal": (
+            "Request for leave{for_when}",
+            "{greeting}\n\nI am writing to formally request {leave} {when}{for_reason}. I will ensure "
+            "that my responsibilities are covered and that all pending work is completed before my absence."
+            "{attachments}\n\nI would be grateful for your approval. Please let me know if any further "
+            "information is required.\n\n"
+            "Yours sincerely,",
+        ),
+        "friendly": (
+            "Time off request{for_when}",
+            "{greeting}\n\nI hope you're well! I'd like to take {time_off} {when}{for_reason}. I'll make sure "
+            "everything is wrapped up or handed over before I go.{attachments}\n\n"
+            "Let me know if that works for you. Thanks so much!\n\n"
+            "Warm regards,",
+        ),
+        "casual": (
+            "Time off{for_when}",
+            "{greeting}\n\nWould it be OK if I took {time_off} {when}{for_reason}? I'll get things squared "
+            "away before I go.{attachments}\n\nThanks!\n\nCheers,",
+        ),
+    },
+}
+
+# Greeting per tone: (with a recipient name, without one)
+GREETINGS = {
+    "professional": ("Dear {name},", "Hello,"),
+    "formal": ("Dear {name},", "Dear Sir or Madam,"),
+    "friendly": ("Hi {name},", "Hi there,"),
+    "casual": ("Hey {name},", "Hey,"),
+}
+
+# Sign-off line per tone, as used in the templates above
+SIGN_OFFS = {
+    "professional": "Best regards,",
+    "formal": "Yours sincerely,",
+    "friendly": "Warm regards,",
+    "casual": "Cheers,",
+}
+
+ATTACHMENT_SENTENCES = {
+    "job_application_followup": " I have attached my resume for your reference.",
+    "default": " I have attached the relevant documents for your reference.",
+}
+
+
+def _headline(phrase: str) -> str:
+    """'the Q3 budget' -> 'Q3 budget', for subject lines"""
+    phrase = re.sub(r"^(?:the|a|an|our|my)\s+", "", phrase, flags=re.I)
+    return phrase[:1].upper() + phrase[1:]
+
+
+def _slot_values(intent: str, tone: str, slots: dict[str, str], recipient_name: Optional[str],
+                 mention_attachments: bool) -> dict[str, str]:
+    """Phrases for every placeholder, with fallbacks for missing slots"""
+    with_name, without_name = GREETINGS.get(tone, GREETINGS["professional"])
+    recipient_name = (recipient_name or "").strip()
+    if recipient_name:
+        greeting = with_name.format(name=recipient_name)
+    elif intent == "job_application_followup" and tone in ("professional", "formal"):
+        greeting = "Dear Hiring Manager,"
+    else:
+        greeting = without_name
+
+    when = slots.get("when")
+    position = slots.get("position")
+    topic = slots.get("topic")
+    reason = slots.get("reason")
+    duration = slots.get("duration")
+    if reason and intent == "thank_you":
+        reason = _PRONOUN.sub(lambda match: _PRONOUNS[match.group(1).lower()], reason)
+
+    attachments = ""
+    if mention_attachments:
+        attachments = ATTACHMENT_SENTENCES.get(intent, ATTACHMENT_SENTENCES["default"])
+        if tone == "casual":
+            attachments = " I've attached the files too."
+
+    default_when = {"meeting_request": "sometime this week", "leave_request": "soon"}.get(intent, "recently")
+    return {
+        "greeting": greeting,
+        "attachments": attachments,
+        "when": when or default_when,
+        "when_short": when or "a little while back",
+        "when_capitalized": (when or "Any time this week")[0].upper() + (when or "Any time this week")[1:],
+        "for_when": " for " + re.sub(r"^(?:from|on|between)\s+", "", when) if when and intent == "leave_request" else "",
+        "the_position": f"the {position} position" if position else "the open position",
+        "for_position": f" for the {position} position" if position else "",
+        "at_company": f" at {slots['company']}" if slots.get("company") else "",
+        "to_discuss": f"to discuss {topic}" if topic else "to catch up",
+        "about_topic": f": {_headline(topic)}" if topic else "",
+        "for_reason": (f"for {reason}" if intent == "thank_you" else f" for {reason}") if reason
+        else ("for your help" if intent == "thank_you" else ""),
+        "leave": f"{duration} of leave" if duration else "leave",
+        "time_off": f"{duration} off" if duration else "some time off",
+    }
+
+
+@dataclass(frozen=True)
+class TemplateDraft:
+    subject: str
+    body: str
+    intent: str
+    confidence: float
+
+
+class TemplateLibrary:
+    """
+    LLM-free drafts for common intents.
+
+    A request takes the template path when its intent is classified with
+    at least `min_confidence` and it has no free-form additional details
+    (which only the model can work in). Rendering is a dict lookup and a
+    few str.format calls.
+    """
+
+    def __init__(self, classifier: Optional[IntentClassifier] = None, min_confidence: float = 0.75,
+                 templates: dict[str, dict[str, tuple[str, str]]] = TEMPLATES):
+        self.classifier = classifier or IntentClassifier()
+        self.min_confidence = min_confidence
+        self.templates = templates
+
+    def draft(self, tone: str, context: str, recipient_name: Optional[str] = None,
+              additional_details: Optional[str] = None, mention_attachments: bool = False) -> tuple[Optional[TemplateDraft], Classification]:
+        """Render a template draft, or None when the request needs the model; also returns the classification"""
+        classification = self.classifier.classify(context)
+        template = self.templates.get(classification.intent, {}).get(tone)
+        if template is None or additional_details or classification.confidence < self.min_confidence:
+            return None, classification
+
+        values = _slot_values(classification.intent, tone, classification.slots, recipient_name, mention_attachments)
+        subject, body = template
+        return TemplateDraft(
+            subject.format_map(values),
+            body.format_map(values),
+            classification.intent,
+            classification.confidence,
+        ), classification
+
+
+def create_template_library() -> Optional[TemplateLibrary]:
+    """Build the template library from environment settings (None when the fast path is off)"""
+    if os.getenv("TEMPLATE_FAST_PATH", "true").lower() in ("0", "false", "no"):
+        return None
+    return TemplateLibrary(min_confidence=float(os.getenv("TEMPLATE_MIN_CONFIDENCE", "0.75")))
@@ -0,0 +1,133 @@
+"""
+Benchmark: line-splitting subject parsing and branchy signatures vs the shared post-processor
+
+Usage:
+    python benchmarks/bench_postprocess.py --emails 20000 --large-kb 256
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from postprocess import StreamingEmailParser, append_signature, parse_email
+
+PARAGRAPH = ("Thank you for taking the time to meet with us last week. We appreciated the chance "
+             "to walk through the proposal and would like to follow up on the next steps.")
+
+SIGNATURES = [
+    {"name": f"Sender {i}", "title": "Engineer" if i % 2 else "", "department": "Platform",
+     "company": "Example Corp", "phone": "" if i % 3 else "+1 555 0100", "email": f"sender{i}@example.com",
+     "linkedin": "linkedin.com/in/example" if i % 4 == 0 else ""}
+    for i in range(16)
+]
+
+
+def make_email(paragraphs: int) -> str:
+    body = "\n\n".join(PARAGRAPH for _ in range(paragraphs))
+    return f"Subject: Following up on our meeting\n\nDear Alex,\n\n{body}\n\nBest regards,\nSam"
+
+
+def legacy_parse(email_text: str) -> tuple[str, str]:
+    """The original per-request parsing in main.py and api/generate-email.py"""
+    lines = email_text.strip().split('\n')
+    subject_line = "Re: ..."
+    for i, line in enumerate(lines):
+        if line.lower().startswith('subject:'):
+            subject_line = line.split(':', 1)[1].strip()
+            email_text = '\n'.join(lines[:i] + lines[i+1:])
+            break
+    return subject_line, email_text.strip()
+
+
+def legacy_signature(email_body: str, sender_signature: dict) -> str:
+    """The original signature branches in api/generate-email.py"""
+    email_body = email_body.strip()
+    if sender_signature and any(sender_signature.values()):
+        signature_parts = []
+        if sender_signature.get('name'):
+            signature_parts.append(sender_signature['name'])
+        title_line_parts = []
+        if sender_signature.get('title'):
+            title_line_parts.append(sender_signature['title'])
+        if sender_signature.get('department'):
+            title_line_parts.append(sender_signature['department'])
+        if title_line_parts:
+            signature_parts.append(' | '.join(title_line_parts))
+        if sender_signature.get('company'):
+            signature_parts.append(sender_signature['company'])
+        contact_parts = []
+        if sender_signature.get('phone'):
+            contact_parts.append(sender_signature['phone'])
+        if sender_signature.get('email'):
+            contact_parts.append(sender_signature['email'])
+        if contact_parts:
+            signature_parts.append(' | '.join(contact_parts))
+        if sender_signature.get('linkedin'):
+            signature_parts.append(sender_signature['linkedin'])
+        if signature_parts:
+            email_body += '\n\n' + '\n'.join(signature_parts)
+    return email_body
+
+
+def timed(label: str, count: int, fn) -> float:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<10} {elapsed * 1000:9.1f} ms | {count / elapsed:12,.0f} ops/s")
+    return elapsed
+
+
+def stream(text: str, chunk_size: int) -> str:
+    parser = StreamingEmailParser()
+    out = []
+    for i in range(0, len(text), chunk_size):
+        out.append(parser.feed(text[i:i + chunk_size])[1])
+    out.append(parser.flush())
+    return "".join(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--emails", type=int, default=20000, help="Typical emails in the batch workload")
+    parser.add_argument("--large-kb", type=int, default=256, help="Size of the large-body case")
+    parser.add_argument("--large-runs", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=4, help="Characters per streamed chunk")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    batch = [make_email(rng.randint(2, 6)) for _ in range(args.emails)]
+    large = make_email(args.large_kb * 1024 // len(PARAGRAPH))
+    signatures = [SIGNATURES[rng.randrange(len(SIGNATURES))] for _ in range(args.emails)]
+
+    # Both paths must agree on normal emails before their speed is compared
+    for text, signature in zip(batch[:200], signatures):
+        subject, body = legacy_parse(text)
+        parsed = parse_email(text)
+        assert (parsed.subject, parsed.body) == (subject, body)
+        assert append_signature(body, signature) == legacy_signature(body, signature)
+        assert stream(text, args.chunk_size) == body
+
+    print(f"batch parse ({args.emails} emails)")
+    timed("legacy", args.emails, lambda: [legacy_parse(text) for text in batch])
+    timed("shared", args.emails, lambda: [parse_email(text) for text in batch])
+
+    print(f"large body ({len(large) // 1024} KB x {args.large_runs})")
+    timed("legacy", args.large_runs, lambda: [legacy_parse(large) for _ in range(args.large_runs)])
+    timed("shared", args.large_runs, lambda: [parse_email(large) for _ in range(args.large_runs)])
+
+    bodies = [legacy_parse(text)[1] for text in batch]
+    print(f"signatures ({args.emails} emails, {len(SIGNATURES)} distinct signatures)")
+    timed("legacy", args.emails, lambda: [legacy_signature(b, s) for b, s in zip(bodies, signatures)])
+    timed("shared", args.emails, lambda: [append_signature(b, s) for b, s in zip(bodies, signatures)])
+
+    chars = sum(len(text) for text in batch[:1000])
+    print(f"streaming (1000 emails, {args.chunk_size}-char chunks)")
+    timed("shared", chars, lambda: [stream(text, args.chunk_size) for text in batch[:1000]])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: cold (per-request client and event loop) vs warm (the agent's pooled provider client)
+
+Usage:
+    python benchmarks/bench_provider_client.py --requests 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openrouter import FakeOpenRouter
+from provider import provider_http_client
+
+PAYLOAD = {
+    "model": "fake-model",
+    "messages": [{"role": "user", "content": "Write a short email"}]
+}
+
+
+def cold_request(base_url: str) -> None:
+    """The original handler behaviour: new loop and new AsyncClient per call"""
+    async def call():
+        async with httpx.AsyncClient(timeout=90.0) as client:
+            response = await client.post(f"{base_url}/chat/completions", json=PAYLOAD)
+            response.raise_for_status()
+            return response.json()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(call())
+    loop.close()
+
+
+def measure(fn, count: int) -> list[float]:
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def measure_warm(base_url: str, count: int) -> list[float]:
+    """Sequential calls through one pooled client on one loop, as the app makes them"""
+    samples = []
+    async with provider_http_client() as client:
+        for _ in range(count):
+            start = time.perf_counter()
+            response = await client.post(f"{base_url}/chat/completions", json=PAYLOAD)
+            response.raise_for_status()
+            response.json()
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float]) -> None:
+    ordered = sorted(samples)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{label:<6} mean {statistics.mean(samples):7.2f} ms | p50 {statistics.median(samples):7.2f} ms | p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake upstream latency in seconds")
+    args = parser.parse_args()
+
+    with FakeOpenRouter(latency=args.latency) as fake:
+        cold = measure(lambda: cold_request(fake.base_url), args.requests)
+        warm = asyncio.run(measure_warm(fake.base_url, args.requests))
+
+    print(f"{args.requests} sequential requests against {fake.base_url}")
+    report("cold", cold)
+    report("warm", warm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: rate limit middleware overhead per request, by backend, and bucket memory per client
+
+Drives the ASGI middleware directly around a no-op app, so the numbers are
+the limiter's own cost at rates far above what the API itself can serve.
+
+Usage:
+    python benchmarks/bench_rate_limit.py --requests 200000 --clients 10000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from ratelimit import Budget, MemoryBuckets, RateLimiter, RateLimitMiddleware, SQLiteBuckets
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def make_scopes(count: int, clients: int, with_key: bool) -> list[dict]:
+    scopes = []
+    for i in range(count):
+        client = i % clients
+        headers = [(b"content-type", b"application/json"), (b"user-agent", b"bench")]
+        if with_key:
+            headers.append((b"x-api-key", f"key-{client}".encode()))
+        scopes.append({
+            "type": "http", "method": "POST", "path": "/api/generate-email", "headers": headers,
+            "client": (f"10.{client >> 16 & 255}.{client >> 8 & 255}.{client & 255}", 40000),
+        })
+    return scopes
+
+
+async def drive(app, scopes: list[dict]) -> tuple[float, int]:
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    start = time.perf_counter()
+    for scope in scopes:
+        await app(scope, receive, send)
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(1 for status in statuses if status == 429)
+
+
+def report(label: str, elapsed: float, count: int, limited: int, baseline: float = 0.0) -> None:
+    per_request = elapsed / count * 1e6
+    overhead = f"+{per_request - baseline:6.2f} us" if baseline else " " * 10
+    print(f"  {label:<36} {per_request:7.2f} us/req {overhead} | {count / elapsed:>10,.0f} req/s | {limited:>7} limited")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=10000, help="Distinct client IPs in the traffic")
+    parser.add_argument("--per-minute", type=float, default=30.0)
+    parser.add_argument("--burst", type=float, default=10.0)
+    parser.add_argument("--sqlite-requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    budget = Budget("generate", args.per_minute / 60.0, args.burst)
+    scopes = make_scopes(args.requests, args.clients, with_key=False)
+    keyed = make_scopes(args.requests, args.clients, with_key=True)
+
+    async def run():
+        print(f"overhead ({args.requests} requests over {args.clients} clients, "
+              f"{args.per_minute:g}/min burst {args.burst:g})")
+        elapsed, limited = await drive(RateLimitMiddleware(ok_app, None), scopes)
+        baseline = elapsed / args.requests * 1e6
+        report("disabled", elapsed, args.requests, limited)
+
+        limiter = RateLimiter({"generate": budget}, MemoryBuckets())
+        elapsed, limited = await drive(RateLimitMiddleware(ok_app, limiter), scopes)
+        report("memory, ip", elapsed, args.requests, limited, baseline)
+
+        limiter = RateLimiter({"generate": budget}, MemoryBuckets())
+        elapsed, limited = await drive(RateLimitMiddleware(ok_app, limiter), keyed)
+        report("memory, ip + api key", elapsed, args.requests, limited, baseline)
+
+        flood = make_scopes(args.requests, args.requests, with_key=False)
+        limiter = RateLimiter({"generate": budget}, MemoryBuckets(max_clients=args.clients))
+        elapsed, limited = await drive(RateLimitMiddleware(ok_app, limiter), flood)
+        report(f"memory, all distinct (cap {args.clients})", elapsed, args.requests, limited, baseline)
+        print(f"    buckets held {len(limiter.backend)}, evicted {limiter.backend.evictions}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            count = min(args.sqlite_requests, args.requests)
+            limiter = RateLimiter({"generate": budget}, SQLiteBuckets(os.path.join(tmp, "rate.db")))
+            elapsed, limited = await drive(RateLimitMiddleware(ok_app, limiter), scopes[:count])
+            report("sqlite, ip", elapsed, count, limited, baseline)
+
+    asyncio.run(run())
+
+    print("memory per client")
+    buckets = MemoryBuckets(max_clients=args.clients * 2)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    now = time.monotonic()
+    for client in range(args.clients):
+        buckets.take_now(f"generate:ip:10.0.{client >> 8 & 255}.{client & 255}:{client}", budget, 1.0, now)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"  {len(buckets)} buckets, {used / 1024:.0f} KiB, {used / max(1, len(buckets)):.0f} bytes/client")
+
+    idle = now + args.burst / budget.rate + 1
+    buckets.take_now("generate:ip:late", budget, 1.0, idle)
+    print(f"  after one refill window idle: {len(buckets)} bucket(s) left, {buckets.evictions} evicted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: interactive latency while a batch campaign runs, FIFO admission vs priority + fair queuing
+
+Drives the provider gateway directly with simulated upstream calls, so
+only admission order is measured.
+
+Usage:
+    python benchmarks/bench_scheduler.py --concurrency 8 --service-ms 200 --duration 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from gateway import GatewayOverloaded, ProviderGateway
+from scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, RequestClass, scheduling
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+async def run(args, campaign: bool, fair: bool) -> dict:
+    gateway = ProviderGateway(max_concurrency=args.concurrency, max_queue=100_000,
+                              max_wait=args.max_wait, batch_max_wait=3600, batch_share=args.batch_share)
+    rng = random.Random(7)
+    interactive: list[float] = []
+    rejected = 0
+    batch_done = 0
+
+    async def upstream():
+        await asyncio.sleep(rng.lognormvariate(0, 0.3) * args.service_ms / 1000)
+
+    async def call(request_class: RequestClass, latencies: list[float]):
+        nonlocal rejected
+        start = time.perf_counter()
+        with scheduling(request_class):
+            try:
+                await gateway.call(upstream)
+            except GatewayOverloaded:
+                rejected += 1
+                return False
+        latencies.append(time.perf_counter() - start)
+        return True
+
+    async def campaign_worker(stop: float):
+        nonlocal batch_done
+        # Without the scheduler everyone is one class and one tenant, i.e. arrival order
+        request_class = RequestClass("campaign", PRIORITY_BATCH) if fair else RequestClass("all", PRIORITY_INTERACTIVE)
+        while time.perf_counter() < stop:
+            if await call(request_class, []):
+                batch_done += 1
+
+    async def users(stop: float):
+        tasks = []
+        while time.perf_counter() < stop:
+            await asyncio.sleep(rng.expovariate(args.interactive_rps))
+            tenant = f"user-{rng.randrange(50)}" if fair else "all"
+            tasks.append(asyncio.create_task(call(RequestClass(tenant, PRIORITY_INTERACTIVE), interactive)))
+        await asyncio.gather(*tasks)
+
+    stop = time.perf_counter() + args.duration
+    workers = [campaign_worker(stop) for _ in range(args.campaign_concurrency)] if campaign else []
+    await asyncio.gather(users(stop), *workers)
+
+    interactive.sort()
+    return {
+        "p50": percentile(interactive, 50) * 1000,
+        "p95": percentile(interactive, 95) * 1000,
+        "p99": percentile(interactive, 99) * 1000,
+        "interactive": len(interactive),
+        "rejected": rejected,
+        "batch_rps": batch_done / args.duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=8, help="Upstream concurrency limit")
+    parser.add_argument("--service-ms", type=float, default=200, help="Median simulated upstream latency")
+    parser.add_argument("--interactive-rps", type=float, default=10)
+    parser.add_argument("--campaign-concurrency", type=int, default=64, help="Concurrent batch callers")
+    parser.add_argument("--batch-share", type=float, default=0.5)
+    parser.add_argument("--max-wait", type=float, default=10)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<34} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'inter.':>7} {'rej.':>5} {'batch/s':>8}")
+    for label, campaign, fair in (("interactive only", False, True),
+                                  ("with campaign, FIFO", True, False),
+                                  ("with campaign, priority + WFQ", True, True)):
+        result = asyncio.run(run(args, campaign, fair))
+        print(f"{label:<34} {result['p50']:8.1f} {result['p95']:8.1f} {result['p99']:8.1f} "
+              f"{result['interactive']:7d} {result['rejected']:5d} {result['batch_rps']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: semantic cache embedding and lookup cost, and hit quality on reworded requests
+
+Usage:
+    python benchmarks/bench_semantic_cache.py --entries 2048 --lookups 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from semantic_cache import SemanticCache, embed
+
+# (stored request, new request, should the draft be reused)
+PAIRS = [
+    ("Thank the team for their help with the product launch",
+     "Thank the team for their help with the launch of the product", True),
+    ("Follow up on my job application for the backend engineer role",
+     "Following up on my job application for the backend engineer role", True),
+    ("Request a meeting next week to discuss the Q3 budget",
+     "Request a meeting next week to discuss the Q3 budget numbers", True),
+    ("Ask my manager for two days of leave next week",
+     "Ask my manager for two days of leave next week please", True),
+    ("Request a meeting next week to discuss the Q3 budget",
+     "Request a meeting next week to discuss the Q4 budget", False),
+    ("Decline the invitation to the conference politely",
+     "Accept the invitation to the conference politely", False),
+    ("Follow up on my job application for the backend engineer role",
+     "Follow up on my job application for the data analyst role", False),
+    ("Request two days of leave next week for a family event",
+     "Request two days of leave next month for a medical appointment", False),
+]
+
+TOPICS = ["job application", "meeting request", "project update", "invoice", "leave request",
+          "product launch", "customer complaint", "partnership proposal", "conference invitation"]
+VERBS = ["Follow up on", "Ask about", "Confirm", "Reschedule", "Thank them for", "Share feedback on"]
+
+
+def filler(rng: random.Random) -> str:
+    return (f"{rng.choice(VERBS)} the {rng.choice(TOPICS)} from {rng.randint(1, 28)} "
+            f"{rng.choice(['March', 'April', 'May'])} with {rng.choice(['Sam', 'Priya', 'Jordan', 'Lee'])}")
+
+
+def timed(label: str, count: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed * 1000:9.1f} ms | {elapsed / count * 1e6:8.1f} us/op")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=2048, help="Entries in the searched partition")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--dims", type=int, default=512)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    texts = [filler(rng) for _ in range(args.entries)]
+    queries = [filler(rng) for _ in range(args.lookups)]
+    value = {"subject": "Hello", "body": "Dear Sam,\n\nThanks.\n\nBest regards"}
+
+    print(f"embedding ({args.dims} dims)")
+    timed("embed", len(queries), lambda: [embed(text, args.dims) for text in queries])
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, path in (("memory", None), ("memory-mapped", directory)):
+            cache = SemanticCache(threshold=args.threshold, dims=args.dims, max_entries=args.entries,
+                                  path=path, save_every=args.entries)
+            print(f"{label} partition ({args.entries} entries)")
+            timed("set", len(texts), lambda: [cache.set("bench", text, value, "Sam") for text in texts])
+            timed("lookup", len(queries), lambda: [cache.get("bench", text, "Priya") for text in queries])
+            timed("save", 1, cache.save)
+            stats = cache.stats()
+            print(f"  hit rate {stats['hit_rate']:.2%}, evictions {stats['evictions']}")
+
+    print(f"reworded requests (threshold {args.threshold})")
+    correct = 0
+    for stored, new, expected in PAIRS:
+        cache = SemanticCache(threshold=args.threshold, dims=args.dims)
+        cache.set("pairs", stored, value)
+        reused = cache.get("pairs", new) is not None
+        similarity = float(embed(stored, args.dims) @ embed(new, args.dims))
+        correct += reused == expected
+        print(f"  {similarity:5.3f} {'reuse' if reused else 'miss ':<5} {'ok ' if reused == expected else 'BAD'} {new}")
+    print(f"  {correct}/{len(PAIRS)} decisions as expected")
+
+
+if __name__ == "__main__":
+    main()
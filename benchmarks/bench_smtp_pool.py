@@ -0,0 +1,64 @@
+"""
+Benchmark: one SMTP session per message vs pooled batch delivery
+
+Usage:
+    python benchmarks/bench_smtp_pool.py --messages 200
+"""
+
+import argparse
+import os
+import smtplib
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_smtp import FakeSMTP
+from smtp_pool import SMTPPool, SMTPSettings, build_message
+
+
+def per_message(settings: SMTPSettings, messages) -> None:
+    """The original handler behaviour: connect, login and quit for every message"""
+    for message in messages:
+        with smtplib.SMTP(settings.host, settings.port) as server:
+            server.login(settings.username, settings.password)
+            server.send_message(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    with FakeSMTP(port=args.port) as fake:
+        settings = SMTPSettings(
+            host="127.0.0.1", port=args.port, username="bench", password="bench",
+            sender_email="bench@example.com", starttls=False
+        )
+        messages = [
+            build_message(settings, f"user{i}@example.com", f"Subject {i}", "Hello from the benchmark")
+            for i in range(args.messages)
+        ]
+
+        start = time.perf_counter()
+        per_message(settings, messages)
+        cold = time.perf_counter() - start
+
+        pool = SMTPPool()
+        start = time.perf_counter()
+        results = pool.send_messages(settings, messages)
+        pooled = time.perf_counter() - start
+        pool.close()
+
+        assert all(result["success"] for result in results)
+        assert len(fake.messages) == 2 * args.messages
+
+    print(f"{args.messages} messages against {settings.host}:{settings.port}")
+    print(f"per-message  {cold * 1000:8.1f} ms total | {args.messages / cold:8.1f} msg/s")
+    print(f"pooled batch {pooled * 1000:8.1f} ms total | {args.messages / pooled:8.1f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
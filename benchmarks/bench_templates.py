@@ -0,0 +1,85 @@
+"""
+Benchmark: template fast-path classification and render latency, and routing on sample requests
+
+Usage:
+    python benchmarks/bench_templates.py --drafts 20000 --min-confidence 0.75
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from templates import IntentClassifier, TemplateLibrary
+
+# (context, should it be answered from a template)
+CASES = [
+    ("Follow up on my job application for the backend engineer role", True),
+    ("Following up on the job I applied for at Acme Corp last week", True),
+    ("Follow up on my application for the data analyst position, submitted 2 weeks ago", True),
+    ("Request a meeting next week to discuss the Q3 budget", True),
+    ("Schedule a call on Friday about the website redesign", True),
+    ("Thank the team for their help with the product launch", True),
+    ("Request two days of leave next week for a family event", True),
+    ("Ask my manager for time off from June 3 to June 5 due to a medical appointment", True),
+    ("Follow up on my job application and mention I received another offer with a deadline", False),
+    ("Complain to the landlord about the broken heating in my apartment", False),
+    ("Announce the new office opening to all customers", False),
+    ("Decline the invitation to speak at the conference", False),
+    ("Write a cold outreach email to a potential investor about our seed round", False),
+    ("Thank the interviewer and follow up on the job application", False),
+    ("Remind the client that invoice 4521 is overdue", False),
+    # A second request joined on to a template-shaped one
+    ("Thank my landlord for fixing the heater and tell him I am moving out next month and want my deposit back", False),
+    ("Thank the client for their business and remind them invoice 4521 is two weeks overdue", False),
+    ("Thank you for nothing, I am quitting", False),
+    ("Schedule a meeting to discuss the Q3 budget and ask everyone to bring their hiring plans", False),
+    ("Request a day off next Friday but also ask whether I can work remotely the week after", False),
+    # Content a template would drop or contradict
+    ("Ask my manager for 3 days of leave next week because my mother is sick", False),
+    ("Thank you for not hiring me", False),
+    ("Follow up on my job application since I have not heard back", False),
+]
+
+TONES = ("professional", "friendly", "formal", "casual")
+
+
+def timed(label: str, count: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed * 1000:9.1f} ms | {elapsed / count * 1e6:8.1f} us/op")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--drafts", type=int, default=20000)
+    parser.add_argument("--min-confidence", type=float, default=0.75)
+    args = parser.parse_args()
+
+    classifier = IntentClassifier()
+    library = TemplateLibrary(classifier, min_confidence=args.min_confidence)
+    contexts = [context for context, _ in CASES]
+
+    print("latency")
+    timed("classify", args.drafts, lambda: [classifier.classify(contexts[i % len(contexts)])
+                                            for i in range(args.drafts)])
+    timed("classify + render", args.drafts, lambda: [library.draft(TONES[i % len(TONES)], contexts[i % len(contexts)], "Sam")
+                                                     for i in range(args.drafts)])
+
+    print(f"routing (min confidence {args.min_confidence})")
+    correct = templated = 0
+    for context, expected in CASES:
+        draft, classification = library.draft("professional", context, "Sam")
+        routed = draft is not None
+        templated += routed
+        correct += routed == expected
+        print(f"  {classification.confidence:5.2f} {classification.intent:<25} {'template' if routed else 'model   '} "
+              f"{'ok ' if routed == expected else 'BAD'} {context}")
+    print(f"  {correct}/{len(CASES)} decisions as expected, {templated} answered from templates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Local stand-in for the OpenRouter chat completions API used by the benchmarks
+
+Latency, token streaming rate and error injection are configurable so load
+tests can reproduce slow, bursty or rate-limited upstream behaviour.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_EMAIL = """Subject: Following Up on My Application
+
+Dear John,
+
+I hope this message finds you well. I wanted to follow up on the application I submitted last week.
+
+Best regards,
+Alex"""
+
+# Arguments of the tool call sent when the request offers tools (structured output)
+SAMPLE_TOOL_ARGUMENTS = {
+    "subject": "Following Up on My Application",
+    "greeting": "Dear John,",
+    "body": "I hope this message finds you well. I wanted to follow up on the application I submitted last week.",
+    "closing": "Best regards,\nAlex",
+    "suggestions": ["Mention the exact role and date you applied", "Add one line on why you fit the team"],
+}
+
+_TOKEN = re.compile(r"\S+\s*|\s+")
+
+
+@dataclass
+class LatencyModel:
+    """
+    Upstream latency distribution, parsed from a spec string:
+
+        fixed:0.2             always 200 ms
+        uniform:0.1,0.5       uniformly between 100 and 500 ms
+        lognormal:0.3,0.5     median 300 ms, sigma 0.5 (long tail)
+    """
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v] or [0.0]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        return cls(kind, values[0], values[1] if len(values) > 1 else 0.0)
+
+    def sample(self) -> float:
+        if self.kind == "uniform":
+            return random.uniform(self.a, self.b)
+        if self.kind == "lognormal":
+            return random.lognormvariate(0, self.b) * self.a
+        return self.a
+
+
+@dataclass
+class FakeBehaviour:
+    """How the fake server responds"""
+    latency: LatencyModel
+    tokens_per_second: float = 0.0  # 0 sends all streamed tokens at once
+    error_rate: float = 0.0
+    error_status: int = 429
+    retry_after: float = 1.0
+    content: str = SAMPLE_EMAIL
+    supports_n: bool = True  # honour the `n` parameter (several choices per completion)
+    supports_tools: bool = True  # answer with a tool call when the request offers tools
+    tool_arguments: str = json.dumps(SAMPLE_TOOL_ARGUMENTS)
+
+
+class FakeOpenRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # Request counter, so load tests can report upstream amplification
+        self._send_json(200, {"requests": self.server.requests})
+
+    def do_POST(self):
+        behaviour: FakeBehaviour = self.server.behaviour
+        content_length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(content_length) or b"{}")
+        self.server.requests += 1
+
+        time.sleep(behaviour.latency.sample())
+
+        if behaviour.error_rate and random.random() < behaviour.error_rate:
+            self._send_error(behaviour)
+        elif payload.get("stream"):
+            self._send_stream(payload, behaviour)
+        else:
+            self._send_completion(payload, behaviour)
+
+    def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, behaviour: FakeBehaviour) -> None:
+        headers = {}
+        if behaviour.error_status == 429:
+            headers["Retry-After"] = str(behaviour.retry_after)
+        self._send_json(
+            behaviour.error_status,
+            {"error": {"message": "Injected failure", "code": behaviour.error_status}},
+            headers
+        )
+
+    def _usage(self, payload: dict, content: str) -> dict:
+        prompt_tokens = sum(len(m.get("content", "")) for m in payload.get("messages", [])) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    def _send_completion(self, payload: dict, behaviour: FakeBehaviour) -> None:
+        if payload.get("tools") and behaviour.supports_tools:
+            self._send_tool_call(payload, behaviour)
+            return
+        n = max(1, int(payload.get("n") or 1)) if behaviour.supports_n else 1
+        # Later choices get a marked subject so callers can tell drafts apart
+        contents = [behaviour.content] + [
+            behaviour.content.replace("\n", f" (draft {i + 1})\n", 1) for i in range(1, n)
+        ]
+        self._send_json(200, {
+            "id": "gen-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake-model"),
+            "choices": [{
+                "index": i,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            } for i, content in enumerate(contents)],
+            "usage": self._usage(payload, "".join(contents))
+        })
+
+    def _send_tool_call(self, payload: dict, behaviour: FakeBehaviour) -> None:
+        tool = payload["tools"][0]["function"]["name"]
+        self._send_json(200, {
+            "id": "gen-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake-model"),
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [{
+                        "id": "call-fake",
+                        "type": "function",
+                        "function": {"name": tool, "arguments": behaviour.tool_arguments},
+                    }],
+                },
+                "finish_reason": "tool_calls"
+            }],
+            "usage": self._usage(payload, behaviour.tool_arguments)
+        })
+
+    def _send_stream(self, payload: dict, behaviour: FakeBehaviour) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(choice: dict, usage: dict = None) -> None:
+            body = {
+                "id": "gen-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake-model"),
+                "choices": [choice] if choice else [],
+            }
+            if usage:
+                body["usage"] = usage
+            self._write_chunk(f"data: {json.dumps(body)}\n\n")
+
+        delay = 1.0 / behaviour.tokens_per_second if behaviour.tokens_per_second else 0.0
+        for token in _TOKEN.findall(behaviour.content):
+            chunk({"index": 0, "delta": {"content": token}, "finish_reason": None})
+            if delay:
+                time.sleep(delay)
+        chunk({"index": 0, "delta": {}, "finish_reason": "stop"}, self._usage(payload, behaviour.content))
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOpenRouter:
+    """Run the fake server on a background thread"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 behaviour: FakeBehaviour = None):
+        self.server = ThreadingHTTPServer((host, port), FakeOpenRouterHandler)
+        self.server.daemon_threads = True
+        self.server.behaviour = behaviour or FakeBehaviour(LatencyModel("fixed", latency))
+        self.server.requests = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    def __enter__(self) -> "FakeOpenRouter":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def add_behaviour_arguments(parser) -> None:
+    """Command-line options shared by every script that starts a fake server"""
+    parser.add_argument("--latency", default="fixed:0", help="Latency distribution, e.g. lognormal:0.3,0.5")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Streaming rate (0 = unthrottled)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--ignore-n", action="store_true", help="Return one choice even when `n` asks for more")
+    parser.add_argument("--no-tools", action="store_true", help="Answer in plain text even when tools are offered")
+
+
+def behaviour_from_args(args) -> FakeBehaviour:
+    return FakeBehaviour(
+        latency=LatencyModel.parse(args.latency),
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        supports_n=not args.ignore_n,
+        supports_tools=not args.no_tools,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fake OpenRouter server")
+    parser.add_argument("--port", type=int, default=8099)
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    with FakeOpenRouter(port=args.port, behaviour=behaviour_from_args(args)) as fake:
+        print(f"Fake OpenRouter listening on {fake.base_url}")
+        try:
+            fake.thread.join()
+        except KeyboardInterrupt:
+            pass
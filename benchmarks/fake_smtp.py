@@ -0,0 +1,70 @@
+"""
+Local aiosmtpd stand-in for the SMTP server used by the benchmarks
+
+Requires the optional `aiosmtpd` package (pip install aiosmtpd).
+"""
+
+import logging
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+# aiosmtpd logs a deprecation warning on every AUTH about an attribute we never touch
+logging.getLogger("mail.log").setLevel(logging.ERROR)
+
+
+class RecordingHandler:
+    """Accept every message and keep it for inspection"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        # aiosmtpd reads commands in order, so it can safely advertise PIPELINING
+        session.host_name = hostname
+        return responses[:-1] + ['250-PIPELINING', responses[-1]]
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 Message accepted for delivery'
+
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+class FakeSMTP:
+    """Run an authenticated plain-text SMTP server on a background thread"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8025):
+        self.handler = RecordingHandler()
+        self.controller = Controller(
+            self.handler,
+            hostname=host,
+            port=port,
+            authenticator=accept_any_login,
+            auth_require_tls=False,
+        )
+
+    @property
+    def messages(self):
+        return self.handler.messages
+
+    def __enter__(self) -> "FakeSMTP":
+        self.controller.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.controller.stop()
+
+
+if __name__ == "__main__":
+    import time
+
+    with FakeSMTP() as fake:
+        print(f"Fake SMTP listening on {fake.controller.hostname}:{fake.controller.port}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,448 @@
+"""
+Load test for the generation endpoints against a local fake OpenRouter
+
+Starts the fake provider and the target (the FastAPI backend under
+uvicorn, or the Vercel entry point api/index.py as one warm instance) as
+subprocesses, drives it at a fixed request rate or a fixed number of
+concurrent clients, and writes a JSON report with latency percentiles,
+throughput and error rates.
+
+Usage:
+    python benchmarks/load_test.py run --target backend --concurrency 16 --duration 20
+    python benchmarks/load_test.py run --target api --rps 20 --latency lognormal:0.4,0.5
+    python benchmarks/load_test.py run --target backend --endpoint stream --tokens-per-second 80
+    python benchmarks/load_test.py run --url https://example.vercel.app/api/generate-email --rps 2
+    python benchmarks/load_test.py compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openrouter import add_behaviour_arguments
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+ENDPOINTS = {
+    ("backend", "generate"): "/api/generate-email",
+    ("backend", "stream"): "/api/generate-email/stream",
+    ("api", "generate"): "/api/generate-email",
+    ("api", "stream"): "/api/generate-email/stream",
+}
+
+TONES = ["professional", "friendly", "formal", "casual"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {
+        "min": round(ordered[0], 2),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": round(percentile(ordered, 50), 2),
+        "p90": round(percentile(ordered, 90), 2),
+        "p95": round(percentile(ordered, 95), 2),
+        "p99": round(percentile(ordered, 99), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def build_payload(i: int, unique: bool, variants: int = 1, output_mode: str = "text") -> dict[str, Any]:
+    """Request body; unique payloads keep the response cache and single-flight out of the measurement"""
+    suffix = f" (reference #{i})" if unique else ""
+    payload = {
+        "context": f"Follow up on my job application for the senior engineer role{suffix}",
+        "tone": TONES[i % len(TONES)],
+        "recipient_name": "John",
+        "additional_details": "Mention availability for a call next week",
+    }
+    if variants > 1:
+        payload["variants"] = variants
+    if output_mode != "text":
+        payload["output_mode"] = output_mode
+    return payload
+
+
+# Processes
+
+class Services:
+    """Fake provider plus the target server, each in its own process"""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes: list[subprocess.Popen] = []
+        self.fake_url: Optional[str] = None
+        self.target_url: Optional[str] = None
+
+    def _spawn(self, cmd: list[str], cwd: str, env: dict[str, str]) -> None:
+        self.processes.append(subprocess.Popen(
+            cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL,
+            stderr=None if self.args.verbose else subprocess.DEVNULL
+        ))
+
+    def _wait_ready(self, method: str, url: str, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for process in self.processes:
+                if process.poll() is not None:
+                    raise RuntimeError(f"{process.args} exited with code {process.returncode}")
+            try:
+                httpx.request(method, url, timeout=1.0)
+                return
+            except httpx.TransportError:
+                time.sleep(0.1)
+        raise RuntimeError(f"Timed out waiting for {url}")
+
+    def start(self) -> None:
+        args = self.args
+        fake_port = free_port()
+        self._spawn([
+            sys.executable, os.path.join(BENCH_DIR, "fake_openrouter.py"),
+            "--port", str(fake_port),
+            "--latency", args.latency,
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--error-rate", str(args.error_rate),
+            "--error-status", str(args.error_status),
+            "--retry-after", str(args.retry_after),
+        ] + (["--ignore-n"] if args.ignore_n else []) + (["--no-tools"] if args.no_tools else []),
+            ROOT_DIR, dict(os.environ))
+        self.fake_url = f"http://127.0.0.1:{fake_port}"
+        self._wait_ready("GET", self.fake_url)
+
+        env = dict(os.environ)
+        env.update({
+            "OPENROUTER_API_KEY": env.get("OPENROUTER_API_KEY", "sk-or-v1-benchmark"),
+            "OPENROUTER_BASE_URL": f"{self.fake_url}/api/v1",
+            "EMAIL_CACHE_ENABLED": "true" if args.cache else "false",
+            # Every simulated client shares one IP, so the per-client limits would throttle the run
+            "RATE_LIMIT_ENABLED": "true" if args.rate_limit else "false",
+        })
+        port = free_port()
+        if args.target == "backend":
+            self._spawn(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                 "--log-level", "warning", "--workers", str(args.workers)],
+                os.path.join(ROOT_DIR, "backend"), env
+            )
+            self._wait_ready("GET", f"http://127.0.0.1:{port}/health")
+        else:
+            self._spawn(
+                [sys.executable, os.path.join(BENCH_DIR, "serve_api.py"), "--port", str(port)],
+                ROOT_DIR, env
+            )
+            self._wait_ready("GET", f"http://127.0.0.1:{port}/api/health")
+        self.target_url = f"http://127.0.0.1:{port}{ENDPOINTS[(args.target, args.endpoint)]}"
+
+    def upstream_requests(self) -> Optional[int]:
+        if self.fake_url is None:
+            return None
+        return httpx.get(self.fake_url, timeout=5.0).json()["requests"]
+
+    def stop(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# Load generation
+
+class Recorder:
+    """Outcome of every request issued during the measured window"""
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.ttfb: list[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.succeeded = 0
+        self.failed = 0
+
+    def record(self, status: Optional[int], latency: float, ttfb: Optional[float], error: Optional[str]) -> None:
+        self.latencies.append(latency * 1000)
+        if ttfb is not None:
+            self.ttfb.append(ttfb * 1000)
+        if status is not None:
+            self.statuses[str(status)] += 1
+        if error is None:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+            self.errors[error] += 1
+
+
+async def one_request(client: httpx.AsyncClient, url: str, payload: dict, stream: bool,
+                      scheduled: float, recorder: Recorder) -> None:
+    """
+    Issue one request. Latency is measured from the scheduled start, so a
+    target that falls behind a fixed rate is charged for the queueing delay.
+    """
+    status = None
+    ttfb = None
+    error = None
+    try:
+        if stream:
+            async with client.stream("POST", url, json=payload) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if ttfb is None and line.startswith("event: token"):
+                        ttfb = time.perf_counter() - scheduled
+                    if line.startswith("event: error"):
+                        error = "stream_error"
+        else:
+            response = await client.post(url, json=payload)
+            status = response.status_code
+        if status >= 400:
+            error = f"http_{status}"
+    except httpx.HTTPError as e:
+        error = type(e).__name__
+    recorder.record(status, time.perf_counter() - scheduled, ttfb, error)
+
+
+async def run_fixed_rate(client, url, args, recorder: Recorder) -> float:
+    """Open loop: start requests on a fixed schedule regardless of completions"""
+    tasks = []
+    interval = 1.0 / args.rps
+    start = time.perf_counter()
+    i = 0
+    while True:
+        scheduled = start + i * interval
+        if scheduled - start >= args.duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        payload = build_payload(i, not args.repeat_payload, args.variants, args.output_mode)
+        tasks.append(asyncio.create_task(
+            one_request(client, url, payload, args.endpoint == "stream", scheduled, recorder)
+        ))
+        i += 1
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start
+
+
+async def run_fixed_concurrency(client, url, args, recorder: Recorder) -> float:
+    """Closed loop: each client sends its next request as soon as the last one finishes"""
+    counter = iter(range(10 ** 9))
+    start = time.perf_counter()
+    deadline = start + args.duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            i = next(counter)
+            await one_request(
+                client, url, build_payload(i, not args.repeat_payload, args.variants, args.output_mode),
+                args.endpoint == "stream", time.perf_counter(), recorder
+            )
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return time.perf_counter() - start
+
+
+async def drive(url: str, args) -> tuple[Recorder, float]:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        if args.warmup:
+            warm_args = argparse.Namespace(**{**vars(args), "duration": args.warmup})
+            if args.rps:
+                await run_fixed_rate(client, url, warm_args, Recorder())
+            else:
+                await run_fixed_concurrency(client, url, warm_args, Recorder())
+
+        recorder = Recorder()
+        if args.rps:
+            elapsed = await run_fixed_rate(client, url, args, recorder)
+        else:
+            elapsed = await run_fixed_concurrency(client, url, args, recorder)
+    return recorder, elapsed
+
+
+# Reports
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(args, url: str, recorder: Recorder, elapsed: float,
+                 upstream_before: Optional[int], upstream_after: Optional[int]) -> dict[str, Any]:
+    total = recorder.succeeded + recorder.failed
+    report = {
+        "name": args.name,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "target": "external" if args.url else args.target,
+        "endpoint": args.endpoint,
+        "variants": args.variants,
+        "output_mode": args.output_mode,
+        "url": url,
+        "mode": "fixed_rate" if args.rps else "fixed_concurrency",
+        "rps": args.rps,
+        "concurrency": None if args.rps else args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "succeeded": recorder.succeeded,
+        "failed": recorder.failed,
+        "error_rate": round(recorder.failed / total, 4) if total else 0.0,
+        "throughput_rps": round(recorder.succeeded / elapsed, 2) if elapsed else 0.0,
+        "status_codes": dict(recorder.statuses),
+        "errors": dict(recorder.errors),
+        "latency_ms": summarize(recorder.latencies),
+    }
+    if recorder.ttfb:
+        report["ttfb_ms"] = summarize(recorder.ttfb)
+    if not args.url:
+        report["upstream"] = {
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "error_rate": args.error_rate,
+            "error_status": args.error_status,
+            "ignore_n": args.ignore_n,
+            "no_tools": args.no_tools,
+            "cache": args.cache,
+            "rate_limit": args.rate_limit,
+        }
+        if upstream_before is not None and upstream_after is not None:
+            calls = upstream_after - upstream_before
+            report["upstream"]["requests"] = calls
+            report["upstream"]["calls_per_request"] = round(calls / total, 3) if total else 0.0
+    return report
+
+
+def print_report(report: dict[str, Any]) -> None:
+    latency = report["latency_ms"]
+    print(f"{report['target']} {report['endpoint']} ({report['mode']})")
+    print(f"  requests    {report['requests']} ({report['failed']} failed, error rate {report['error_rate']:.2%})")
+    print(f"  throughput  {report['throughput_rps']} req/s")
+    if latency:
+        print(f"  latency     p50 {latency['p50']} ms | p95 {latency['p95']} ms | p99 {latency['p99']} ms | max {latency['max']} ms")
+    if "ttfb_ms" in report:
+        ttfb = report["ttfb_ms"]
+        print(f"  first token p50 {ttfb['p50']} ms | p95 {ttfb['p95']} ms | p99 {ttfb['p99']} ms")
+    if report["status_codes"]:
+        print(f"  statuses    {report['status_codes']}")
+
+
+def run(args) -> None:
+    if not args.rps and not args.concurrency:
+        args.concurrency = 8
+    if (args.target, args.endpoint) not in ENDPOINTS and not args.url:
+        raise SystemExit(f"The {args.target} target has no {args.endpoint} endpoint")
+
+    services = Services(args)
+    try:
+        if args.url:
+            url = args.url
+        else:
+            services.start()
+            url = services.target_url
+        before = services.upstream_requests()
+        recorder, elapsed = asyncio.run(drive(url, args))
+        after = services.upstream_requests()
+    finally:
+        services.stop()
+
+    report = build_report(args, url, recorder, elapsed, before, after)
+    print_report(report)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{args.name or report['target']}-{args.endpoint}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+def compare(args) -> None:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = [("throughput_rps", baseline["throughput_rps"], candidate["throughput_rps"]),
+            ("error_rate", baseline["error_rate"], candidate["error_rate"])]
+    for section in ("latency_ms", "ttfb_ms"):
+        for key in ("p50", "p95", "p99", "max"):
+            if key in baseline.get(section, {}) and key in candidate.get(section, {}):
+                rows.append((f"{section}.{key}", baseline[section][key], candidate[section][key]))
+
+    print(f"{'metric':<18}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for metric, old, new in rows:
+        change = f"{(new - old) / old:+.1%}" if old else "n/a"
+        print(f"{metric:<18}{old:>12}{new:>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the email generation endpoints")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run a load test and write a JSON report")
+    run_parser.add_argument("--target", choices=["backend", "api"], default="backend")
+    run_parser.add_argument("--endpoint", choices=["generate", "stream"], default="generate")
+    run_parser.add_argument("--url", help="Drive an already running endpoint instead of starting one")
+    load = run_parser.add_mutually_exclusive_group()
+    load.add_argument("--rps", type=float, help="Fixed arrival rate (open loop)")
+    load.add_argument("--concurrency", type=int, help="Fixed number of clients (closed loop, default 8)")
+    run_parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before the run")
+    run_parser.add_argument("--timeout", type=float, default=60.0)
+    run_parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the backend target")
+    run_parser.add_argument("--cache", action="store_true", help="Leave the response cache enabled")
+    run_parser.add_argument("--rate-limit", action="store_true", help="Leave per-client rate limiting enabled")
+    run_parser.add_argument("--repeat-payload", action="store_true", help="Send the same body every time")
+    run_parser.add_argument("--variants", type=int, default=1, help="Drafts requested per call")
+    run_parser.add_argument("--output-mode", choices=["text", "structured"], default="text")
+    run_parser.add_argument("--name", help="Label stored in the report and used in the file name")
+    run_parser.add_argument("--output", help="Report path (default benchmarks/results/...)")
+    run_parser.add_argument("--verbose", action="store_true", help="Show server logs")
+    add_behaviour_arguments(run_parser)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
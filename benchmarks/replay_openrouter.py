@@ -0,0 +1,292 @@
+"""
+Record/replay stand-in for the OpenRouter chat completions API
+
+Record mode forwards each request to a real OpenAI-compatible upstream and
+keeps a compact copy of the response in a fixture store (JSON lines, one
+entry per distinct request). Replay mode answers from the store alone, with
+no network and no key, so the pipeline runs offline and deterministically.
+A request with no recorded response gets a 404 naming its fixture key.
+
+Usage:
+    # Proxy the app to OpenRouter and record what it sends
+    python benchmarks/replay_openrouter.py --record --upstream https://openrouter.ai/api/v1 --port 8098
+    # Serve the recordings
+    python benchmarks/replay_openrouter.py --port 8098
+"""
+
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+import httpx
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_FIXTURES = os.path.join(FIXTURES_DIR, "openrouter.jsonl")
+
+# Request fields that decide the response; ids, user tags and stream options do not
+_KEY_FIELDS = (
+    "model", "messages", "max_tokens", "max_completion_tokens", "n", "stream", "temperature", "top_p",
+    "tools", "tool_choice", "response_format", "stop",
+)
+
+
+def fixture_key(payload: dict) -> str:
+    """Stable id for a request: a hash of the fields that decide its response"""
+    relevant = {field: payload[field] for field in _KEY_FIELDS if payload.get(field) is not None}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def describe(payload: dict) -> dict:
+    """The request as stored next to its response, for reading fixture diffs"""
+    messages = payload.get("messages") or []
+    user = [m.get("content") for m in messages if m.get("role") == "user"]
+    return {
+        "model": payload.get("model"),
+        "stream": bool(payload.get("stream")),
+        "n": payload.get("n", 1),
+        "max_tokens": payload.get("max_tokens"),
+        "tools": [tool.get("function", {}).get("name") for tool in payload.get("tools") or []],
+        "user": user[-1] if user else None,
+    }
+
+
+def compact_completion(body: dict) -> dict:
+    """Keep only what the client reads from a completion"""
+    choices = []
+    for choice in body.get("choices") or []:
+        message = {key: value for key, value in (choice.get("message") or {}).items()
+                   if key in ("role", "content", "tool_calls") and value is not None}
+        choices.append({"message": message, "finish_reason": choice.get("finish_reason")})
+    return {"model": body.get("model"), "choices": choices, "usage": body.get("usage")}
+
+
+def expand_completion(key: str, compact: dict) -> dict:
+    """A full completion body from its compact form"""
+    return {
+        "id": f"gen-replay-{key}",
+        "object": "chat.completion",
+        "created": 0,
+        "model": compact.get("model"),
+        "choices": [{"index": index, **choice} for index, choice in enumerate(compact.get("choices") or [])],
+        "usage": compact.get("usage"),
+    }
+
+
+class FixtureStore:
+    """Recorded responses by fixture key, kept in a JSON lines file"""
+
+    def __init__(self, path: str = DEFAULT_FIXTURES):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.entries.get(key)
+
+    def put(self, entry: dict) -> None:
+        with self._lock:
+            self.entries[entry["key"]] = entry
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            lines = [json.dumps(self.entries[key], sort_keys=True, ensure_ascii=False) for key in sorted(self.entries)]
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n" if lines else "")
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._send_json(200, {"requests": self.server.requests, "misses": len(self.server.misses)})
+
+    def do_POST(self):
+        content_length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(content_length) or b"{}")
+        key = fixture_key(payload)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.seen.append((key, payload))
+
+        if self.server.upstream:
+            self._record(key, payload)
+            return
+
+        entry = self.server.store.get(key)
+        if entry is None:
+            with self.server.lock:
+                self.server.misses.append(key)
+            self._send_json(404, {"error": {"message": f"No recorded response for request {key}", "code": 404}})
+        elif "stream" in entry:
+            self._replay_stream(key, payload, entry)
+        elif entry["status"] == 200:
+            self._send_json(200, expand_completion(key, entry["body"]))
+        else:
+            self._send_json(entry["status"], entry["body"], entry.get("headers"))
+
+    def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _replay_stream(self, key: str, payload: dict, entry: dict) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(choices: list, usage: dict = None) -> None:
+            body = {"id": f"gen-replay-{key}", "object": "chat.completion.chunk", "created": 0,
+                    "model": payload.get("model"), "choices": choices}
+            if usage:
+                body["usage"] = usage
+            self._write_chunk(f"data: {json.dumps(body)}\n\n".encode("utf-8"))
+
+        for delta in entry["stream"]:
+            delta = {"content": delta} if isinstance(delta, str) else delta
+            chunk([{"index": 0, "delta": delta, "finish_reason": None}])
+        chunk([{"index": 0, "delta": {}, "finish_reason": entry.get("finish_reason") or "stop"}], entry.get("usage"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _record(self, key: str, payload: dict) -> None:
+        entry = {"key": key, "request": describe(payload), "source": self.server.source}
+        headers = {name: value for name, value in self.headers.items() if name.lower() == "authorization"}
+        url = self.server.upstream.rstrip("/") + "/chat/completions"
+        try:
+            with httpx.stream("POST", url, json=payload, headers=headers, timeout=120.0) as response:
+                if payload.get("stream") and response.status_code == 200:
+                    self._record_stream(entry, response)
+                    return
+                raw = response.read()
+                retry_after = response.headers.get("retry-after")
+        except httpx.HTTPError as e:
+            self._send_json(502, {"error": {"message": f"Upstream request failed: {e}", "code": 502}})
+            return
+
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            body = {"error": {"message": raw.decode("utf-8", "replace")[:500], "code": response.status_code}}
+        entry["status"] = response.status_code
+        entry["body"] = compact_completion(body) if response.status_code == 200 else body
+        if retry_after is not None:
+            entry["headers"] = {"Retry-After": retry_after}
+        self.server.store.put(entry)
+        self._send_json(response.status_code, body, entry.get("headers"))
+
+    def _record_stream(self, entry: dict, response: httpx.Response) -> None:
+        """Relay the upstream stream as it arrives, keeping its deltas"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        deltas: list[Any] = []
+        for line in response.iter_lines():
+            if line:
+                self._write_chunk(f"{line}\n\n".encode("utf-8"))
+            if not line.startswith("data:") or line[5:].strip() == "[DONE]":
+                continue
+            event = json.loads(line[5:])
+            if event.get("usage"):
+                entry["usage"] = event["usage"]
+            for choice in event.get("choices") or []:
+                delta = {key: value for key, value in (choice.get("delta") or {}).items() if value is not None}
+                if choice.get("finish_reason"):
+                    entry["finish_reason"] = choice["finish_reason"]
+                if set(delta) == {"content"}:
+                    deltas.append(delta["content"])
+                elif delta and set(delta) != {"role"}:
+                    deltas.append(delta)
+        self.wfile.write(b"0\r\n\r\n")
+        entry["stream"] = deltas
+        self.server.store.put(entry)
+
+
+class ReplayOpenRouter:
+    """
+    Run the replay (or, with `upstream`, recording) server on a background
+    thread. `seen` lists (fixture key, payload) per request and `misses`
+    the keys replay could not answer.
+    """
+
+    def __init__(self, store: FixtureStore, upstream: Optional[str] = None, source: Optional[str] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.server = ThreadingHTTPServer((host, port), ReplayHandler)
+        self.server.daemon_threads = True
+        self.server.store = store
+        self.server.upstream = upstream
+        self.server.source = source or (httpx.URL(upstream).host if upstream else None)
+        self.server.requests = 0
+        self.server.seen = []
+        self.server.misses = []
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    @property
+    def seen(self) -> list[tuple[str, dict]]:
+        return self.server.seen
+
+    @property
+    def misses(self) -> list[str]:
+        return self.server.misses
+
+    def __enter__(self) -> "ReplayOpenRouter":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Record/replay OpenRouter stand-in")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--record", action="store_true", help="Forward to --upstream and store the responses")
+    parser.add_argument("--upstream", default="https://openrouter.ai/api/v1")
+    args = parser.parse_args()
+
+    store = FixtureStore(args.fixtures)
+    with ReplayOpenRouter(store, upstream=args.upstream if args.record else None, port=args.port) as replay:
+        mode = f"recording from {args.upstream}" if args.record else f"replaying {len(store.entries)} fixtures"
+        print(f"OpenRouter stand-in on {replay.base_url}, {mode}")
+        try:
+            replay.thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if args.record:
+                store.save()
+                print(f"Saved {len(store.entries)} fixtures to {args.fixtures}")
@@ -0,0 +1,469 @@
+"""
+Golden-output regression suite and pipeline micro-benchmarks, replayed offline
+
+Sends fixed requests through the real app (prompt building, routing, output
+parsing, signatures, error mapping) with the model provider replaced by
+recorded responses (replay_openrouter.py), and compares each response and
+the prompt sent upstream with benchmarks/fixtures/golden.json.
+
+Usage:
+    python benchmarks/replay_suite.py check              # exit 1 on any difference
+    python benchmarks/replay_suite.py check --update     # accept the current output as golden
+    python benchmarks/replay_suite.py record --upstream https://openrouter.ai/api/v1   # needs OPENROUTER_API_KEY
+    python benchmarks/replay_suite.py record --seed      # canned answers from fake_openrouter.py, no key
+    python benchmarks/replay_suite.py bench --requests 500
+"""
+
+import argparse
+import asyncio
+import difflib
+import hashlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from fake_openrouter import FakeOpenRouter, SAMPLE_EMAIL
+from replay_openrouter import DEFAULT_FIXTURES, FIXTURES_DIR, FixtureStore, ReplayOpenRouter
+from serve_api import load_app
+
+DEFAULT_GOLDEN = os.path.join(FIXTURES_DIR, "golden.json")
+
+# Settings that would make the output depend on the machine or on earlier cases
+SUITE_ENV = {
+    "EMAIL_AGENT_WARMUP": "false",
+    "EMAIL_CACHE_ENABLED": "false",
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "RATE_LIMIT_ENABLED": "false",
+    "MODEL_HEDGING": "false",
+    "PROVIDER_MAX_RETRIES": "0",
+    "EMAIL_OUTPUT_MODE": "text",
+    "TEMPLATE_FAST_PATH": "true",
+    "PROMPT_TOKENIZER": "heuristic",
+    # The deployment's free default model, so recording from OpenRouter costs nothing
+    "EMAIL_MODELS": "nvidia/nemotron-3-nano-30b-a3b:free",
+}
+UNSET_ENV = ("EMAIL_MAX_GENERATION_SECONDS", "PROMPT_MAX_INPUT_TOKENS", "PROMPT_MAX_OUTPUT_TOKENS")
+
+DRAFT = {
+    "subject": "Confirming the Revised Delivery Date for Order 7731",
+    "body": (
+        "Dear Maria,\n\nThank you for the update on order 7731. Could you confirm the revised delivery date "
+        "so we can plan the warehouse schedule?\n\nThe original date was 14 March, and our team is ready to "
+        "receive the shipment any weekday morning.\n\nBest regards,\nAlex Kim"
+    ),
+    "tone": "professional",
+    "generated_at": "2026-01-01T00:00:00",
+    "suggestions": ["Proofread before sending"],
+}
+
+# name, path, JSON body, headers, and the canned upstream answer used by `record --seed`
+CASES = [
+    {
+        "name": "generate_signature",
+        "path": "/api/generate-email",
+        "json": {
+            "context": "Ask the vendor to confirm the revised delivery date for order 7731",
+            "tone": "professional",
+            "recipient_name": "Maria Chen",
+            "sender_signature": {"name": "Alex Kim", "title": "Operations Lead", "company": "Northwind"},
+        },
+        # The sign-off only; the signature is appended by the app
+        "seed": {"content": "Subject: " + DRAFT["subject"] + "\n\n" + DRAFT["body"].removesuffix("\nAlex Kim")},
+    },
+    {
+        "name": "generate_markdown_subject",
+        "path": "/api/generate-email",
+        "json": {"context": "Ask the team whether Friday's offsite should move indoors because of rain", "tone": "casual"},
+        "seed": {"content": (
+            "**Subject:** Friday offsite - indoors?\n\nHey team,\n\nThe forecast says rain all Friday. "
+            "Should we move the offsite indoors? Reply by Wednesday.\n\nCheers,\nSam"
+        )},
+    },
+    {
+        "name": "generate_no_subject",
+        "path": "/api/generate-email",
+        "json": {"context": "Congratulate my colleague Dana on ten years at the company", "tone": "friendly"},
+        "seed": {"content": (
+            "Hi Dana,\n\nTen years! Congratulations on this milestone, and thank you for everything you "
+            "bring to the team.\n\nWarm regards,\nJo"
+        )},
+    },
+    {
+        "name": "generate_fenced",
+        "path": "/api/generate-email",
+        "json": {"context": "Inform the board that the annual report will be published one week late", "tone": "formal"},
+        "seed": {"content": (
+            "```\nSubject: Revised Publication Date for the Annual Report\n\nDear Members of the Board,\n\n"
+            "I write to inform you that the annual report will be published one week later than planned.\n\n"
+            "Yours sincerely,\nR. Patel\n```"
+        )},
+    },
+    {
+        "name": "generate_structured",
+        "path": "/api/generate-email",
+        "json": {
+            "context": "Tell the team the budget review moved to Thursday at 3pm in room 4B",
+            "tone": "professional",
+            "output_mode": "structured",
+        },
+        "seed": {"tool_arguments": {
+            "subject_line": "Subject: Budget review moved to Thursday",
+            "greeting": "Hi all,",
+            "body": "The budget review is now on Thursday at 3pm in room 4B.",
+            "sign_off": "Thanks,\nPriya",
+            "suggestions": "- Add the agenda\n- Ask for slides by Wednesday",
+        }},
+    },
+    {
+        "name": "generate_variants",
+        "path": "/api/generate-email",
+        "json": {"context": "Remind the client that invoice 4521 is two weeks overdue", "tone": "professional", "variants": 2},
+        "seed": {"content": (
+            "Subject: Invoice 4521 Reminder\n\nDear Mr. Olsen,\n\nThis is a reminder that invoice 4521 is now "
+            "two weeks overdue.\n\nBest regards,\nAccounts"
+        )},
+    },
+    {
+        "name": "generate_template",
+        "path": "/api/generate-email",
+        "json": {
+            "context": "Request a meeting next week to discuss the Q3 budget",
+            "tone": "friendly",
+            "recipient_name": "Lee",
+            "sender_signature": {"name": "Jordan"},
+        },
+    },
+    # Look like templates but carry content a template would drop or contradict
+    {
+        "name": "generate_template_reason",
+        "path": "/api/generate-email",
+        "json": {"context": "Ask my manager for 3 days of leave next week because my mother is sick", "tone": "professional"},
+        "seed": {"content": (
+            "Subject: Leave Request for Next Week\n\nDear Manager,\n\nI would like to request 3 days of leave "
+            "next week, as my mother is unwell and I need to care for her.\n\nBest regards,\nSam"
+        )},
+    },
+    {
+        "name": "generate_template_negation",
+        "path": "/api/generate-email",
+        "json": {"context": "Thank you for not hiring me", "tone": "friendly"},
+        "seed": {"content": (
+            "Subject: Thank You for Letting Me Know\n\nHi,\n\nThank you for telling me about your decision. "
+            "I enjoyed meeting the team and wish you all the best.\n\nWarm regards,\nSam"
+        )},
+    },
+    {
+        "name": "stream",
+        "path": "/api/generate-email/stream",
+        "json": {"context": "Apologize to the customer for the delayed refund on order 5120", "tone": "professional"},
+        "seed": {"content": (
+            "Subject: Your Refund for Order 5120\n\nDear Customer,\n\nI am sorry that your refund for order 5120 "
+            "has taken longer than promised. It was issued today.\n\nKind regards,\nSupport Team"
+        )},
+    },
+    {
+        "name": "refine_local",
+        "path": "/api/refine-email",
+        "json": {"email": DRAFT, "instruction": "make the greeting and sign-off more casual"},
+    },
+    {
+        "name": "refine_model",
+        "path": "/api/refine-email",
+        "json": {"email": DRAFT, "instruction": "drop the sentence about the original date"},
+        "seed": {"content": (
+            "FIND: The original date was 14 March, and our team is ready to receive the shipment any weekday morning.\n"
+            "REPLACE: Our team is ready to receive the shipment any weekday morning."
+        )},
+    },
+    {
+        "name": "error_validation",
+        "path": "/api/generate-email",
+        "json": {"context": "short", "tone": "professional"},
+    },
+    {
+        "name": "error_stream_variants",
+        "path": "/api/generate-email/stream",
+        "json": {"context": "Remind the client that invoice 4521 is two weeks overdue", "variants": 2},
+    },
+    {
+        "name": "error_deadline",
+        "path": "/api/generate-email",
+        "json": {"context": "Ask the landlord to fix the broken heating in flat 4", "tone": "formal"},
+        "headers": {"X-Request-Timeout": "0"},
+    },
+    {
+        "name": "error_upstream_500",
+        "path": "/api/generate-email",
+        "json": {"context": "Ask the landlord to fix the broken heating in flat 4", "tone": "formal"},
+        "seed": {"error_status": 500},
+    },
+    # Last: a throttle puts the gateway into a cool-down
+    {
+        "name": "error_upstream_429",
+        "path": "/api/generate-email",
+        "json": {"context": "Ask the landlord to fix the broken water heater in flat 6", "tone": "formal"},
+        "seed": {"error_status": 429},
+    },
+]
+
+# Response headers that are part of the contract
+KEPT_HEADERS = ("content-type", "x-cache", "retry-after")
+
+
+def configure_env(base_url: str) -> None:
+    for name in UNSET_ENV:
+        os.environ.pop(name, None)
+    os.environ.update(SUITE_ENV)
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "sk-or-v1-replay")
+
+
+def strip_volatile(value):
+    """Drop timestamps, which differ on every run"""
+    if isinstance(value, dict):
+        return {key: strip_volatile(item) for key, item in value.items() if key != "generated_at"}
+    if isinstance(value, list):
+        return [strip_volatile(item) for item in value]
+    return value
+
+
+def parse_sse(text: str) -> list:
+    """SSE events as [event, data], with consecutive token events merged"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        name, data = "message", ""
+        for line in block.splitlines():
+            if line.startswith("event:"):
+                name = line[6:].strip()
+            elif line.startswith("data:"):
+                data += line[5:].strip()
+        payload = strip_volatile(json.loads(data)) if data else None
+        if name == "token" and events and events[-1][0] == "token":
+            events[-1][1]["text"] += payload["text"]
+        else:
+            events.append([name, payload])
+    return events
+
+
+def upstream_calls(seen: list[tuple[str, dict]]) -> list[dict]:
+    """What the app sent upstream: the prompt itself, the system prompt by hash"""
+    calls = []
+    for key, payload in seen:
+        messages = payload.get("messages") or []
+        system = "".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+        calls.append({
+            "fixture": key,
+            "model": payload.get("model"),
+            "max_tokens": payload.get("max_tokens"),
+            "n": payload.get("n", 1),
+            "stream": bool(payload.get("stream")),
+            "tools": [tool["function"]["name"] for tool in payload.get("tools") or []],
+            "system_sha": hashlib.sha256(system.encode("utf-8")).hexdigest()[:12],
+            "user": [m.get("content") for m in messages if m.get("role") == "user"],
+        })
+    return calls
+
+
+async def send(client: httpx.AsyncClient, case: dict) -> httpx.Response:
+    return await client.post(case["path"], json=case["json"], headers=case.get("headers"))
+
+
+def outcome(response: httpx.Response, seen: list[tuple[str, dict]]) -> dict:
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        body = parse_sse(response.text)
+    else:
+        try:
+            body = strip_volatile(response.json())
+        except ValueError:
+            body = response.text
+    return {
+        "status": response.status_code,
+        "headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+        "upstream": upstream_calls(seen),
+        "body": body,
+    }
+
+
+def apply_seed(fake: FakeOpenRouter, seed: dict) -> None:
+    behaviour = fake.server.behaviour
+    behaviour.content = seed.get("content", SAMPLE_EMAIL)
+    if "tool_arguments" in seed:
+        behaviour.tool_arguments = json.dumps(seed["tool_arguments"])
+    behaviour.error_rate = 1.0 if "error_status" in seed else 0.0
+    behaviour.error_status = seed.get("error_status", 429)
+
+
+async def run_cases(app, replay: ReplayOpenRouter, cases: list[dict], fake: FakeOpenRouter = None) -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=60.0) as client:
+        for case in cases:
+            if fake is not None:
+                apply_seed(fake, case.get("seed", {}))
+            start = len(replay.seen)
+            response = await send(client, case)
+            results[case["name"]] = outcome(response, replay.seen[start:])
+    return results
+
+
+def dumps(value) -> str:
+    return json.dumps(value, indent=2, sort_keys=True, ensure_ascii=False)
+
+
+def save_golden(path: str, results: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(dumps(results) + "\n")
+
+
+def select(names: list[str]) -> list[dict]:
+    if not names:
+        return CASES
+    unknown = set(names) - {case["name"] for case in CASES}
+    if unknown:
+        raise SystemExit(f"Unknown case(s): {', '.join(sorted(unknown))}")
+    return [case for case in CASES if case["name"] in names]
+
+
+def check(args) -> int:
+    store = FixtureStore(args.fixtures)
+    cases = select(args.case)
+    with ReplayOpenRouter(store) as replay:
+        configure_env(replay.base_url)
+        start = time.perf_counter()
+        results = asyncio.run(run_cases(load_app(), replay, cases))
+        elapsed = time.perf_counter() - start
+
+    if args.update:
+        golden = {}
+        if os.path.exists(args.golden):
+            with open(args.golden, encoding="utf-8") as f:
+                golden = json.load(f)
+        golden.update(results)
+        save_golden(args.golden, golden)
+        print(f"Updated {len(results)} golden outputs in {args.golden}")
+        return 0
+
+    with open(args.golden, encoding="utf-8") as f:
+        golden = json.load(f)
+    failures = 0
+    for case in cases:
+        name = case["name"]
+        expected, actual = golden.get(name), results[name]
+        if expected == actual:
+            print(f"  ok    {name}")
+            continue
+        failures += 1
+        print(f"  FAIL  {name}")
+        diff = difflib.unified_diff(
+            dumps(expected).splitlines(), dumps(actual).splitlines(), "golden", "actual", lineterm="", n=2
+        )
+        print("\n".join(f"        {line}" for line in diff))
+    if replay.misses:
+        print(f"  {len(replay.misses)} request(s) had no recorded response (did a prompt change?): "
+              f"{', '.join(sorted(set(replay.misses)))}")
+    unused = set(store.entries) - {key for key, _ in replay.seen}
+    if unused and not args.case:
+        print(f"  {len(unused)} fixture(s) not used by any case")
+    print(f"{len(cases) - failures}/{len(cases)} cases match in {elapsed * 1000:.0f} ms")
+    return 1 if failures else 0
+
+
+def record(args) -> int:
+    store = FixtureStore(args.fixtures)
+    cases = [case for case in select(args.case) if not args.seed or "seed" in case]
+    if args.seed:
+        with FakeOpenRouter() as fake, ReplayOpenRouter(store, upstream=fake.base_url, source="seed") as replay:
+            configure_env(replay.base_url)
+            results = asyncio.run(run_cases(load_app(), replay, cases, fake))
+    else:
+        if not os.getenv("OPENROUTER_API_KEY"):
+            raise SystemExit("OPENROUTER_API_KEY is required to record from a real provider")
+        with ReplayOpenRouter(store, upstream=args.upstream) as replay:
+            configure_env(replay.base_url)
+            results = asyncio.run(run_cases(load_app(), replay, cases))
+    store.save()
+    print(f"Recorded {len(replay.seen)} upstream call(s) for {len(cases)} case(s) into {args.fixtures}")
+    for name, result in results.items():
+        print(f"  {result['status']}  {name}")
+    print("Review the output and run `check --update` to accept it")
+    return 0
+
+
+def server_timing(value: str) -> dict[str, float]:
+    stages = {}
+    for item in value.split(","):
+        name, _, rest = item.strip().partition(";dur=")
+        if rest:
+            stages[name] = float(rest)
+    return stages
+
+
+async def bench_cases(app, cases: list[dict], requests: int, concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=60.0) as client:
+        for case in cases:
+            await send(client, case)  # warm up (agent creation, connections)
+            latencies, upstream = [], []
+            pending = iter(range(requests))
+
+            async def worker():
+                for _ in pending:
+                    start = time.perf_counter()
+                    response = await send(client, case)
+                    latencies.append(time.perf_counter() - start)
+                    upstream.append(server_timing(response.headers.get("server-timing", "")).get("upstream", 0.0))
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            mean = statistics.fmean(latencies) * 1000
+            own = mean - statistics.fmean(upstream)
+            print(f"  {case['name']:<26} {requests / elapsed:8.0f} req/s | mean {mean:6.2f} ms "
+                  f"p50 {latencies[len(latencies) // 2] * 1000:6.2f} p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f} ms "
+                  f"| own {own:6.2f} ms")
+
+
+def bench(args) -> int:
+    if not args.logs:
+        logging.disable(logging.INFO)
+    store = FixtureStore(args.fixtures)
+    cases = [case for case in select(args.case) if not case["name"].startswith("error_")]
+    with ReplayOpenRouter(store) as replay:
+        configure_env(replay.base_url)
+        print(f"pipeline ({args.requests} requests per case, concurrency {args.concurrency}; "
+              f"own = latency minus the upstream stage)")
+        asyncio.run(bench_cases(load_app(), cases, args.requests, args.concurrency))
+    if replay.misses:
+        print(f"  {len(replay.misses)} request(s) had no recorded response; run `check` first")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name in ("check", "record", "bench"):
+        sub = subparsers.add_parser(name)
+        sub.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+        sub.add_argument("--case", action="append", default=[], help="Only this case (repeatable)")
+    subparsers.choices["check"].add_argument("--golden", default=DEFAULT_GOLDEN)
+    subparsers.choices["check"].add_argument("--update", action="store_true", help="Write the current output as golden")
+    subparsers.choices["record"].add_argument("--upstream", default="https://openrouter.ai/api/v1")
+    subparsers.choices["record"].add_argument("--seed", action="store_true",
+                                              help="Record the canned answers from fake_openrouter.py instead")
+    subparsers.choices["bench"].add_argument("--requests", type=int, default=300)
+    subparsers.choices["bench"].add_argument("--concurrency", type=int, default=1)
+    subparsers.choices["bench"].add_argument("--logs", action="store_true", help="Keep INFO request logging on")
+    args = parser.parse_args()
+    return {"check": check, "record": record, "bench": bench}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
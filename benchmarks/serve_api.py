@@ -0,0 +1,39 @@
+"""
+Serve the Vercel entry point (api/index.py) locally
+
+Runs the module's ASGI `app` in one uvicorn process with one event loop,
+the same as a single warm serverless instance, so module-level state
+(connection pools, cache, gateway) is shared between requests and
+concurrent requests are handled without a thread per request.
+
+Usage:
+    python benchmarks/serve_api.py --port 8101
+"""
+
+import argparse
+import importlib.util
+import os
+
+import uvicorn
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api")
+
+
+def load_app(function: str = "index"):
+    """Import api/<function>.py by path and return its ASGI app"""
+    path = os.path.join(API_DIR, f"{function}.py")
+    spec = importlib.util.spec_from_file_location(f"api_{function}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the Vercel Python function locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    print(f"Serving api/index.py on http://{args.host}:{args.port}/api/", flush=True)
+    uvicorn.run(load_app(), host=args.host, port=args.port, log_level=args.log_level)
@@ -0,0 +1,189 @@
+"""
+Startup profile: import time and time to first /health response
+
+Imports backend/main.py and api/index.py in fresh interpreters
+with `-X importtime`, starts the backend under uvicorn, and reports the
+medians over several runs. `--check` compares against the checked-in
+baseline (benchmarks/startup_baseline.json) and fails when startup got
+slower than the tolerance or a deferred module is imported at startup.
+
+Usage:
+    python benchmarks/startup_profile.py --runs 5
+    python benchmarks/startup_profile.py --check
+    python benchmarks/startup_profile.py --update-baseline
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+BASELINE_PATH = os.path.join(BENCH_DIR, "startup_baseline.json")
+
+# Heavy packages that must only load when the first generation needs them
+DEFERRED_MODULES = ("pydantic_ai", "openai", "numpy")
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# Working directory, code to run, and the importtime nesting level of the target's own imports
+TARGETS = {
+    "backend": (BACKEND_DIR, "import main", 1),
+    "api": (ROOT_DIR, "import importlib.util as u; "
+                      "s = u.spec_from_file_location('api_index', 'api/index.py'); "
+                      "s.loader.exec_module(u.module_from_spec(s))", 0),
+}
+
+
+def clean_env() -> dict[str, str]:
+    """Environment for a cold start: no API key, warm-up off, no disk cache"""
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENROUTER_API_KEY", "EMAIL_CACHE_SQLITE_PATH")}
+    env["EMAIL_AGENT_WARMUP"] = "false"
+    return env
+
+
+def profile_imports(target: str) -> dict[str, Any]:
+    """Total import time, the slowest top-level imports and any deferred modules that were loaded"""
+    cwd, code, level = TARGETS[target]
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, env=clean_env(), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the {target} failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules.append((name, (len(indent) - 1) // 2, int(own), int(cumulative)))
+
+    total_us = sum(own for _, _, own, _ in modules)
+    direct = sorted((m for m in modules if m[1] == level), key=lambda m: m[3], reverse=True)
+    loaded = {name.split(".")[0] for name, *_ in modules}
+    return {
+        "import_ms": round(total_us / 1000, 1),
+        "slowest": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+                    for name, _, _, cumulative in direct[:10]],
+        "deferred_loaded": sorted(loaded.intersection(DEFERRED_MODULES)),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_health(timeout: float = 30.0) -> dict[str, float]:
+    """Spawn uvicorn and poll /health until it answers"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=clean_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            request_start = time.perf_counter()
+            try:
+                response = httpx.get(url, timeout=1.0)
+            except httpx.TransportError:
+                time.sleep(0.005)
+                continue
+            if response.status_code == 200:
+                now = time.perf_counter()
+                return {
+                    "ready_ms": round((now - start) * 1000, 1),
+                    "first_health_ms": round((now - request_start) * 1000, 2),
+                }
+        raise RuntimeError("Timed out waiting for /health")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def profile(runs: int) -> dict[str, Any]:
+    report: dict[str, Any] = {"python": sys.version.split()[0], "runs": runs}
+    for target in TARGETS:
+        samples = [profile_imports(target) for _ in range(runs)]
+        report[target] = {
+            "import_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+            "slowest": samples[-1]["slowest"],
+            "deferred_loaded": samples[-1]["deferred_loaded"],
+        }
+    health = [time_to_health() for _ in range(runs)]
+    report["backend"]["ready_ms"] = round(statistics.median(h["ready_ms"] for h in health), 1)
+    report["backend"]["first_health_ms"] = round(statistics.median(h["first_health_ms"] for h in health), 2)
+    return report
+
+
+def check(report: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Regressions against the baseline; an empty list means the check passed"""
+    problems = []
+    for target in TARGETS:
+        if report[target]["deferred_loaded"]:
+            problems.append(f"{target} imports {', '.join(report[target]['deferred_loaded'])} at startup")
+        for metric in ("import_ms", "ready_ms"):
+            old = baseline.get(target, {}).get(metric)
+            new = report[target].get(metric)
+            if old and new and new > old * (1 + tolerance):
+                problems.append(f"{target} {metric} regressed: {old} -> {new} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend and api cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="Fail on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown before --check fails")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="Also write the report to this path")
+    args = parser.parse_args()
+
+    report = profile(args.runs)
+    for target in TARGETS:
+        stats = report[target]
+        line = f"{target:<8} import {stats['import_ms']:7.1f} ms"
+        if "ready_ms" in stats:
+            line += f" | ready {stats['ready_ms']:7.1f} ms | first /health {stats['first_health_ms']:5.2f} ms"
+        print(line)
+        for entry in stats["slowest"][:5]:
+            print(f"           {entry['cumulative_ms']:7.1f} ms  {entry['module']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+    if args.check:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        problems = check(report, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+        print("Startup within baseline")
+
+
+if __name__ == "__main__":
+    main()